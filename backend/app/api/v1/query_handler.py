@@ -1,14 +1,41 @@
 from fastapi import APIRouter, HTTPException, Depends
-from app.models.query_model import QueryRequest, QueryResponse, SearchRequest
+from fastapi.responses import StreamingResponse
+from app.models.query_model import BatchRequest, QueryRequest, QueryResponse, SearchRequest
 from app.models.search_model import SearchResult
-from app.services import perform_search, CloudflareChat, fetch_content_from_custom_url
+from app.services import (
+    async_perform_search,
+    async_stream_search,
+    CloudflareChat,
+    async_fetch_content_from_custom_url,
+    async_run_batch,
+    async_register_results,
+    async_persist_results,
+    async_resolve_result_handles,
+    register_results,
+    UnknownResultHandle,
+)
 from app.utils.citation_tracker import track_citations
+from app.utils.circuit_breaker import breaker_status
+from app.utils.metrics import Gauge
+from app.utils.rate_limter import rate_limit_status
 from app.constants.constants import CLOUDFLARE_API_KEY, CLOUDFLARE_ACCOUNT_ID
+from app.services.batch_service import BATCH_MAX_QUERIES
+from app.services.language_model import answer_cache
+from app.services.prompt_builder import PromptBuilder
+from app.services.search_service import search_cache
+from app.services.session_store import (
+    SESSION_REAPER_INTERVAL,
+    MemorySessionStore,
+    SessionData,
+    create_session_store,
+    reap_expired_sessions,
+)
 from typing import Dict, List, Optional
+import json
 import traceback
 import logging
+import asyncio
 from datetime import datetime, timedelta
-from dataclasses import dataclass
 
 router = APIRouter()
 
@@ -16,56 +43,191 @@ router = APIRouter()
 SESSION_TTL = timedelta(minutes=10)
 MAX_PREVIOUS_QUERIES = 3
 
-@dataclass
-class SessionData:
-    messages: List[Dict[str, str]]
-    queries: List[str]
-    last_accessed: datetime
-
-    @classmethod
-    def create_new(cls) -> 'SessionData':
-        return cls(
-            messages=[],
-            queries=[],
-            last_accessed=datetime.utcnow()
+# Prompts list at most MAX_PREVIOUS_QUERIES earlier questions
+prompt_builder = PromptBuilder(max_previous_queries=MAX_PREVIOUS_QUERIES)
+
+# Backend selected with SESSION_BACKEND (memory, sqlite or redis)
+session_store = create_session_store(SESSION_TTL)
+# Background sweep started by the app lifespan; while it runs, handlers skip cleanup
+session_reaper: Optional[asyncio.Task] = None
+
+# Read when /metrics is scraped, so they cost nothing per request. Only the
+# in-memory store is per worker and cheap to count; the shared backends
+# would need a query or keyspace scan per scrape.
+if isinstance(session_store, MemorySessionStore):
+    Gauge("sessions_active", "Sessions held by the worker's session store", lambda: len(session_store))
+    Gauge("session_store_bytes", "Estimated bytes held by the in-memory session store",
+          lambda: session_store.bytes_used)
+
+def start_session_reaper() -> None:
+    """Start sweeping expired sessions in the background, if enabled."""
+    global session_reaper
+    if SESSION_REAPER_INTERVAL > 0 and session_reaper is None:
+        session_reaper = asyncio.create_task(
+            reap_expired_sessions(session_store, SESSION_TTL, SESSION_REAPER_INTERVAL)
         )
 
-# Replace chat_sessions dict with typed version
-chat_sessions: Dict[str, SessionData] = {}
+async def stop_session_reaper() -> None:
+    """Cancel the background sweep started by start_session_reaper."""
+    global session_reaper
+    if session_reaper is not None:
+        session_reaper.cancel()
+        try:
+            await session_reaper
+        except asyncio.CancelledError:
+            pass
+        session_reaper = None
 
-def cleanup_expired_sessions() -> None:
-    """Remove sessions that have exceeded their TTL."""
-    current_time = datetime.utcnow()
-    expired_sessions = [
-        session_id for session_id, session_data in chat_sessions.items()
-        if current_time - session_data.last_accessed > SESSION_TTL
-    ]
-    for session_id in expired_sessions:
-        del chat_sessions[session_id]
+async def run_session_store(method, *args):
+    """Call a session store method, in a worker thread if the backend blocks.
+    
+    The SQLite and Redis backends do disk or network I/O on every call,
+    which must not stall the event loop.
+    
+    Args:
+        method: Bound method of session_store
+        *args: Arguments for the method
+        
+    Returns:
+        Whatever the method returns
+    """
+    if session_store.blocking_io:
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
+
+async def cleanup_expired_sessions() -> None:
+    """Remove sessions that have exceeded their TTL, unless the reaper does it."""
+    if session_reaper is None:
+        await run_session_store(session_store.cleanup_expired, SESSION_TTL)
+
+def is_expired(session: SessionData) -> bool:
+    """Whether a session outlived its TTL but has not been swept yet."""
+    return datetime.utcnow() - session.last_accessed > SESSION_TTL
 
-def update_session_timestamp(session_id: str) -> None:
+async def update_session_timestamp(session_id: str) -> None:
     """Update the last accessed timestamp for a session.
     
     Args:
         session_id: The ID of the session to update
     """
-    if session_id in chat_sessions:
-        chat_sessions[session_id].last_accessed = datetime.utcnow()
+    await run_session_store(session_store.touch, session_id)
 
-def get_or_create_session(session_id: str) -> SessionData:
+async def get_or_create_session(session_id: str) -> SessionData:
     """Get existing session or create new one if it doesn't exist.
     
     Args:
         session_id: The session ID to lookup
         
     Returns:
-        SessionData: The session data object
+        SessionData: A snapshot of the session; change it through the store
+    """
+    session = await run_session_store(session_store.get, session_id)
+    if session is None or is_expired(session):
+        return await run_session_store(session_store.create, session_id)
+    await update_session_timestamp(session_id)
+    return session
+
+async def record_query(session_id: str, session: SessionData, query: str) -> None:
+    """Append a query to the session and its local snapshot.
+    
+    A turn runs /search and then /answer with the same query; it is only
+    recorded once.
+    
+    Args:
+        session_id: The session ID
+        session: Snapshot returned by get_or_create_session
+        query: The user's query
+    """
+    if session.queries and session.queries[-1] == query:
+        return
+    session.queries.append(query)
+    await run_session_store(session_store.append_query, session_id, query)
+
+async def append_turn(session_id: str, session: SessionData, query: str, answer: str) -> None:
+    """Record a completed question/answer exchange in the session history.
+    
+    Args:
+        session_id: The session ID
+        session: Snapshot returned by get_or_create_session
+        query: The user's question
+        answer: The generated answer
+    """
+    turn = [
+        {"role": "user", "content": query},
+        {"role": "assistant", "content": answer},
+    ]
+    session.messages.extend(turn)
+    await run_session_store(session_store.append_messages, session_id, turn)
+
+async def resolve_search_results(query_request: QueryRequest) -> List[Dict]:
+    """Combine the inline search results with those referenced by handle.
+    
+    Args:
+        query_request: QueryRequest with search results and/or result handles
+        
+    Returns:
+        List[Dict]: The results as dictionaries, inline ones first
+        
+    Raises:
+        HTTPException: 404 Not Found if a handle is unknown or has expired
+    """
+    try:
+        referenced = await async_resolve_result_handles(query_request.result_handles)
+    except UnknownResultHandle as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return [result.model_dump() for result in query_request.search_results + referenced]
+
+async def answer_turn(
+    session_id: str,
+    session: SessionData,
+    query: str,
+    search_results: List[Dict],
+    use_cache: bool = True
+) -> str:
+    """Generate an answer from the search results and session history and record the turn.
+    
+    Args:
+        session_id: The session ID
+        session: Snapshot returned by get_or_create_session
+        query: The user's question
+        search_results: Search results as dictionaries
+        use_cache: Set to False to bypass the answer cache
+        
+    Returns:
+        str: The generated answer
+    """
+    # Initialize CloudflareChat with session context
+    cf_chat = CloudflareChat(
+        api_key=CLOUDFLARE_API_KEY, 
+        account_id=CLOUDFLARE_ACCOUNT_ID,
+        prompt_builder=prompt_builder
+    )
+    
+    # Generate answer using chat history and all queries
+    answer = await cf_chat.async_generate_answer(
+        search_results=search_results, 
+        chat_history=session.messages,
+        query=query,
+        previous_queries=session.queries,
+        use_cache=use_cache
+    )
+    
+    # Update chat history
+    await append_turn(session_id, session, query, answer)
+    return answer
+
+def format_sse(data: Dict, event: Optional[str] = None) -> str:
+    """Encode a payload as a server-sent event.
+    
+    Args:
+        data: JSON-serializable payload
+        event: Optional event name; unnamed events are delivered as "message"
+        
+    Returns:
+        str: The encoded event, terminated by a blank line
     """
-    if session_id not in chat_sessions:
-        chat_sessions[session_id] = SessionData.create_new()
-    else:
-        update_session_timestamp(session_id)
-    return chat_sessions[session_id]
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
 @router.post("/search/{session_id}")
 async def search(
@@ -75,84 +237,125 @@ async def search(
 ):
     """
     Process search request, using either custom URL or search APIs.
+
+    Each result carries a ``handle`` that /answer accepts in place of the
+    full result.
     """
     try:
-        cleanup_expired_sessions()
+        await cleanup_expired_sessions()
         
         # store query in session
-        if session_id not in chat_sessions:
-            chat_sessions[session_id] = SessionData.create_new()
-        chat_sessions[session_id].queries.append(search_request.query)
+        session = await get_or_create_session(session_id)
+        await record_query(session_id, session, search_request.query)
         
         # If custom URL is provided and not empty
         if custom_url and custom_url.strip():
             try:
-                custom_result = fetch_content_from_custom_url(custom_url.strip())
-                return [custom_result]
+                custom_result = await async_fetch_content_from_custom_url(custom_url.strip())
+                return await async_register_results([custom_result])
             except Exception as e:
                 # logger.error(f"Error processing custom URL: {e}")
                 raise HTTPException(status_code=400, detail=str(e))
         
         # Fallback to regular search if no custom URL
-        return perform_search(search_request.query)
+        return await async_register_results(
+            await async_perform_search(search_request.query, search_request.use_cache)
+        )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
+@router.post("/search/{session_id}/stream")
+async def stream_search(
+    session_id: str,
+    search_request: SearchRequest,
+    custom_url: Optional[str] = None,
+):
+    """
+    Stream search results as server-sent events while providers complete.
+
+    Each unique result is sent as an unnamed event ``{"result": ...}`` as soon
+    as its provider (and page fetch) finishes. A final ``done`` event carries
+    the merged list of everything that was sent. Results are written to the
+    shared content store once, before ``done`` (or ``error``), so their
+    handles resolve in other workers from then on.
+
+    Args:
+        session_id: Unique session ID
+        search_request: SearchRequest with the query string and cache setting
+        custom_url: Optional URL to fetch instead of running the search APIs
+
+    Returns:
+        StreamingResponse: A ``text/event-stream`` response
+    """
+    await cleanup_expired_sessions()
+
+    await record_query(session_id, await get_or_create_session(session_id), search_request.query)
+
+    async def event_stream():
+        # Handles only go to this worker's cache here; the content store
+        # write for the whole response happens once at the end
+        registered = []
+        try:
+            if custom_url and custom_url.strip():
+                result = await async_fetch_content_from_custom_url(custom_url.strip())
+                registered.extend(register_results([result], persist=False))
+                yield format_sse({"result": registered[-1].model_dump()})
+            else:
+                async for result in async_stream_search(search_request.query, search_request.use_cache):
+                    registered.extend(register_results([result], persist=False))
+                    yield format_sse({"result": registered[-1].model_dump()})
+        except Exception as e:
+            logging.error(traceback.format_exc())
+            await async_persist_results(registered)
+            yield format_sse({"detail": f"Search failed: {e}"}, event="error")
+            return
+
+        await async_persist_results(registered)
+        yield format_sse({"results": [result.model_dump() for result in registered]}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/answer/{session_id}", response_model=QueryResponse)
 async def get_answer(session_id: str, query_request: QueryRequest):
     """
     Generate an answer using the given search results and chat history.
 
+    Results can be sent inline in ``search_results`` or referenced by the
+    ``result_handles`` that /search returned, which avoids sending their
+    content back.
+
     Args:
         session_id: Unique session ID
-        query_request: QueryRequest with query string and search results
+        query_request: QueryRequest with query string and search results or handles
 
     Returns:
         QueryResponse: QueryResponse containing the generated answer, citations, and search results
 
     Raises:
-        HTTPException: 500 Internal Server Error if error occurs generating answer
+        HTTPException: 404 Not Found if a result handle is unknown or expired,
+            500 Internal Server Error if error occurs generating answer
     """
+    search_results = await resolve_search_results(query_request)
+
     try:
         # Clean up expired sessions first
-        cleanup_expired_sessions()
-        
-        search_results = [result.model_dump() for result in query_request.search_results]
+        await cleanup_expired_sessions()
 
         # Initialize session if it doesn't exist
-        if session_id not in chat_sessions:
-            chat_sessions[session_id] = SessionData.create_new()
-        else:
-            update_session_timestamp(session_id)
+        session = await get_or_create_session(session_id)
         
         # Add current query to session queries
-        chat_sessions[session_id].queries.append(query_request.query)
+        await record_query(session_id, session, query_request.query)
         
-        # Initialize CloudflareChat with session context
-        cf_chat = CloudflareChat(
-            api_key=CLOUDFLARE_API_KEY, 
-            account_id=CLOUDFLARE_ACCOUNT_ID
-        )
-        
-        # Generate answer using chat history and all queries
-        answer = cf_chat.generate_answer(
-            search_results=search_results, 
-            chat_history=chat_sessions[session_id].messages,
-            query=query_request.query,
-            previous_queries=chat_sessions[session_id].queries
+        answer = await answer_turn(
+            session_id, session, query_request.query, search_results, query_request.use_cache
         )
         
-        # Update chat history
-        chat_sessions[session_id].messages.append({
-            "role": "user",
-            "content": query_request.query
-        })
-        chat_sessions[session_id].messages.append({
-            "role": "assistant",
-            "content": answer
-        })
-        
         citations = track_citations(search_results)
         return QueryResponse(
             answer=answer, 
@@ -164,6 +367,231 @@ async def get_answer(session_id: str, query_request: QueryRequest):
         logging.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error generating answer: {e}")
 
+@router.post("/ask/{session_id}", response_model=QueryResponse)
+async def ask(
+    session_id: str,
+    search_request: SearchRequest,
+    custom_url: Optional[str] = None,
+):
+    """
+    Search and answer in a single request.
+
+    The search results are passed to the model on the server. They are
+    returned without their page content, each with a ``handle`` that
+    /answer accepts for follow-up questions over the same sources.
+
+    Args:
+        session_id: Unique session ID
+        search_request: SearchRequest with the query string
+        custom_url: Optional URL to answer from instead of running the search APIs
+
+    Returns:
+        QueryResponse: The generated answer, citations, and search results
+
+    Raises:
+        HTTPException: 500 Internal Server Error if the search or answer fails
+    """
+    await cleanup_expired_sessions()
+
+    session = await get_or_create_session(session_id)
+    await record_query(session_id, session, search_request.query)
+
+    try:
+        if custom_url and custom_url.strip():
+            results = [await async_fetch_content_from_custom_url(custom_url.strip())]
+        else:
+            results = await async_perform_search(search_request.query, search_request.use_cache)
+    except Exception as e:
+        logging.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Search failed: {e}")
+
+    results = await async_register_results(results)
+    search_results = [result.model_dump() for result in results]
+
+    try:
+        answer = await answer_turn(
+            session_id, session, search_request.query, search_results, search_request.use_cache
+        )
+    except Exception as e:
+        logging.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error generating answer: {e}")
+
+    return QueryResponse(
+        answer=answer,
+        citations=track_citations(search_results),
+        search_results=[result.model_dump(exclude={"search_content"}) for result in results]
+    )
+
+@router.post("/answer/{session_id}/stream")
+async def stream_answer(session_id: str, query_request: QueryRequest):
+    """
+    Stream an answer as server-sent events while it is being generated.
+
+    Each token is sent as an unnamed event ``{"token": ...}``. Once generation
+    completes, the answer is appended to the session history and a ``done``
+    event carries the assembled answer and citations. Failures after the
+    stream has started are reported as an ``error`` event.
+
+    Args:
+        session_id: Unique session ID
+        query_request: QueryRequest with query string and search results or handles
+
+    Returns:
+        StreamingResponse: A ``text/event-stream`` response
+
+    Raises:
+        HTTPException: 404 Not Found if a result handle is unknown or expired,
+            500 Internal Server Error if the model cannot be initialized
+    """
+    await cleanup_expired_sessions()
+
+    search_results = await resolve_search_results(query_request)
+    session = await get_or_create_session(session_id)
+    await record_query(session_id, session, query_request.query)
+
+    try:
+        cf_chat = CloudflareChat(
+            api_key=CLOUDFLARE_API_KEY,
+            account_id=CLOUDFLARE_ACCOUNT_ID,
+            prompt_builder=prompt_builder
+        )
+    except Exception as e:
+        logging.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error generating answer: {e}")
+
+    # Snapshot the history so the prompt is not affected by concurrent turns
+    chat_history = list(session.messages)
+    previous_queries = list(session.queries)
+
+    async def event_stream():
+        tokens = []
+        try:
+            async for token in cf_chat.async_stream_answer(
+                search_results=search_results,
+                chat_history=chat_history,
+                query=query_request.query,
+                previous_queries=previous_queries,
+                use_cache=query_request.use_cache
+            ):
+                tokens.append(token)
+                yield format_sse({"token": token})
+        except Exception as e:
+            logging.error(traceback.format_exc())
+            yield format_sse({"detail": f"Error generating answer: {e}"}, event="error")
+            return
+
+        answer = "".join(tokens)
+        await append_turn(session_id, session, query_request.query, answer)
+        yield format_sse(
+            {"answer": answer, "citations": track_citations(search_results)},
+            event="done"
+        )
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def stream_batch(batch_request: BatchRequest, cf_chat: Optional[CloudflareChat]) -> StreamingResponse:
+    """Run a batch and stream one server-sent event per query as it completes.
+    
+    Each event carries the query's ``index`` in the batch, its results
+    without page content (with handles for /answer), and its ``answer`` and
+    ``citations`` or ``error``. Providers missing from the results are listed
+    with their errors in ``failed_providers``. A final ``done`` event carries
+    the count.
+    
+    Args:
+        batch_request: The queries and cache setting
+        cf_chat: Model used to answer each query; without one only searches run
+        
+    Returns:
+        StreamingResponse: A ``text/event-stream`` response
+        
+    Raises:
+        HTTPException: 400 Bad Request if the batch exceeds BATCH_MAX_QUERIES
+    """
+    if len(batch_request.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch may contain at most {BATCH_MAX_QUERIES} queries"
+        )
+
+    async def event_stream():
+        completed = 0
+        async for item in async_run_batch(batch_request.queries, cf_chat, batch_request.use_cache):
+            results = await async_register_results(item.results)
+            payload = {
+                "index": item.index,
+                "query": item.query,
+                "search_results": [result.model_dump(exclude={"search_content"}) for result in results],
+            }
+            if item.failed_providers:
+                payload["failed_providers"] = item.failed_providers
+            if item.error is not None:
+                payload["error"] = item.error
+            elif cf_chat is not None:
+                payload["answer"] = item.answer
+                payload["citations"] = track_citations([result.model_dump() for result in results])
+            completed += 1
+            yield format_sse(payload)
+        yield format_sse({"queries": completed}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/batch/search")
+async def batch_search(batch_request: BatchRequest):
+    """
+    Search many queries at once, streaming each query's results as they complete.
+
+    Duplicate queries are searched once and provider calls are paced to the
+    rate limits. No session is involved.
+
+    Args:
+        batch_request: BatchRequest with the queries
+
+    Returns:
+        StreamingResponse: A ``text/event-stream`` response, see stream_batch
+
+    Raises:
+        HTTPException: 400 Bad Request if the batch is too large
+    """
+    return stream_batch(batch_request, None)
+
+@router.post("/batch/answer")
+async def batch_answer(batch_request: BatchRequest):
+    """
+    Search and answer many queries at once, streaming each answer as it completes.
+
+    Every query is answered on its own from its search results, without
+    session history. Duplicate queries are searched and answered once.
+
+    Args:
+        batch_request: BatchRequest with the queries
+
+    Returns:
+        StreamingResponse: A ``text/event-stream`` response, see stream_batch
+
+    Raises:
+        HTTPException: 400 Bad Request if the batch is too large,
+            500 Internal Server Error if the model cannot be initialized
+    """
+    try:
+        cf_chat = CloudflareChat(
+            api_key=CLOUDFLARE_API_KEY,
+            account_id=CLOUDFLARE_ACCOUNT_ID,
+            prompt_builder=prompt_builder
+        )
+    except Exception as e:
+        logging.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error generating answer: {e}")
+    return stream_batch(batch_request, cf_chat)
+
 @router.delete("/session/{session_id}")
 async def clear_session(session_id: str):
     """
@@ -180,8 +608,7 @@ async def clear_session(session_id: str):
     Raises:
         HTTPException: If the session ID is not found.
     """
-    if session_id in chat_sessions:
-        del chat_sessions[session_id]
+    if await run_session_store(session_store.delete, session_id):
         return {"message": f"Session {session_id} cleared"}
     raise HTTPException(status_code=404, detail="Session not found")
 
@@ -201,10 +628,44 @@ async def get_session_history(session_id: str):
         HTTPException: If the session ID is not found.
     """
     # Clean up expired sessions first
-    cleanup_expired_sessions()
+    await cleanup_expired_sessions()
     
-    if session_id not in chat_sessions:
+    session = await run_session_store(session_store.get, session_id)
+    if session is None or is_expired(session):
         raise HTTPException(status_code=404, detail="Session not found")
     
-    update_session_timestamp(session_id)
-    return {"history": chat_sessions[session_id]}
+    await update_session_timestamp(session_id)
+    return {"history": session}
+
+@router.get("/rate-limits")
+async def get_rate_limits():
+    """
+    Report the upstream quotas and their current token levels.
+
+    With the shared (sqlite) backend the levels reflect all worker processes.
+
+    Returns:
+        dict: Quota name mapped to its limit and available tokens
+    """
+    return {"rate_limits": rate_limit_status()}
+
+@router.get("/circuit-breakers")
+async def get_circuit_breakers():
+    """
+    Report the circuit breaker of every upstream.
+
+    Returns:
+        dict: Upstream name mapped to its breaker state, consecutive
+        failures, remaining retry budget and recent latency
+    """
+    return {"circuit_breakers": breaker_status()}
+
+@router.get("/caches")
+async def get_caches():
+    """
+    Report the size and hit rate of the search and answer caches.
+
+    Returns:
+        dict: Cache name mapped to its size, hits, misses and evictions
+    """
+    return {"caches": {"search": search_cache.stats(), "answer": answer_cache.stats()}}
@@ -1,15 +1,44 @@
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from app.core.settings import BackendBaseSettings
-from app.api.v1.query_handler import router
+from app.api.v1.query_handler import router, start_session_reaper, stop_session_reaper
+from app.services.search_service import start_result_pruner, stop_result_pruner
+from app.utils.http_client import (
+    DNS_CACHE_ENABLED,
+    WARMUP_ENABLED,
+    close_clients,
+    dns_cache,
+    warm_up_connections,
+)
+from app.utils.metrics import CONTENT_TYPE, render_metrics, worker_sample_writer
+from app.utils.tracing import TRACE_HEADER, TraceMiddleware
 import os
 
 # Load settings
 settings = BackendBaseSettings()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up the shared HTTP clients, background sweeps and metrics writer on startup and release them on shutdown."""
+    if DNS_CACHE_ENABLED:
+        dns_cache.install()
+    if WARMUP_ENABLED:
+        await warm_up_connections()
+    start_session_reaper()
+    start_result_pruner()
+    worker_sample_writer.start()
+    yield
+    worker_sample_writer.stop()
+    await stop_result_pruner()
+    await stop_session_reaper()
+    await close_clients()
+
 # Initialize FastAPI app with settings
-app = FastAPI(**settings.set_backend_app_attributes)
+app = FastAPI(**settings.set_backend_app_attributes, lifespan=lifespan)
 
 # Set up CORS middleware
 app.add_middleware(
@@ -18,8 +47,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[TRACE_HEADER],
 )
 
+# Time every request; spans go to TRACE_FILE and the trace ID to the client
+app.add_middleware(TraceMiddleware)
+
 # Include API router
 app.include_router(router, prefix="/api/v1")
 
@@ -28,6 +61,13 @@ app.include_router(router, prefix="/api/v1")
 async def health_check():
     return {"status": "healthy"}
 
+# Prometheus scrape endpoint; samples are labelled per worker, and with
+# METRICS_DIR set every worker's samples are returned (see app.utils.metrics)
+@app.get("/metrics", tags=["Health"])
+async def metrics():
+    # Gauge callbacks and reading the other workers' samples do file I/O
+    return Response(await asyncio.to_thread(render_metrics), media_type=CONTENT_TYPE)
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     uvicorn.run("main:app", host="0.0.0.0", port=port, reload=False)
\ No newline at end of file
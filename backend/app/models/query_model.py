@@ -4,12 +4,23 @@ from .search_model import SearchResult
 
 class QueryRequest(BaseModel):
     query: str
-    search_results: List[SearchResult]
+    search_results: List[SearchResult] = []
+    # Handles of results returned by /search, used instead of sending them back
+    result_handles: List[str] = []
     previous_queries: List[str] = []
+    # Set to False to generate a fresh answer instead of reusing a cached one
+    use_cache: bool = True
     
 class SearchRequest(BaseModel):
     query: str
     previous_queries: List[str] = []
+    # Set to False to bypass cached search results (and cached answers for /ask)
+    use_cache: bool = True
+
+class BatchRequest(BaseModel):
+    queries: List[str]
+    # Set to False to bypass cached search results and answers
+    use_cache: bool = True
 
 class QueryResponse(BaseModel):
     answer: str
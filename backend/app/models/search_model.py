@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Optional
 
 class SearchResult(BaseModel):
     """Search result model"""
@@ -7,4 +8,6 @@ class SearchResult(BaseModel):
     url: str
     snippet: str
     search_content: str
-    source: str
\ No newline at end of file
+    source: str
+    # Server-side reference that /answer accepts instead of the full result
+    handle: Optional[str] = None
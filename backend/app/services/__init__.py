@@ -1,4 +1,35 @@
 from .language_model import CloudflareChat
-from .search_service import perform_search, fetch_content_from_custom_url
+from .batch_service import BatchItem, async_run_batch, run_batch
+from .search_service import (
+    perform_search,
+    fetch_content_from_custom_url,
+    async_perform_search,
+    async_stream_search,
+    async_fetch_content_from_custom_url,
+    register_results,
+    persist_results,
+    resolve_result_handles,
+    async_register_results,
+    async_persist_results,
+    async_resolve_result_handles,
+    UnknownResultHandle,
+)
 
-__all__ = ["generate_answer", "perform_search", "fetch_content_from_custom_url"]
\ No newline at end of file
+__all__ = [
+    "generate_answer",
+    "perform_search",
+    "fetch_content_from_custom_url",
+    "async_perform_search",
+    "async_stream_search",
+    "async_fetch_content_from_custom_url",
+    "register_results",
+    "persist_results",
+    "resolve_result_handles",
+    "async_register_results",
+    "async_persist_results",
+    "async_resolve_result_handles",
+    "UnknownResultHandle",
+    "BatchItem",
+    "async_run_batch",
+    "run_batch",
+]
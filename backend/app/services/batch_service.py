@@ -0,0 +1,139 @@
+from dataclasses import dataclass, field
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+
+from app.models.search_model import SearchResult
+from app.services.language_model import CloudflareChat
+from app.services.search_service import CALLS_PER_MINUTE, async_perform_search, normalize_query, search_cache
+from app.utils.rate_limter import get_limiter, prepaid_quotas
+
+logger = logging.getLogger(__name__)
+
+# Distinct queries worked on at once; provider rate limits still apply on top
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+# Largest batch accepted by the API
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", 5000))
+# Quotas a search draws from; a worker takes a slot of each before starting
+SEARCH_QUOTAS = ("bing", "google", "youtube")
+
+
+@dataclass
+class BatchItem:
+    """Outcome of one query of a batch"""
+    index: int  # position of the query in the batch
+    query: str
+    results: List[SearchResult] = field(default_factory=list)
+    answer: Optional[str] = None
+    error: Optional[str] = None
+    # provider -> error, for providers whose results are missing
+    failed_providers: Dict[str, str] = field(default_factory=dict)
+
+
+async def _reserve_search_quotas() -> None:
+    """Take a slot from every search quota, waiting as long as it takes.
+
+    The wait happens before the search starts, so it is not charged to the
+    provider budgets and the search deadline; the search then runs inside
+    :func:`prepaid_quotas` and its provider calls do not wait again.
+    """
+    for name in SEARCH_QUOTAS:
+        await get_limiter(name, CALLS_PER_MINUTE, 60).acquire_async(name)
+
+
+async def async_run_batch(
+    queries: Sequence[str],
+    chat: Optional[CloudflareChat] = None,
+    use_cache: bool = True,
+    concurrency: int = BATCH_CONCURRENCY,
+) -> AsyncIterator[BatchItem]:
+    """Search (and answer) many queries, yielding each outcome as it completes.
+
+    Queries that normalize to the same text are searched and answered once.
+    A fixed pool of workers shares the event loop's HTTP clients and fetch
+    scheduler, the search and answer caches and the provider rate limits.
+    Each query is answered on its own, without session history. A failed
+    query is reported in its item's ``error`` and does not stop the batch;
+    providers missing from a query's results are listed in its
+    ``failed_providers``.
+
+    Args:
+        queries: The queries to run
+        chat: Model used to answer each query; without one only searches run
+        use_cache: Set to False to bypass the search and answer caches
+        concurrency: Distinct queries worked on at once
+
+    Yields:
+        One BatchItem per query, in completion order
+    """
+    groups: Dict[str, List[int]] = {}
+    for index, query in enumerate(queries):
+        groups.setdefault(normalize_query(query), []).append(index)
+    pending = iter(groups.values())
+
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+
+    async def _worker() -> None:
+        # The iterator is shared, so each group is taken by exactly one worker
+        for indexes in pending:
+            query = queries[indexes[0]]
+            results: List[SearchResult] = []
+            failures: Dict[str, str] = {}
+            answer = error = None
+            try:
+                if use_cache and normalize_query(query) in search_cache:
+                    results = await async_perform_search(query, use_cache)
+                else:
+                    await _reserve_search_quotas()
+                    with prepaid_quotas(SEARCH_QUOTAS):
+                        results = await async_perform_search(query, use_cache, failures)
+                if chat is not None:
+                    answer = await chat.async_generate_answer(
+                        [result.model_dump() for result in results],
+                        query=query,
+                        use_cache=use_cache
+                    )
+            except Exception as e:
+                logger.error(f"Batch query {query!r} failed: {str(e)}")
+                error = str(e)
+            for index in indexes:
+                await queue.put(BatchItem(index, queries[index], results, answer, error, failures))
+
+    workers = asyncio.gather(*(_worker() for _ in range(max(1, min(concurrency, len(groups))))))
+    workers.add_done_callback(lambda _: queue.put_nowait(finished))
+
+    try:
+        while True:
+            item = await queue.get()
+            if item is finished:
+                return
+            yield item
+    finally:
+        workers.cancel()
+
+
+def run_batch(
+    queries: Sequence[str],
+    chat: Optional[CloudflareChat] = None,
+    use_cache: bool = True,
+    concurrency: int = BATCH_CONCURRENCY,
+) -> List[BatchItem]:
+    """Blocking wrapper around :func:`async_run_batch` for scripts and jobs.
+
+    Must not be called from a running event loop.
+
+    Args:
+        queries: The queries to run
+        chat: Model used to answer each query; without one only searches run
+        use_cache: Set to False to bypass the search and answer caches
+        concurrency: Distinct queries worked on at once
+
+    Returns:
+        List[BatchItem]: One item per query, in the order of ``queries``
+    """
+    async def _collect() -> List[BatchItem]:
+        return [item async for item in async_run_batch(queries, chat, use_cache, concurrency)]
+
+    return sorted(asyncio.run(_collect()), key=lambda item: item.index)
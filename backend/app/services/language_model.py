@@ -1,8 +1,26 @@
 from dataclasses import dataclass
-from typing import Optional, List, Dict
+from typing import AsyncIterator, Optional, List, Dict
 from enum import Enum
+import asyncio
+import hashlib
+import json
+import os
+import time
+import httpx
 import requests
 from pydantic import Field
+from app.utils.cache import TTLCache
+from app.utils.circuit_breaker import circuit_breaker, get_breaker, is_transient_failure
+from app.utils.http_client import get_async_client, get_session
+from app.utils.metrics import TOKEN_BUCKETS, Histogram, timed
+from app.utils.tracing import annotate, start_span, traced
+from app.services.prompt_builder import (
+    CHARS_PER_TOKEN,
+    CONTEXT_TOKEN_BUDGET,
+    BuiltPrompt,
+    PromptBuilder,
+)
+from app.utils.passage_ranker import select_passages
 
 # Custom exceptions
 class CloudflareAPIError(Exception):
@@ -16,6 +34,27 @@ class ConfigurationError(Exception):
 # Constants
 BASE_URL = "https://api.cloudflare.com/client/v4/accounts/{account_id}/ai/run/"
 SYSTEM_PROMPT = "You are a helpful AI assistant. Use the following context to answer questions:\n\n{context}"
+BASIC_SYSTEM_PROMPT = "You are a helpful AI assistant."
+LLM_REQUEST_TIMEOUT = 60
+# Adaptive LLM timeouts never drop below this; answer lengths vary a lot.
+# Model calls are not retried: a second attempt could double the answer time.
+LLM_MIN_TIMEOUT = 20
+# Answers are cached per model and exact prompt; the same first question over
+# the same search results is answered once per ANSWER_CACHE_TTL seconds
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 512))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 3600))
+
+answer_cache = TTLCache(max_size=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL)
+
+llm_seconds = Histogram(
+    "llm_request_seconds", "Duration of Cloudflare model calls", labels=("mode", "outcome")
+)
+llm_first_token_seconds = Histogram(
+    "llm_first_token_seconds", "Time until a streamed answer's first token"
+)
+prompt_tokens = Histogram(
+    "llm_prompt_tokens", "Estimated tokens per prompt sent to the model", buckets=TOKEN_BUCKETS
+)
 
 
 class CloudflareModel(Enum):
@@ -35,6 +74,26 @@ class Message:
     content: str
 
 
+def answer_cache_key(model: CloudflareModel, messages: List[Dict[str, str]]) -> str:
+    """Stable cache key for a model and the exact messages sent to it.
+
+    Args:
+        model: The model the messages are sent to
+        messages: The formatted message list
+
+    Returns:
+        str: Hex digest identifying the request
+    """
+    digest = hashlib.sha256(model.value.encode("utf-8"))
+    digest.update(json.dumps(messages, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _cached_answer(key: str) -> Optional[str]:
+    cached = answer_cache.get(key)
+    return cached[0] if cached is not None else None
+
+
 class CloudflareChat:
     """CloudflareChat class to interact with Cloudflare's AI workers."""
 
@@ -42,7 +101,8 @@ class CloudflareChat:
         self, 
         api_key: str,
         account_id: str,
-        model: CloudflareModel = CloudflareModel.LLAMA_3_70B_INSTRUCT
+        model: CloudflareModel = CloudflareModel.LLAMA_3_70B_INSTRUCT,
+        prompt_builder: Optional[PromptBuilder] = None
     ) -> None:
         """Initialize the CloudflareChat instance.
         
@@ -50,6 +110,8 @@ class CloudflareChat:
             api_key: Cloudflare API key
             account_id: Cloudflare account ID
             model: The model to use for generating answers
+            prompt_builder: Fits prompts into a token budget; defaults to
+                the PROMPT_TOKEN_BUDGET settings
 
         Raises:
             ConfigurationError: If required parameters are missing or invalid
@@ -65,6 +127,9 @@ class CloudflareChat:
         self.api_key = api_key
         self.account_id = account_id
         self.model = model
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        # Size report of the most recent prompt
+        self.last_prompt: Optional[BuiltPrompt] = None
 
     @property
     def full_url(self) -> str:
@@ -75,20 +140,48 @@ class CloudflareChat:
         """Returns the headers with the API key."""
         return {"Authorization": f"Bearer {self.api_key}"}
 
-    def _format_context(self, search_results: List[Dict]) -> str:
-        """Format search results into a context string."""
+    def _format_context(self, search_results: List[Dict], query: Optional[str] = None) -> str:
+        """Format the passages of the search results most relevant to the query.
+
+        Result content is split into passages, ranked against the query with
+        BM25 and packed up to CONTEXT_TOKEN_BUDGET. Each source keeps its
+        passages in document order under a numbered heading with its URL, so
+        the model can attribute what it uses.
+
+        Args:
+            search_results: Search results in citation order
+            query: Current query; without one passages keep document order
+
+        Returns:
+            The context string for the system prompt
+        """
+        selected = select_passages(
+            query or "",
+            [result.get('search_content') or "" for result in search_results],
+            CONTEXT_TOKEN_BUDGET * CHARS_PER_TOKEN
+        )
+
         context_parts = []
-        
-        for result in search_results:
+        for index, result in enumerate(search_results):
+            passages = selected.get(index)
+            if not passages:
+                continue
+            text = passages[0].text
+            for previous, passage in zip(passages, passages[1:]):
+                # Mark where passages in between were left out
+                separator = " " if passage.position == previous.position + 1 else " ... "
+                text += separator + passage.text
+
             if result.get('source') == 'custom_url':
-                context_parts.append(
-                    f"Content from provided URL ({result['url']}):\n{result['search_content']}"
-                )
+                context_parts.append(f"Content from provided URL ({result['url']}):\n{text}")
             else:
-                context_parts.append(result['search_content'])
+                title = result.get('title') or result['url']
+                context_parts.append(f"[{index + 1}] {title} ({result['url']}):\n{text}")
         
         return "\n\n".join(context_parts)
 
+    @circuit_breaker("cloudflare", error=CloudflareAPIError, min_timeout=LLM_MIN_TIMEOUT)
+    @timed(llm_seconds, "blocking")
     def _call_for_prompt(self, messages: List[Dict[str, str]]) -> Dict:
         """Call the Cloudflare API with the messages list.
         
@@ -99,73 +192,271 @@ class CloudflareChat:
             API response dictionary
             
         Raises:
-            CloudflareAPIError: If the API call fails
+            CloudflareAPIError: If the API call fails or its circuit is open
         """
         try:
-            response = requests.post(
+            response = get_session().post(
                 self.full_url,
                 headers=self._get_headers(),
-                json={"messages": messages}
+                json={"messages": messages},
+                timeout=self._call_for_prompt.breaker.timeout(LLM_REQUEST_TIMEOUT)
             )
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             raise CloudflareAPIError(f"API call failed: {str(e)}")
 
-    def generate_answer(
+    @circuit_breaker("cloudflare", error=CloudflareAPIError, min_timeout=LLM_MIN_TIMEOUT)
+    @timed(llm_seconds, "async")
+    async def _async_call_for_prompt(self, messages: List[Dict[str, str]]) -> Dict:
+        """Call the Cloudflare API with the messages list without blocking the event loop.
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            
+        Returns:
+            API response dictionary
+            
+        Raises:
+            CloudflareAPIError: If the API call fails or its circuit is open
+        """
+        try:
+            response = await get_async_client(self.full_url).post(
+                self.full_url,
+                headers=self._get_headers(),
+                json={"messages": messages},
+                timeout=self._async_call_for_prompt.breaker.timeout(LLM_REQUEST_TIMEOUT)
+            )
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            raise CloudflareAPIError(f"API call failed: {str(e)}")
+
+    async def _async_stream_for_prompt(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Call the Cloudflare API in streaming mode and yield tokens as they arrive.
+        
+        Cloudflare streams server-sent events of the form
+        ``data: {"response": "<token>"}`` terminated by ``data: [DONE]``.
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            
+        Yields:
+            Response tokens in generation order
+            
+        Raises:
+            CloudflareAPIError: If the API call fails, returns malformed events
+                or its circuit is open
+        """
+        # Shares the breaker of the blocking calls; stream durations depend on
+        # the answer length, so they do not feed the adaptive timeout
+        breaker = get_breaker("cloudflare", LLM_MIN_TIMEOUT)
+        if not breaker.allow():
+            raise CloudflareAPIError("Circuit for cloudflare is open; skipping call")
+        started = time.perf_counter()
+        first_token = True
+        try:
+            async with get_async_client(self.full_url).stream(
+                "POST",
+                self.full_url,
+                headers=self._get_headers(),
+                json={"messages": messages, "stream": True},
+                timeout=LLM_REQUEST_TIMEOUT
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        event = json.loads(data)
+                    except json.JSONDecodeError as e:
+                        raise CloudflareAPIError(f"Malformed stream event: {str(e)}")
+                    if not isinstance(event, dict):
+                        raise CloudflareAPIError(f"Malformed stream event: {data[:100]}")
+                    token = event.get("response")
+                    if token:
+                        if first_token:
+                            llm_first_token_seconds.observe(time.perf_counter() - started)
+                            first_token = False
+                        yield token
+        except (asyncio.CancelledError, GeneratorExit):
+            # The consumer went away; the upstream did nothing wrong
+            breaker.release()
+            llm_seconds.observe(time.perf_counter() - started, "stream", "cancelled")
+            raise
+        except Exception as e:
+            # Same rule as @circuit_breaker: client errors do not count
+            if is_transient_failure(e) or isinstance(e, CloudflareAPIError):
+                breaker.record_failure()
+            else:
+                breaker.release()
+            llm_seconds.observe(time.perf_counter() - started, "stream", "error")
+            if isinstance(e, CloudflareAPIError):
+                raise
+            raise CloudflareAPIError(f"API call failed: {str(e)}")
+        breaker.record_success()
+        llm_seconds.observe(time.perf_counter() - started, "stream", "ok")
+
+    def _build_messages(
         self,
         search_results: List[Dict],
         chat_history: Optional[List[Dict]] = None,
         query: Optional[str] = None,
         previous_queries: Optional[List[str]] = None
+    ) -> List[Dict[str, str]]:
+        """Assemble the API message list from context, history and the current query.
+
+        The prompt builder keeps the result within its token budget; its size
+        report is kept in :attr:`last_prompt`.
+        """
+        if search_results:
+            # Use context-aware system prompt if search results exist
+            prompt = self.prompt_builder.build(
+                SYSTEM_PROMPT,
+                self._format_context(search_results, query),
+                chat_history,
+                query,
+                previous_queries
+            )
+        else:
+            # Use a basic system prompt for direct questions
+            prompt = self.prompt_builder.build(
+                BASIC_SYSTEM_PROMPT, "", chat_history, query, previous_queries
+            )
+        self.last_prompt = prompt
+        prompt_tokens.observe(prompt.estimated_tokens)
+        annotate(model=self.model.value, prompt_tokens=prompt.estimated_tokens)
+        return prompt.messages
+
+    @traced("llm.answer")
+    def generate_answer(
+        self,
+        search_results: List[Dict],
+        chat_history: Optional[List[Dict]] = None,
+        query: Optional[str] = None,
+        previous_queries: Optional[List[str]] = None,
+        use_cache: bool = True
     ) -> str:
         """Generate an answer using context and chat history.
 
+        Answers are cached on the model and the assembled messages, so an
+        identical prompt is only sent to the model once per ANSWER_CACHE_TTL.
+
         Args:
             search_results: Search results to provide context (can be empty)
             chat_history: Previous conversation messages
             query: Current query
             previous_queries: List of previous queries in the session
+            use_cache: Set to False to bypass the answer cache
 
         Returns:
             The generated answer
         """
-        
-        # Build message list
-        messages = []
-        
-        if search_results:
-            # Use context-aware system prompt if search results exist
-            messages.append(Message(
-                role="system",
-                content=SYSTEM_PROMPT.format(context=self._format_context(search_results))
-            ))
-        else:
-            # Use a basic system prompt for direct questions
-            messages.append(Message(
-                role="system",
-                content="You are a helpful AI assistant."
-            ))
-
-        if chat_history:
-            messages.extend([Message(**msg) for msg in chat_history])
-
-        # Format query with previous context if available
-        query_context = query
-        if previous_queries:
-            query_context = (
-                f"Previous questions in this conversation: {' | '.join(previous_queries)}\n\n"
-                f"Current question: {query}"
-            )
+        formatted_messages = self._build_messages(
+            search_results, chat_history, query, previous_queries
+        )
+        key = answer_cache_key(self.model, formatted_messages)
+        if use_cache:
+            cached = _cached_answer(key)
+            annotate(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
 
-        if query_context:
-            messages.append(Message(role="user", content=query_context))
+        response = self._call_for_prompt(formatted_messages)
+        answer = response["result"]["response"]
+        answer_cache.set(key, answer)
+        return answer
 
-        # Convert messages to dict format for API
-        formatted_messages = [
-            {"role": msg.role, "content": msg.content}
-            for msg in messages
-        ]
+    @traced("llm.answer")
+    async def async_generate_answer(
+        self,
+        search_results: List[Dict],
+        chat_history: Optional[List[Dict]] = None,
+        query: Optional[str] = None,
+        previous_queries: Optional[List[str]] = None,
+        use_cache: bool = True
+    ) -> str:
+        """Asynchronous counterpart of :meth:`generate_answer`.
 
-        response = self._call_for_prompt(formatted_messages)
-        return response["result"]["response"]
+        Args:
+            search_results: Search results to provide context (can be empty)
+            chat_history: Previous conversation messages
+            query: Current query
+            previous_queries: List of previous queries in the session
+            use_cache: Set to False to bypass the answer cache
+
+        Returns:
+            The generated answer
+        """
+        formatted_messages = self._build_messages(
+            search_results, chat_history, query, previous_queries
+        )
+        key = answer_cache_key(self.model, formatted_messages)
+        if use_cache:
+            cached = _cached_answer(key)
+            annotate(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+
+        response = await self._async_call_for_prompt(formatted_messages)
+        answer = response["result"]["response"]
+        answer_cache.set(key, answer)
+        return answer
+
+    async def async_stream_answer(
+        self,
+        search_results: List[Dict],
+        chat_history: Optional[List[Dict]] = None,
+        query: Optional[str] = None,
+        previous_queries: Optional[List[str]] = None,
+        use_cache: bool = True
+    ) -> AsyncIterator[str]:
+        """Stream an answer token by token using context and chat history.
+
+        Shares the answer cache with :meth:`generate_answer`: a cached answer
+        is yielded as a single chunk, and a stream that runs to completion is
+        cached.
+
+        Args:
+            search_results: Search results to provide context (can be empty)
+            chat_history: Previous conversation messages
+            query: Current query
+            previous_queries: List of previous queries in the session
+            use_cache: Set to False to bypass the answer cache
+
+        Yields:
+            Answer tokens as they are generated
+        """
+        # A generator must not change the consumer's context across yields,
+        # so this span is not made current
+        span = start_span("llm.stream", model=self.model.value)
+        try:
+            formatted_messages = self._build_messages(
+                search_results, chat_history, query, previous_queries
+            )
+            if span is not None:
+                span.set(prompt_tokens=self.last_prompt.estimated_tokens)
+            key = answer_cache_key(self.model, formatted_messages)
+            if use_cache:
+                cached = _cached_answer(key)
+                if span is not None:
+                    span.set(cache_hit=cached is not None)
+                if cached is not None:
+                    yield cached
+                    return
+
+            tokens = []
+            async for token in self._async_stream_for_prompt(formatted_messages):
+                tokens.append(token)
+                yield token
+            answer_cache.set(key, "".join(tokens))
+        except BaseException as e:
+            if span is not None:
+                span.end(e)
+            raise
+        finally:
+            if span is not None:
+                span.end()
@@ -0,0 +1,180 @@
+from dataclasses import dataclass, field
+import logging
+import os
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Estimated tokens a prompt may use, leaving the rest of the model's context
+# window for the answer
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 6000))
+# Share of the budget the search context may use; the most relevant
+# passages are picked to fill it
+CONTEXT_TOKEN_BUDGET = int(os.getenv("PROMPT_CONTEXT_TOKENS", 3000))
+# Latest question/answer turns that are always sent verbatim (if they fit)
+PROMPT_RECENT_TURNS = int(os.getenv("PROMPT_RECENT_TURNS", 2))
+# Older messages are cut to this many characters before being sent
+OLDER_MESSAGE_CHARS = int(os.getenv("PROMPT_OLDER_MESSAGE_CHARS", 400))
+# Llama tokenizers average about four characters of English per token
+CHARS_PER_TOKEN = 4
+# Tokens the chat template adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+TRUNCATION_MARK = " [...]"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local estimate of the number of tokens in ``text``.
+
+    Args:
+        text: The text to measure
+
+    Returns:
+        int: Estimated token count
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _message_tokens(content: str) -> int:
+    return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = max(0, max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARK))
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + TRUNCATION_MARK
+
+
+@dataclass
+class BuiltPrompt:
+    """Messages produced by :class:`PromptBuilder` and what it took to fit them"""
+    messages: List[Dict[str, str]]
+    estimated_tokens: int
+    budget: int
+    truncated_messages: int = 0
+    dropped_messages: int = 0
+    dropped_queries: List[str] = field(default_factory=list)
+
+
+class PromptBuilder:
+    """Assembles chat prompts that fit a token budget.
+
+    The policy is deterministic, in order of priority:
+
+    1. The current question is always sent.
+    2. The system prompt (with the search context) follows; its context is
+       cut if it alone would not fit next to the question.
+    3. The latest ``recent_turns`` turns of history are sent verbatim.
+    4. Older messages are cut to ``older_message_chars`` characters, newest
+       first, until the budget is used up; the rest are dropped.
+    5. Up to ``max_previous_queries`` earlier questions are listed, without
+       duplicates or the current question.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = PROMPT_TOKEN_BUDGET,
+        recent_turns: int = PROMPT_RECENT_TURNS,
+        older_message_chars: int = OLDER_MESSAGE_CHARS,
+        max_previous_queries: Optional[int] = None,
+    ):
+        """Initialize the builder.
+
+        Args:
+            token_budget: Estimated tokens the whole prompt may use
+            recent_turns: Latest question/answer turns kept verbatim
+            older_message_chars: Length older messages are cut to
+            max_previous_queries: Earlier questions to list; all if None
+        """
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.older_message_chars = older_message_chars
+        self.max_previous_queries = max_previous_queries
+
+    def build(
+        self,
+        system_prompt: str,
+        context: str = "",
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        query: Optional[str] = None,
+        previous_queries: Optional[List[str]] = None,
+    ) -> BuiltPrompt:
+        """Build the message list for one request.
+
+        Args:
+            system_prompt: System prompt, with a ``{context}`` placeholder
+                where the search context goes
+            context: Search context inserted into the system prompt
+            chat_history: Earlier messages of the conversation, oldest first
+            query: The current question
+            previous_queries: Earlier questions of the session, oldest first
+
+        Returns:
+            BuiltPrompt: The messages and their estimated size
+        """
+        chat_history = chat_history or []
+        prompt = BuiltPrompt(messages=[], estimated_tokens=0, budget=self.token_budget)
+
+        question = query or ""
+        remaining = self.token_budget - (_message_tokens(question) if query else 0)
+
+        # The system prompt may use whatever the question leaves over
+        system = system_prompt.format(context=context)
+        if _message_tokens(system) > remaining and context:
+            fixed = _message_tokens(system_prompt.format(context=""))
+            system = system_prompt.format(context=_truncate(context, max(0, remaining - fixed)))
+            prompt.truncated_messages += 1
+        remaining -= _message_tokens(system)
+
+        # History, newest first: recent turns verbatim, older messages cut
+        recent_messages = 2 * self.recent_turns
+        history: List[Dict[str, str]] = []
+        for age, message in enumerate(reversed(chat_history)):
+            content = message["content"]
+            truncated = age >= recent_messages and len(content) > self.older_message_chars
+            if truncated:
+                content = content[:self.older_message_chars].rstrip() + TRUNCATION_MARK
+            cost = _message_tokens(content)
+            if cost > remaining:
+                prompt.dropped_messages = len(chat_history) - age
+                break
+            remaining -= cost
+            prompt.truncated_messages += truncated
+            history.append({"role": message["role"], "content": content})
+        history.reverse()
+
+        # Earlier questions, most recent first, each listed once
+        if query and previous_queries:
+            seen = {question.strip().casefold()}
+            listed: List[str] = []
+            for previous in reversed(previous_queries):
+                key = previous.strip().casefold()
+                if key in seen:
+                    continue
+                seen.add(key)
+                if self.max_previous_queries is not None and len(listed) >= self.max_previous_queries:
+                    prompt.dropped_queries.append(previous)
+                    continue
+                listed.append(previous.strip())
+            while listed:
+                with_queries = (
+                    f"Previous questions in this conversation: {' | '.join(reversed(listed))}\n\n"
+                    f"Current question: {query}"
+                )
+                if _message_tokens(with_queries) - _message_tokens(question) <= remaining:
+                    question = with_queries
+                    break
+                prompt.dropped_queries.append(listed.pop())
+
+        prompt.messages.append({"role": "system", "content": system})
+        prompt.messages.extend(history)
+        if query:
+            prompt.messages.append({"role": "user", "content": question})
+        prompt.estimated_tokens = sum(_message_tokens(m["content"]) for m in prompt.messages)
+
+        logger.debug(
+            f"Built prompt of ~{prompt.estimated_tokens}/{self.token_budget} tokens "
+            f"({prompt.truncated_messages} truncated, {prompt.dropped_messages} messages "
+            f"and {len(prompt.dropped_queries)} queries dropped)"
+        )
+        return prompt
@@ -1,24 +1,92 @@
 import logging
 from dataclasses import dataclass
-from typing import Dict, List, Optional
-from bs4 import BeautifulSoup
+from typing import AsyncIterator, Dict, List, Mapping, Optional, Tuple
+import asyncio
+import contextvars
+import hashlib
 import itertools
 import os
 import random
-import requests
-from concurrent.futures import ThreadPoolExecutor
+import socket
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from app.models.search_model import SearchResult
+from app.utils.cache import TTLCache
+from app.utils.circuit_breaker import breaker_latency, circuit_breaker
+from app.utils.content_store import (
+    RESULT_PRUNE_INTERVAL,
+    StoredPage,
+    open_content_store,
+    prune_results_periodically,
+)
+from app.utils.fetch_scheduler import get_fetch_scheduler
+from app.utils.fingerprint import MinHashIndex
+from app.utils.latency import LatencyTracker
+from app.utils.metrics import SIZE_BUCKETS, Counter, Histogram, timed
+from app.utils.html_extractor import (
+    ExtractedPage,
+    ParagraphExtractor,
+    charset_from_content_type,
+    extract_page,
+    is_html_content_type,
+    looks_binary,
+)
 from app.utils.rate_limter import rate_limit
+from app.utils.single_flight import AsyncSingleFlight, SingleFlight
+from app.utils.tracing import annotate, traced
+from app.utils.urls import canonicalize_url, document_key
+from app.utils.http_client import get_async_client, get_session
 from app.services.youtube_service import YouTubeAPIError
 
 # Constants
 BING_ENDPOINT = "https://api.bing.microsoft.com/v7.0/search"
 GOOGLE_ENDPOINT = "https://www.googleapis.com/customsearch/v1"
+YOUTUBE_ENDPOINT = "https://www.googleapis.com/youtube/v3/search"
 MAX_CONTENT_LENGTH = 5000
 MAX_PARAGRAPHS = 5
 RESULTS_PER_ENGINE = 2
 REQUEST_TIMEOUT = 5
 CALLS_PER_MINUTE = 30
+# Page downloads are not a paid quota; this bounds scraping across all workers
+PAGE_FETCHES_PER_MINUTE = 120
+
+# Page download limits: stop reading after MAX_DOWNLOAD_BYTES and give up on
+# a page entirely once FETCH_DEADLINE seconds have passed since the request
+MAX_DOWNLOAD_BYTES = int(os.getenv("MAX_DOWNLOAD_BYTES", 2 * 1024 * 1024))
+FETCH_DEADLINE = float(os.getenv("FETCH_DEADLINE", 8))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Seconds after a query starts by which its page fetches must complete;
+# pages still pending then are replaced by their API snippet
+QUERY_FETCH_DEADLINE = float(os.getenv("QUERY_FETCH_DEADLINE", 4))
+# End-to-end limit for a search; providers still running then are cancelled
+# and the results gathered so far are returned
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", 6))
+# Seconds each provider API may take to answer (page fetches not included)
+PROVIDER_BUDGETS = {
+    "bing": float(os.getenv("SEARCH_BUDGET_BING", 3)),
+    "google": float(os.getenv("SEARCH_BUDGET_GOOGLE", 3)),
+    "youtube": float(os.getenv("SEARCH_BUDGET_YOUTUBE", 2)),
+}
+# A search returns as soon as this many unique results are in
+SEARCH_ENOUGH_RESULTS = int(os.getenv("SEARCH_ENOUGH_RESULTS", 3 * RESULTS_PER_ENGINE))
+# Race a second request against a provider call that outlasts its recent p95
+SEARCH_HEDGING = os.getenv("SEARCH_HEDGING", "false").lower() == "true"
+HEDGE_PERCENTILE = 0.95
+
+# Search result cache: fresh for SEARCH_CACHE_TTL seconds, then served stale
+# for up to SEARCH_CACHE_STALE_TTL more seconds while it is refreshed
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 1024))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", 900))
+SEARCH_CACHE_STALE_TTL = float(os.getenv("SEARCH_CACHE_STALE_TTL", 3600))
+
+# Results handed out by the API are kept this long so /answer can accept
+# their handles instead of the full content. They are written to the content
+# store so any worker can resolve them; the cache is a per-process front.
+RESULT_HANDLE_CACHE_SIZE = int(os.getenv("RESULT_HANDLE_CACHE_SIZE", 4096))
+RESULT_HANDLE_TTL = float(os.getenv("RESULT_HANDLE_TTL", 1800))
 
 # User agent rotation
 USER_AGENTS = [
@@ -32,16 +100,512 @@ class SearchAPIError(Exception):
     """Raised when search API returns an error"""
     pass
 
+class SearchTimeoutError(SearchAPIError):
+    """Raised when a provider does not answer within its budget or the search deadline"""
+    pass
+
 class ContentFetchError(Exception):
     """Raised when content fetching fails"""
     pass
 
+class UnknownResultHandle(Exception):
+    """Raised when a result handle was never issued or has expired"""
+    pass
+
 logger = logging.getLogger(__name__)
 
-@rate_limit(calls=CALLS_PER_MINUTE, period=60)
+# Extracted page text shared by all workers on the host (None when disabled)
+content_store = open_content_store()
+# Background sweep of expired result handles, started by the app lifespan
+result_pruner: Optional[asyncio.Task] = None
+
+search_cache = TTLCache(
+    max_size=SEARCH_CACHE_SIZE,
+    ttl=SEARCH_CACHE_TTL,
+    stale_ttl=SEARCH_CACHE_STALE_TTL
+)
+
+result_cache = TTLCache(max_size=RESULT_HANDLE_CACHE_SIZE, ttl=RESULT_HANDLE_TTL)
+
+# Concurrent identical searches (by normalized query) and page fetches (by
+# canonical URL) share one upstream operation
+search_flight = SingleFlight()
+page_flight = SingleFlight()
+async_search_flight = AsyncSingleFlight()
+async_page_flight = AsyncSingleFlight()
+
+# Recent API latency of each provider, for hedging
+provider_latency = LatencyTracker()
+
+# Per-stage metrics exposed on /metrics; provider and fetch durations exclude
+# time spent waiting on the rate limiter
+provider_seconds = Histogram(
+    "search_provider_seconds", "Duration of search provider API calls", labels=("provider", "outcome")
+)
+page_fetch_seconds = Histogram(
+    "page_fetch_seconds", "Duration of page downloads including extraction", labels=("outcome",)
+)
+page_fetch_responses = Counter(
+    "page_fetch_responses_total", "Page download responses by HTTP status", labels=("status",)
+)
+page_fetch_bytes = Histogram("page_fetch_bytes", "Bytes read per page download", buckets=SIZE_BUCKETS)
+page_extract_seconds = Histogram("page_extract_seconds", "Time spent parsing page HTML")
+
+# Strong references to background refresh tasks so they are not collected
+_refresh_tasks: set = set()
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for cache lookups.
+    
+    Case, Unicode form, repeated whitespace and trailing sentence punctuation
+    (``?``, ``!``, ``.``) are ignored, so "What is Python?" and
+    "what is  python" share an entry. Other symbols are kept: "C++", "C#"
+    and "C" are different questions.
+    
+    Args:
+        query: The raw user query
+    
+    Returns:
+        The normalized cache key
+    """
+    normalized = unicodedata.normalize("NFKC", query).casefold()
+    normalized = " ".join(normalized.split())
+    return normalized.rstrip("?!. ")
+
+def _summarize_paragraph(paragraph: str) -> str:
+    """Keep the first two sentences of a paragraph."""
+    return '. '.join(paragraph.split('. ')[:2]) + '.'
+
+def _summary_extractor(encoding: Optional[str] = None) -> ParagraphExtractor:
+    """Extractor producing the per-result summary used as search_content."""
+    return ParagraphExtractor(
+        max_paragraphs=MAX_PARAGRAPHS,
+        max_chars=MAX_CONTENT_LENGTH,
+        transform=_summarize_paragraph,
+        encoding=encoding
+    )
+
+def _full_text_extractor(encoding: Optional[str] = None) -> ParagraphExtractor:
+    """Extractor producing the untrimmed paragraphs of a custom URL."""
+    return ParagraphExtractor(
+        max_paragraphs=MAX_PARAGRAPHS,
+        max_chars=MAX_CONTENT_LENGTH,
+        encoding=encoding
+    )
+
+def _extract_summary(html: bytes, encoding: Optional[str] = None) -> str:
+    """Extract the leading sentences of the first paragraphs of a page."""
+    page = extract_page(
+        html,
+        max_paragraphs=MAX_PARAGRAPHS,
+        max_chars=MAX_CONTENT_LENGTH,
+        transform=_summarize_paragraph,
+        encoding=encoding
+    )
+    return page.text[:MAX_CONTENT_LENGTH]
+
+def _build_custom_url_result(url: str, page: ExtractedPage) -> SearchResult:
+    """Build a SearchResult from the extracted content of a user-provided URL."""
+    content = page.text
+    
+    return SearchResult(
+        question="",  # Not needed for custom URL
+        title=page.title or url,
+        url=url,
+        snippet=content[:200] + "...",
+        search_content=content[:MAX_CONTENT_LENGTH],
+        source="custom_url"
+    )
+
+class _PageReader:
+    """Feeds a streamed response body into an extractor under byte and time limits.
+    
+    The response is rejected up front if its Content-Type or first bytes show
+    it is not HTML. Reading stops as soon as the extractor has what it needs
+    or MAX_DOWNLOAD_BYTES have been read, and fails once the deadline passes.
+    """
+
+    def __init__(self, url: str, headers: Mapping[str, str], make_extractor, deadline: float):
+        content_type = headers.get("Content-Type")
+        if not is_html_content_type(content_type):
+            raise ContentFetchError(f"Unsupported content type {content_type!r} for {url}")
+        self.url = url
+        self.deadline = deadline
+        self.bytes_read = 0
+        self.extract_seconds = 0.0
+        self.extractor: ParagraphExtractor = make_extractor(charset_from_content_type(content_type))
+
+    def consume(self, chunk: bytes) -> bool:
+        """Process the next chunk of the body.
+        
+        Returns:
+            bool: True once no further chunks are needed
+            
+        Raises:
+            ContentFetchError: If the body is binary or the deadline has passed
+        """
+        if self.bytes_read == 0 and looks_binary(chunk):
+            raise ContentFetchError(f"Non-HTML body received from {self.url}")
+        if time.monotonic() > self.deadline:
+            raise ContentFetchError(f"Download of {self.url} exceeded {FETCH_DEADLINE}s")
+
+        chunk = chunk[:MAX_DOWNLOAD_BYTES - self.bytes_read]
+        self.bytes_read += len(chunk)
+        started = time.perf_counter()
+        self.extractor.feed_bytes(chunk)
+        self.extract_seconds += time.perf_counter() - started
+        if self.bytes_read >= MAX_DOWNLOAD_BYTES:
+            logger.debug(f"Stopped reading {self.url} at the {MAX_DOWNLOAD_BYTES} byte limit")
+            return True
+        return self.extractor.done
+
+    def page(self) -> ExtractedPage:
+        """Return what has been extracted from the bytes read so far."""
+        started = time.perf_counter()
+        page = self.extractor.finish()
+        page_extract_seconds.observe(self.extract_seconds + time.perf_counter() - started)
+        page_fetch_bytes.observe(self.bytes_read)
+        return page
+
+def _abort_response(response) -> None:
+    """Unblock a thread reading a ``requests`` response and close it.
+    
+    Closing a socket does not wake a ``recv`` blocked on it in another
+    thread, so the connection is shut down first.
+    """
+    try:
+        # A duplicate of the descriptor, so only the connection is shut down
+        with socket.fromfd(response.raw.fileno(), socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.shutdown(socket.SHUT_RDWR)
+    except (AttributeError, OSError, ValueError):
+        pass
+    response.close()
+
+def _read_page_sync(url: str, response, make_extractor, deadline: float) -> ExtractedPage:
+    """Stream a ``requests`` response body through a _PageReader.
+    
+    The socket read timeout only bounds the gap between two packets, so a
+    server dripping bytes could hold a chunk read open indefinitely. A
+    watchdog aborts the connection when the deadline passes.
+    
+    Raises:
+        ContentFetchError: If the body is rejected or the deadline passes
+    """
+    reader = _PageReader(url, response.headers, make_extractor, deadline)
+    expired = threading.Event()
+
+    def _expire() -> None:
+        expired.set()
+        _abort_response(response)
+
+    watchdog = threading.Timer(max(0.0, deadline - time.monotonic()), _expire)
+    watchdog.daemon = True
+    watchdog.start()
+    try:
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+            if reader.consume(chunk):
+                return reader.page()
+    except Exception as e:
+        if expired.is_set():
+            raise ContentFetchError(f"Download of {url} exceeded {FETCH_DEADLINE}s") from e
+        raise
+    finally:
+        watchdog.cancel()
+    if expired.is_set():
+        # The aborted connection looks like the end of the body
+        raise ContentFetchError(f"Download of {url} exceeded {FETCH_DEADLINE}s")
+    return reader.page()
+
+async def _read_page_async(url: str, response, make_extractor, deadline: float) -> ExtractedPage:
+    """Stream an ``httpx`` response body through a _PageReader.
+    
+    Each chunk is parsed in a worker thread to keep the event loop free.
+    """
+    reader = _PageReader(url, response.headers, make_extractor, deadline)
+    async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+        if await asyncio.to_thread(reader.consume, chunk):
+            break
+    return await asyncio.to_thread(reader.page)
+
+def _bing_request(query: str) -> Dict:
+    """Build the request arguments for a Bing search.
+    
+    Raises:
+        SearchAPIError: If BING_API_KEY is not configured
+    """
+    subscription_key = os.getenv('BING_API_KEY')
+    if not subscription_key:
+        raise SearchAPIError("BING_API_KEY environment variable not set")
+
+    return {
+        "headers": {"Ocp-Apim-Subscription-Key": subscription_key},
+        "params": {"q": query, "count": RESULTS_PER_ENGINE, "safeSearch": "Strict"},
+    }
+
+def _google_request(query: str) -> Dict:
+    """Build the request arguments for a Google Custom Search.
+    
+    Raises:
+        SearchAPIError: If the Google credentials are not configured
+    """
+    api_key = os.getenv('GOOGLE_API_KEY')
+    cx = os.getenv('GOOGLE_SEARCH_CX')
+    
+    if not api_key or not cx:
+        raise SearchAPIError("Google API credentials not properly configured")
+    
+    return {
+        "params": {
+            "key": api_key,
+            "cx": cx,
+            "q": query,
+            "num": RESULTS_PER_ENGINE,
+            "safeSearch": "strict"
+        }
+    }
+
+def _youtube_request(query: str) -> Dict:
+    """Build the request arguments for a YouTube search.
+    
+    Raises:
+        YouTubeAPIError: If YOUTUBE_API_KEY is not configured
+    """
+    api_key = os.getenv('YOUTUBE_API_KEY')
+    if not api_key:
+        raise YouTubeAPIError("YOUTUBE_API_KEY environment variable not set")
+
+    return {
+        "params": {
+            "key": api_key,
+            "q": query,
+            "part": "snippet",
+            "type": "video",
+            "maxResults": 2,
+            "safeSearch": "strict"
+        }
+    }
+
+def _parse_bing_hits(query: str, data: Dict) -> List[SearchResult]:
+    """Convert a Bing API response into SearchResult objects without page content."""
+    return [
+        SearchResult(
+            question=query,
+            title=result.get("name", ""),
+            url=result.get("url", ""),
+            snippet=result.get("snippet", ""),
+            search_content="",
+            source="bing"
+        )
+        for result in data.get("webPages", {}).get("value", [])
+    ]
+
+def _parse_google_hits(query: str, data: Dict) -> List[SearchResult]:
+    """Convert a Google API response into SearchResult objects without page content."""
+    return [
+        SearchResult(
+            question=query,
+            title=item.get("title", ""),
+            url=item.get("link", ""),
+            snippet=item.get("snippet", ""),
+            search_content="",
+            source="google"
+        )
+        for item in data.get("items", [])
+    ]
+
+def _parse_youtube_results(query: str, data: Dict) -> List[SearchResult]:
+    """Convert a YouTube API response into SearchResult objects."""
+    results = []
+    for item in data.get("items", []):
+        video_id = item["id"]["videoId"]
+        snippet = item["snippet"]
+        
+        result = SearchResult(
+            question=query,
+            title=snippet["title"],
+            url=f"https://www.youtube.com/watch?v={video_id}",
+            snippet=snippet["description"],
+            search_content=snippet["description"],
+            source="youtube"
+        )
+        results.append(result)
+        
+    return results
+
+def _dedupe_results(results: List[SearchResult]) -> List[SearchResult]:
+    """Remove duplicate results while preserving order.
+    
+    Results are duplicates if their URLs share a :func:`document_key` (e.g.
+    the http and https, AMP or mobile versions of a page) or if their content
+    is nearly identical (syndicated copies of the same article).
+    """
+    seen_urls = set()
+    seen_content = MinHashIndex()
+    unique_results = []
+    for result in results:
+        key = document_key(result.url)
+        if key in seen_urls or seen_content.seen(result.search_content or ""):
+            continue
+        seen_urls.add(key)
+        unique_results.append(result)
+    return unique_results
+
+def register_results(results: List[SearchResult], persist: bool = True) -> List[SearchResult]:
+    """Keep results server-side and label each with a handle for /answer.
+    
+    Handles are derived from the URL and content, so the same result always
+    gets the same handle. Results are also written to the content store,
+    which every worker on the host reads; without it handles only resolve
+    in the process that issued them.
+    
+    Args:
+        results: Results about to be returned to a client
+        persist: Write the results to the content store now. Callers that
+            hand out results one at a time pass False and write them all at
+            once with :func:`persist_results`.
+    
+    Returns:
+        Copies of the results with their handle set
+    """
+    registered = []
+    for result in results:
+        digest = hashlib.blake2b(digest_size=12)
+        digest.update(result.url.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(result.search_content.encode("utf-8"))
+        handled = result.model_copy(update={"handle": digest.hexdigest()})
+        result_cache.set(handled.handle, handled)
+        registered.append(handled)
+    if persist:
+        persist_results(registered)
+    return registered
+
+def persist_results(results: List[SearchResult]) -> None:
+    """Write registered results to the content store in one transaction.
+    
+    Args:
+        results: Results returned by :func:`register_results`
+    """
+    if content_store is None or not results:
+        return
+    try:
+        content_store.put_results({result.handle: result.model_dump_json() for result in results})
+    except sqlite3.Error as e:
+        logger.warning(f"Content store write failed for result handles: {str(e)}")
+
+def resolve_result_handles(handles: List[str]) -> List[SearchResult]:
+    """Look up results previously returned by :func:`register_results`.
+    
+    Args:
+        handles: Handles in the order the results should be used
+    
+    Returns:
+        The results, in the same order
+        
+    Raises:
+        UnknownResultHandle: If any handle is unknown or has expired
+    """
+    found: Dict[str, SearchResult] = {}
+    for handle in handles:
+        cached = result_cache.get(handle)
+        if cached is not None:
+            found[handle] = cached[0]
+
+    # Handles issued by another worker
+    missing = [handle for handle in dict.fromkeys(handles) if handle not in found]
+    if missing and content_store is not None:
+        try:
+            stored = content_store.get_results(missing, RESULT_HANDLE_TTL)
+        except sqlite3.Error as e:
+            logger.warning(f"Content store read failed for result handles: {str(e)}")
+            stored = {}
+        for handle, payload in stored.items():
+            found[handle] = SearchResult.model_validate_json(payload)
+            result_cache.set(handle, found[handle])
+
+    missing = [handle for handle in dict.fromkeys(handles) if handle not in found]
+    if missing:
+        raise UnknownResultHandle(f"Unknown or expired result handles: {', '.join(missing)}")
+    return [found[handle] for handle in handles]
+
+async def async_register_results(results: List[SearchResult]) -> List[SearchResult]:
+    """:func:`register_results` without blocking the event loop on the content store."""
+    if content_store is None:
+        return register_results(results)
+    return await asyncio.to_thread(register_results, results)
+
+async def async_persist_results(results: List[SearchResult]) -> None:
+    """:func:`persist_results` without blocking the event loop on the content store."""
+    if content_store is not None and results:
+        await asyncio.to_thread(persist_results, results)
+
+def start_result_pruner() -> None:
+    """Start deleting expired result handles from the content store in the background."""
+    global result_pruner
+    if content_store is not None and RESULT_PRUNE_INTERVAL > 0 and result_pruner is None:
+        result_pruner = asyncio.create_task(
+            prune_results_periodically(content_store, RESULT_HANDLE_TTL, RESULT_PRUNE_INTERVAL)
+        )
+
+async def stop_result_pruner() -> None:
+    """Cancel the background sweep started by start_result_pruner."""
+    global result_pruner
+    if result_pruner is not None:
+        result_pruner.cancel()
+        try:
+            await result_pruner
+        except asyncio.CancelledError:
+            pass
+        result_pruner = None
+
+async def async_resolve_result_handles(handles: List[str]) -> List[SearchResult]:
+    """:func:`resolve_result_handles` without blocking the event loop on the content store."""
+    if content_store is None:
+        return resolve_result_handles(handles)
+    return await asyncio.to_thread(resolve_result_handles, handles)
+
+def _lookup_page(url: str) -> Optional[StoredPage]:
+    """Read a page from the content store, treating store failures as a miss."""
+    if content_store is None:
+        return None
+    try:
+        return content_store.get(url)
+    except sqlite3.Error as e:
+        logger.warning(f"Content store read failed for {url}: {str(e)}")
+        return None
+
+def _save_page(url: str, content: str, headers: Mapping[str, str]) -> None:
+    """Write extracted page text and its validators to the content store."""
+    if content_store is None:
+        return
+    try:
+        content_store.put(url, content, headers.get("ETag"), headers.get("Last-Modified"))
+    except sqlite3.Error as e:
+        logger.warning(f"Content store write failed for {url}: {str(e)}")
+
+def _revalidated_page(url: str, stored: StoredPage) -> str:
+    """Refresh a stored page's timestamp after a 304 and return its text."""
+    try:
+        content_store.touch(url)
+    except sqlite3.Error as e:
+        logger.warning(f"Content store write failed for {url}: {str(e)}")
+    return stored.content
+
+def _fetch_headers(stored: Optional[StoredPage]) -> Dict[str, str]:
+    """Request headers for a page fetch, conditional if a stored copy exists."""
+    headers = {"User-Agent": random.choice(USER_AGENTS)}
+    if stored is not None:
+        headers.update(stored.conditional_headers())
+    return headers
+
+@traced("fetch")
 def fetch_content_from_url(url: str) -> str:
     """Fetch and extract main text content from a URL.
     
+    Pages are served from the shared content store while fresh; stale
+    copies are revalidated with a conditional GET. Concurrent fetches of
+    the same canonical URL share one download.
+    
     Args:
         url: The URL to fetch content from
     
@@ -51,142 +615,154 @@ def fetch_content_from_url(url: str) -> str:
     Raises:
         ContentFetchError: If content cannot be fetched or parsed
     """
-    headers = {"User-Agent": random.choice(USER_AGENTS)}
+    annotate(url=url)
+    return page_flight.do(canonicalize_url(url), _fetch_content, url)
+
+def _fetch_content(url: str) -> str:
+    """Serve a page from the content store or download it."""
+    stored = _lookup_page(url)
+    if stored is not None and stored.is_fresh():
+        return stored.content
+    return _download_content(url, stored)
 
+@traced("fetch.download")
+@rate_limit(calls=PAGE_FETCHES_PER_MINUTE, period=60, name="page_fetch")
+@timed(page_fetch_seconds)
+def _download_content(url: str, stored: Optional[StoredPage]) -> str:
+    """Download a page (conditionally if stored) and extract its text."""
+    deadline = time.monotonic() + FETCH_DEADLINE
     try:
-        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        paragraphs = [
-            p.get_text() for p in soup.find_all('p')[:MAX_PARAGRAPHS]
-            if p.get_text()
-        ]
+        with get_session().get(
+            url, headers=_fetch_headers(stored), timeout=REQUEST_TIMEOUT, stream=True
+        ) as response:
+            page_fetch_responses.inc(str(response.status_code))
+            if stored is not None and response.status_code == 304:
+                return _revalidated_page(url, stored)
+            response.raise_for_status()
+            page = _read_page_sync(url, response, _summary_extractor, deadline)
         
-        content = ' '.join(
-            '. '.join(p.split('. ')[:2]) + '.'
-            for p in paragraphs
-        )
-        
-        return content[:MAX_CONTENT_LENGTH]
+        content = page.text[:MAX_CONTENT_LENGTH]
+        _save_page(url, content, response.headers)
+        return content
     
     except Exception as e:
         logger.error(f"Error extracting content from {url}: {str(e)}")
         raise ContentFetchError(f"Failed to fetch content from {url}: {str(e)}")
 
-@rate_limit(calls=CALLS_PER_MINUTE, period=60)
-def search_bing(query: str) -> List[SearchResult]:
-    """Perform a Bing search for the given query.
+@traced("provider.bing")
+@circuit_breaker("bing", error=SearchAPIError, retries=1)
+@rate_limit(calls=CALLS_PER_MINUTE, period=60, name="bing")
+@breaker_latency("bing")
+@timed(provider_seconds, "bing")
+def bing_hits(query: str) -> List[SearchResult]:
+    """Query the Bing API without fetching the result pages.
     
     Args:
         query: The search query to perform
     
     Returns:
-        List of SearchResult objects
+        SearchResult objects whose search_content is not filled in yet
         
     Raises:
-        SearchAPIError: If the Bing API request fails
+        SearchAPIError: If the Bing API request fails or its circuit is open
     """
-    subscription_key = os.getenv('BING_API_KEY')
-    if not subscription_key:
-        raise SearchAPIError("BING_API_KEY environment variable not set")
-
-    headers = {"Ocp-Apim-Subscription-Key": subscription_key}
-    params = {"q": query, "count": RESULTS_PER_ENGINE, "safeSearch": "Strict"}
+    request_args = _bing_request(query)
     
     try:
-        response = requests.get(
+        response = get_session().get(
             BING_ENDPOINT,
-            headers=headers,
-            params=params,
-            timeout=REQUEST_TIMEOUT
+            timeout=bing_hits.breaker.timeout(REQUEST_TIMEOUT),
+            **request_args
         )
-
         response.raise_for_status()
-        
-        results = []
-        for result in response.json().get("webPages", {}).get("value", []):
-            try:
-                search_content = fetch_content_from_url(result.get("url", ""))
-                search_result = SearchResult(
-                    question=query,
-                    title=result.get("name", ""),
-                    url=result.get("url", ""),
-                    snippet=result.get("snippet", ""),
-                    search_content=search_content,
-                    source="bing"
-                )
-                results.append(search_result)
-            except ContentFetchError as e:
-                logger.warning(f"Skipping result due to content fetch error: {str(e)}")
-                continue
-        
-        return results
+        return _parse_bing_hits(query, response.json())
     
     except Exception as e:
         logger.error(f"Bing search error: {str(e)}")
         raise SearchAPIError(f"Bing search failed: {str(e)}")
 
-@rate_limit(calls=CALLS_PER_MINUTE, period=60)
-def search_google(query: str) -> List[SearchResult]:
-    """Perform a Google search for the given query.
+@traced("provider.google")
+@circuit_breaker("google", error=SearchAPIError, retries=1)
+@rate_limit(calls=CALLS_PER_MINUTE, period=60, name="google")
+@breaker_latency("google")
+@timed(provider_seconds, "google")
+def google_hits(query: str) -> List[SearchResult]:
+    """Query the Google Custom Search API without fetching the result pages.
     
     Args:
         query: The search query to perform
     
     Returns:
-        List of SearchResult objects
+        SearchResult objects whose search_content is not filled in yet
         
     Raises:
-        SearchAPIError: If the Google API request fails
+        SearchAPIError: If the Google API request fails or its circuit is open
     """
-    api_key = os.getenv('GOOGLE_API_KEY')
-    cx = os.getenv('GOOGLE_SEARCH_CX')
-    
-    if not api_key or not cx:
-        raise SearchAPIError("Google API credentials not properly configured")
-    
-    params = {
-        "key": api_key,
-        "cx": cx,
-        "q": query,
-        "num": RESULTS_PER_ENGINE,
-        "safeSearch": "strict"
-    }
+    request_args = _google_request(query)
     
     try:
-        response = requests.get(
+        response = get_session().get(
             GOOGLE_ENDPOINT,
-            params=params,
-            timeout=REQUEST_TIMEOUT
+            timeout=google_hits.breaker.timeout(REQUEST_TIMEOUT),
+            **request_args
         )
         response.raise_for_status()
-        
-        results = []
-        for item in response.json().get("items", []):
-            try:
-                search_content = fetch_content_from_url(item.get("link", ""))
-                search_result = SearchResult(
-                    question=query,
-                    title=item.get("title", ""),
-                    url=item.get("link", ""),
-                    snippet=item.get("snippet", ""),
-                    search_content=search_content,
-                    source="google"
-                )
-                results.append(search_result)
-            except ContentFetchError as e:
-                logger.warning(f"Skipping result due to content fetch error: {str(e)}")
-                continue
-                
-        return results
+        return _parse_google_hits(query, response.json())
     
     except Exception as e:
         logger.error(f"Google search error: {str(e)}")
         raise SearchAPIError(f"Google search failed: {str(e)}")
 
-@rate_limit(calls=CALLS_PER_MINUTE, period=60)
+def _fill_all(hits: List[SearchResult]) -> List[SearchResult]:
+    """Fetch content for each hit in turn, skipping mirrors and pages that fail."""
+    results = []
+    claimed_urls = set()
+    for hit in hits:
+        key = document_key(hit.url)
+        if key in claimed_urls:
+            continue
+        claimed_urls.add(key)
+        try:
+            search_content = fetch_content_from_url(hit.url)
+            results.append(hit.model_copy(update={"search_content": search_content}))
+        except ContentFetchError as e:
+            logger.warning(f"Skipping result due to content fetch error: {str(e)}")
+            continue
+    return results
+
+def search_bing(query: str) -> List[SearchResult]:
+    """Perform a Bing search for the given query.
+    
+    Args:
+        query: The search query to perform
+    
+    Returns:
+        List of SearchResult objects
+        
+    Raises:
+        SearchAPIError: If the Bing API request fails
+    """
+    return _fill_all(bing_hits(query))
+
+def search_google(query: str) -> List[SearchResult]:
+    """Perform a Google search for the given query.
+    
+    Args:
+        query: The search query to perform
+    
+    Returns:
+        List of SearchResult objects
+        
+    Raises:
+        SearchAPIError: If the Google API request fails
+    """
+    return _fill_all(google_hits(query))
+
+@traced("provider.youtube")
+@circuit_breaker("youtube", error=YouTubeAPIError, retries=1)
+@rate_limit(calls=CALLS_PER_MINUTE, period=60, name="youtube")
+@breaker_latency("youtube")
+@timed(provider_seconds, "youtube")
 def search_youtube(query: str) -> List[SearchResult]:
     """Search YouTube for relevant videos.
     
@@ -197,87 +773,165 @@ def search_youtube(query: str) -> List[SearchResult]:
         List of SearchResult objects containing video information
         
     Raises:
-        YouTubeAPIError: If the API request fails
+        YouTubeAPIError: If the API request fails or its circuit is open
     """
-    api_key = os.getenv('YOUTUBE_API_KEY')
-    if not api_key:
-        raise YouTubeAPIError("YOUTUBE_API_KEY environment variable not set")
-
-    params = {
-        "key": api_key,
-        "q": query,
-        "part": "snippet",
-        "type": "video",
-        "maxResults": 2,
-        "safeSearch": "strict"
-    }
+    request_args = _youtube_request(query)
 
     try:
-        response = requests.get(
-            "https://www.googleapis.com/youtube/v3/search",
-            params=params,
-            timeout=5
+        response = get_session().get(
+            YOUTUBE_ENDPOINT,
+            timeout=search_youtube.breaker.timeout(REQUEST_TIMEOUT),
+            **request_args
         )
         response.raise_for_status()
-        
-        results = []
-        for item in response.json().get("items", []):
-            video_id = item["id"]["videoId"]
-            snippet = item["snippet"]
-            
-            result = SearchResult(
-                question=query,
-                title=snippet["title"],
-                url=f"https://www.youtube.com/watch?v={video_id}",
-                snippet=snippet["description"],
-                search_content=snippet["description"],
-                source="youtube"
-            )
-            results.append(result)
-            
-        return results
+        return _parse_youtube_results(query, response.json())
         
     except Exception as e:
         raise YouTubeAPIError(f"YouTube search failed: {str(e)}")
 
-def perform_search(query: str) -> List[SearchResult]:
+@traced("search")
+def perform_search(query: str, use_cache: bool = True) -> List[SearchResult]:
     """Perform parallel searches on Google, Bing, and YouTube APIs.
     
+    Results are cached on the normalized query. A stale entry is returned
+    immediately and refreshed in a background thread. Concurrent misses for
+    the same normalized query share one search.
+    
     Args:
         query: The search query to run
+        use_cache: Set to False to bypass the result cache
     
     Returns:
         Combined list of unique SearchResult objects
     """
+    annotate(query=query, cache="bypass" if not use_cache else "miss")
+    if not use_cache:
+        return _perform_search_uncached(query)[0]
+
+    key = normalize_query(query)
+    cached = search_cache.get(key)
+    if cached is not None:
+        results, is_stale = cached
+        annotate(cache="stale" if is_stale else "hit")
+        if is_stale and search_cache.begin_refresh(key):
+            threading.Thread(
+                target=_refresh_search, args=(key, query), daemon=True
+            ).start()
+        return list(results)
+
+    return list(search_flight.do(key, _search_and_store, key, query))
+
+def _search_and_store(key: str, query: str) -> List[SearchResult]:
+    """Run a search and cache its results if it is complete."""
+    results, errors = _perform_search_uncached(query)
+    _store_search(key, results, errors)
+    return results
+
+def _store_search(key: str, results: List[SearchResult], errors: Dict[str, Exception]) -> None:
+    """Cache search results, unless they are empty (all providers failed) or
+    a provider was cut off by its budget or the search deadline.
+    
+    Shared by the blocking and async searches, so both agree on what is
+    cacheable.
+    """
+    timed_out = any(isinstance(error, SearchTimeoutError) for error in errors.values())
+    if results and not timed_out:
+        search_cache.set(key, tuple(results))
+    else:
+        search_cache.end_refresh(key)
+
+def _refresh_search(key: str, query: str) -> None:
+    """Re-run a search in the background and update its cache entry."""
+    _store_search(key, *_perform_search_uncached(query))
+
+def _perform_search_uncached(query: str) -> Tuple[List[SearchResult], Dict[str, Exception]]:
+    """Run the provider searches in a thread pool and merge their results.
+    
+    Returns once SEARCH_ENOUGH_RESULTS unique results are in or
+    SEARCH_DEADLINE has passed. A provider whose API has not answered within
+    its PROVIDER_BUDGETS entry is given up on. Provider threads cannot be
+    interrupted, so stragglers finish in the background and their results
+    are discarded.
+    
+    Returns:
+        The results, and the error of each provider that failed, ran out of
+        budget or was still running at the deadline
+    """
+    started = time.monotonic()
+    deadline = started + SEARCH_DEADLINE
+    errors: Dict[str, Exception] = {}
+    # Providers whose API call has returned; only their page fetches remain
+    answered = set()
+
+    def _run(name: str, fetch, needs_content: bool) -> List[SearchResult]:
+        hits = fetch(query)
+        answered.add(name)
+        return _fill_all(hits) if needs_content else hits
+
+    def _budget(name: str) -> float:
+        return min(PROVIDER_BUDGETS.get(name, REQUEST_TIMEOUT), SEARCH_DEADLINE)
+
+    executor = ThreadPoolExecutor(max_workers=3)
     try:
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            bing_future = executor.submit(search_bing, query)
-            google_future = executor.submit(search_google, query)
-            youtube_future = executor.submit(search_youtube, query)
-            
-            results = []
-            
-            # Gather results, handling potential failures
-            for future in [bing_future, google_future, youtube_future]:
+        # Each thread runs in a copy of the caller's context, so its spans
+        # join the caller's trace
+        futures = {
+            executor.submit(contextvars.copy_context().run, _run, name, fetch, needs_content): (order, name)
+            for order, (name, fetch, needs_content) in enumerate((
+                ("bing", bing_hits, True),
+                ("google", google_hits, True),
+                ("youtube", search_youtube, False),
+            ))
+        }
+        
+        ranked = []
+        seen_urls = set()
+        pending = set(futures)
+        
+        # Gather results as they complete, handling potential failures
+        while pending and len(seen_urls) < SEARCH_ENOUGH_RESULTS:
+            now = time.monotonic()
+            for future in list(pending):
+                name = futures[future][1]
+                if name not in answered and now >= started + _budget(name):
+                    pending.discard(future)
+                    errors[name] = SearchTimeoutError(f"{name} search exceeded its {_budget(name):.1f}s budget")
+                    logger.error(f"Search engine error: {errors[name]}")
+            if not pending:
+                break
+            if now >= deadline:
+                for future in pending:
+                    name = futures[future][1]
+                    errors[name] = SearchTimeoutError(f"{name} search did not finish before the deadline")
+                logger.info(f"Search deadline reached for {query!r}, returning partial results")
+                break
+
+            next_check = min([deadline] + [
+                started + _budget(futures[future][1])
+                for future in pending if futures[future][1] not in answered
+            ])
+            done, _ = wait(pending, timeout=max(0.0, next_check - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                order, name = futures[future]
                 try:
-                    results.extend(future.result())
+                    hits = future.result()
                 except (SearchAPIError, YouTubeAPIError) as e:
                     logger.error(f"Search engine error: {str(e)}")
+                    errors[name] = e
                     continue
-            
-            # Remove duplicates while preserving order
-            seen_urls = set()
-            unique_results = []
-            for result in results:
-                if result.url not in seen_urls:
-                    seen_urls.add(result.url)
-                    unique_results.append(result)
-            
-            return unique_results
+                ranked.extend(((order, i), hit) for i, hit in enumerate(hits))
+                seen_urls.update(hit.url for hit in hits)
+        
+        # Provider order first, then each provider's ranking; remove duplicates
+        ranked.sort(key=lambda item: item[0])
+        return _dedupe_results([result for _, result in ranked]), errors
             
     except Exception as e:
         logger.error(f"Error in perform_search: {str(e)}")
-        return []
+        return [], errors
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 def fetch_content_from_custom_url(url: str) -> SearchResult:
     """Fetch and extract content from a custom URL.
@@ -294,31 +948,527 @@ def fetch_content_from_custom_url(url: str) -> SearchResult:
     headers = {"User-Agent": random.choice(USER_AGENTS)}
 
     try:
-        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        deadline = time.monotonic() + FETCH_DEADLINE
+        with get_session().get(
+            url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True
+        ) as response:
+            response.raise_for_status()
+            page = _read_page_sync(url, response, _full_text_extractor, deadline)
+        return _build_custom_url_result(url, page)
+    
+    except Exception as e:
+        logger.error(f"Error extracting content from {url}: {str(e)}")
+        raise ContentFetchError(f"Failed to fetch content from {url}: {str(e)}")
+
+# Async variants used by the API handlers so that upstream I/O never blocks
+# the event loop. The blocking functions above are kept for scripts and
+# threaded callers.
+
+@traced("fetch")
+async def async_fetch_content_from_url(url: str) -> str:
+    """Asynchronously fetch and extract main text content from a URL.
+    
+    Uses the shared content store the same way as :func:`fetch_content_from_url`.
+    Downloads wait for a slot in the loop's fetch scheduler, which caps
+    concurrent downloads overall and per host. Concurrent fetches of the
+    same canonical URL share one download.
+    
+    Args:
+        url: The URL to fetch content from
+    
+    Returns:
+        Extracted text content from the URL
+        
+    Raises:
+        ContentFetchError: If content cannot be fetched or parsed
+    """
+    annotate(url=url)
+    return await async_page_flight.do(canonicalize_url(url), lambda: _async_fetch_content(url))
+
+async def _async_fetch_content(url: str) -> str:
+    """Serve a page from the content store or download it without blocking the loop."""
+    stored = await asyncio.to_thread(_lookup_page, url)
+    if stored is not None and stored.is_fresh():
+        return stored.content
+    async with get_fetch_scheduler().slot(url):
+        return await _async_download_content(url, stored)
+
+@traced("fetch.download")
+@rate_limit(calls=PAGE_FETCHES_PER_MINUTE, period=60, name="page_fetch")
+@timed(page_fetch_seconds)
+async def _async_download_content(url: str, stored: Optional[StoredPage]) -> str:
+    """Download a page (conditionally if stored) and extract its text off the event loop."""
+    deadline = time.monotonic() + FETCH_DEADLINE
+
+    async def _download() -> str:
+        async with get_async_client(url).stream(
+            "GET", url, timeout=REQUEST_TIMEOUT, headers=_fetch_headers(stored)
+        ) as response:
+            page_fetch_responses.inc(str(response.status_code))
+            if stored is not None and response.status_code == 304:
+                return await asyncio.to_thread(_revalidated_page, url, stored)
+            response.raise_for_status()
+            page = await _read_page_async(url, response, _summary_extractor, deadline)
+        
+        content = page.text[:MAX_CONTENT_LENGTH]
+        await asyncio.to_thread(_save_page, url, content, response.headers)
+        return content
+
+    try:
+        # Bound the whole download, not just each read
+        return await asyncio.wait_for(_download(), timeout=FETCH_DEADLINE)
+    
+    except Exception as e:
+        logger.error(f"Error extracting content from {url}: {str(e)}")
+        raise ContentFetchError(f"Failed to fetch content from {url}: {str(e)}")
+
+@traced("provider.bing")
+@circuit_breaker("bing", error=SearchAPIError, retries=1)
+@rate_limit(calls=CALLS_PER_MINUTE, period=60, name="bing")
+@breaker_latency("bing")
+@timed(provider_seconds, "bing")
+async def async_bing_hits(query: str) -> List[SearchResult]:
+    """Query the Bing API without fetching the result pages.
+    
+    Args:
+        query: The search query to perform
+    
+    Returns:
+        SearchResult objects whose search_content is not filled in yet
+        
+    Raises:
+        SearchAPIError: If the Bing API request fails
+    """
+    request_args = _bing_request(query)
+    
+    try:
+        response = await get_async_client(BING_ENDPOINT).get(
+            BING_ENDPOINT, timeout=async_bing_hits.breaker.timeout(REQUEST_TIMEOUT), **request_args
+        )
         response.raise_for_status()
+        return _parse_bing_hits(query, response.json())
+    
+    except Exception as e:
+        logger.error(f"Bing search error: {str(e)}")
+        raise SearchAPIError(f"Bing search failed: {str(e)}")
+
+@traced("provider.google")
+@circuit_breaker("google", error=SearchAPIError, retries=1)
+@rate_limit(calls=CALLS_PER_MINUTE, period=60, name="google")
+@breaker_latency("google")
+@timed(provider_seconds, "google")
+async def async_google_hits(query: str) -> List[SearchResult]:
+    """Query the Google Custom Search API without fetching the result pages.
+    
+    Args:
+        query: The search query to perform
+    
+    Returns:
+        SearchResult objects whose search_content is not filled in yet
         
-        soup = BeautifulSoup(response.content, 'html.parser')
+    Raises:
+        SearchAPIError: If the Google API request fails
+    """
+    request_args = _google_request(query)
+    
+    try:
+        response = await get_async_client(GOOGLE_ENDPOINT).get(
+            GOOGLE_ENDPOINT, timeout=async_google_hits.breaker.timeout(REQUEST_TIMEOUT), **request_args
+        )
+        response.raise_for_status()
+        return _parse_google_hits(query, response.json())
+    
+    except Exception as e:
+        logger.error(f"Google search error: {str(e)}")
+        raise SearchAPIError(f"Google search failed: {str(e)}")
+
+async def async_fill_content(hit: SearchResult, deadline: Optional[float] = None) -> SearchResult:
+    """Fetch the page behind a search hit and attach its extracted text.
+    
+    Args:
+        hit: A result returned by one of the ``*_hits`` functions
+        deadline: Optional ``time.monotonic()`` instant after which the fetch
+            is abandoned and the hit's API snippet is used as its content
         
-        # Extract title
-        title = soup.title.string if soup.title else url
+    Returns:
+        A copy of the hit with search_content populated
         
-        # Extract main content
-        paragraphs = [
-            p.get_text() for p in soup.find_all('p')[:MAX_PARAGRAPHS]
-            if p.get_text()
-        ]
+    Raises:
+        ContentFetchError: If the page cannot be fetched or parsed
+    """
+    if deadline is None:
+        search_content = await async_fetch_content_from_url(hit.url)
+    else:
+        try:
+            search_content = await asyncio.wait_for(
+                async_fetch_content_from_url(hit.url),
+                timeout=max(0.0, deadline - time.monotonic())
+            )
+        except asyncio.TimeoutError:
+            logger.info(f"Query deadline reached, using snippet for {hit.url}")
+            search_content = hit.snippet
+    return hit.model_copy(update={"search_content": search_content})
+
+async def _async_fill_all(hits: List[SearchResult], deadline: Optional[float] = None) -> List[SearchResult]:
+    """Fetch content for all hits concurrently, keeping their order and skipping pages that fail."""
+    outcomes = await asyncio.gather(
+        *(async_fill_content(hit, deadline) for hit in hits),
+        return_exceptions=True
+    )
+    results = []
+    for outcome in outcomes:
+        if isinstance(outcome, ContentFetchError):
+            logger.warning(f"Skipping result due to content fetch error: {str(outcome)}")
+            continue
+        if isinstance(outcome, BaseException):
+            raise outcome
+        results.append(outcome)
+    return results
+
+async def async_search_bing(query: str) -> List[SearchResult]:
+    """Asynchronously perform a Bing search for the given query.
+    
+    Args:
+        query: The search query to perform
+    
+    Returns:
+        List of SearchResult objects
         
-        content = ' '.join(paragraphs)
+    Raises:
+        SearchAPIError: If the Bing API request fails
+    """
+    deadline = time.monotonic() + QUERY_FETCH_DEADLINE
+    return await _async_fill_all(await async_bing_hits(query), deadline)
+
+async def async_search_google(query: str) -> List[SearchResult]:
+    """Asynchronously perform a Google search for the given query.
+    
+    Args:
+        query: The search query to perform
+    
+    Returns:
+        List of SearchResult objects
         
-        return SearchResult(
-            question="",  # Not needed for custom URL
-            title=title,
-            url=url,
-            snippet=content[:200] + "...",
-            search_content=content[:MAX_CONTENT_LENGTH],
-            source="custom_url"
+    Raises:
+        SearchAPIError: If the Google API request fails
+    """
+    deadline = time.monotonic() + QUERY_FETCH_DEADLINE
+    return await _async_fill_all(await async_google_hits(query), deadline)
+
+@traced("provider.youtube")
+@circuit_breaker("youtube", error=YouTubeAPIError, retries=1)
+@rate_limit(calls=CALLS_PER_MINUTE, period=60, name="youtube")
+@breaker_latency("youtube")
+@timed(provider_seconds, "youtube")
+async def async_search_youtube(query: str) -> List[SearchResult]:
+    """Asynchronously search YouTube for relevant videos.
+    
+    Args:
+        query: The search query
+        
+    Returns:
+        List of SearchResult objects containing video information
+        
+    Raises:
+        YouTubeAPIError: If the API request fails
+    """
+    request_args = _youtube_request(query)
+
+    try:
+        response = await get_async_client(YOUTUBE_ENDPOINT).get(
+            YOUTUBE_ENDPOINT, timeout=async_search_youtube.breaker.timeout(REQUEST_TIMEOUT), **request_args
         )
+        response.raise_for_status()
+        return _parse_youtube_results(query, response.json())
+        
+    except Exception as e:
+        raise YouTubeAPIError(f"YouTube search failed: {str(e)}")
+
+@traced("search")
+async def async_perform_search(
+    query: str, use_cache: bool = True, failures: Optional[Dict[str, str]] = None
+) -> List[SearchResult]:
+    """Run the Google, Bing, and YouTube searches concurrently on the event loop.
+    
+    Shares the result cache with :func:`perform_search`; stale entries are
+    returned immediately and refreshed in a background task. Concurrent
+    misses for the same normalized query share one search. Results missing
+    a provider that timed out are not cached.
+    
+    Args:
+        query: The search query to run
+        use_cache: Set to False to bypass the result cache
+        failures: Optional dict that receives the error of each provider
+            that failed or ran out of time (nothing on a cache hit)
+    
+    Returns:
+        Combined list of unique SearchResult objects
+    """
+    annotate(query=query, cache="bypass" if not use_cache else "miss")
+    if not use_cache:
+        results, errors = await _async_perform_search_uncached(query)
+    else:
+        key = normalize_query(query)
+        cached = search_cache.get(key)
+        if cached is not None:
+            results, is_stale = cached
+            annotate(cache="stale" if is_stale else "hit")
+            if is_stale and search_cache.begin_refresh(key):
+                task = asyncio.create_task(_async_refresh_search(key, query))
+                _refresh_tasks.add(task)
+                task.add_done_callback(_refresh_tasks.discard)
+            return list(results)
+        results, errors = await async_search_flight.do(key, lambda: _async_search_and_store(key, query))
+
+    if failures is not None:
+        failures.update((name, str(error)) for name, error in errors.items())
+    return list(results)
+
+async def _async_search_and_store(
+    key: str, query: str
+) -> Tuple[List[SearchResult], Dict[str, Exception]]:
+    """Run a search on the event loop and cache its results if it is complete."""
+    results, errors = await _async_perform_search_uncached(query)
+    _store_search(key, results, errors)
+    return results, errors
+
+async def _async_refresh_search(key: str, query: str) -> None:
+    """Re-run a search on the event loop and update its cache entry."""
+    _store_search(key, *await _async_perform_search_uncached(query))
+
+async def _async_perform_search_uncached(
+    query: str
+) -> Tuple[List[SearchResult], Dict[str, Exception]]:
+    """Run the provider searches concurrently and merge their results.
+    
+    Returns once SEARCH_ENOUGH_RESULTS unique results are in or
+    SEARCH_DEADLINE has passed, cancelling whatever is still running.
+    Results are ordered by provider (Bing, Google, YouTube) and rank.
+    
+    Returns:
+        The results, and the error of each provider that failed or was
+        still running at the deadline
+    """
+    deadline = time.monotonic() + SEARCH_DEADLINE
+    ranked = []
+    errors: Dict[str, Exception] = {}
+    events = _async_search_events(query, deadline, errors)
+    try:
+        async for rank, result in events:
+            ranked.append((rank, result))
+            if len(ranked) >= SEARCH_ENOUGH_RESULTS:
+                break
+    except Exception as e:
+        logger.error(f"Error in _async_perform_search_uncached: {str(e)}")
+    finally:
+        await events.aclose()
+    
+    ranked.sort(key=lambda item: item[0])
+    return [result for _, result in ranked], errors
+
+async def _hedged_call(name: str, fetch, query: str) -> List[SearchResult]:
+    """Call a provider, racing a second attempt if the first outlasts its recent p95."""
+    hedge_after = provider_latency.percentile(name, HEDGE_PERCENTILE) if SEARCH_HEDGING else None
+    primary = asyncio.ensure_future(fetch(query))
+    if hedge_after is None:
+        return await primary
+
+    attempts = [primary]
+    try:
+        done, _ = await asyncio.wait(attempts, timeout=hedge_after)
+        if not done:
+            logger.info(f"{name} is slower than its p95 ({hedge_after:.2f}s), sending a hedged request")
+            attempts.append(asyncio.ensure_future(fetch(query)))
+        error = None
+        for attempt in asyncio.as_completed(attempts):
+            try:
+                return await attempt
+            except (SearchAPIError, YouTubeAPIError) as e:
+                error = e
+        raise error
+    finally:
+        for attempt in attempts:
+            attempt.cancel()
+
+async def _call_provider(name: str, fetch, query: str, deadline: float) -> List[SearchResult]:
+    """Call a provider API within its latency budget and the search deadline.
+    
+    Raises:
+        SearchAPIError: If the provider fails or runs out of time
+        YouTubeAPIError: If the YouTube API fails
+    """
+    budget = max(0.0, min(PROVIDER_BUDGETS.get(name, REQUEST_TIMEOUT), deadline - time.monotonic()))
+    started = time.monotonic()
+    try:
+        hits = await asyncio.wait_for(_hedged_call(name, fetch, query), timeout=budget)
+    except asyncio.TimeoutError:
+        # The breaker only sees a cancellation, which it does not count, so a
+        # hung provider is reported here or its circuit would never open
+        breaker = getattr(fetch, "breaker", None)
+        if breaker is not None:
+            breaker.record_failure()
+        raise SearchTimeoutError(f"{name} search exceeded its {budget:.1f}s budget")
+    # Only answers count: timeouts would only report the budget, and errors or
+    # open-circuit rejections return early and would drag the hedge delay down
+    provider_latency.record(name, time.monotonic() - started)
+    return hits
+
+async def _async_search_events(
+    query: str, deadline: float, errors: Optional[Dict[str, Exception]] = None
+) -> AsyncIterator[Tuple[Tuple[int, int], SearchResult]]:
+    """Yield unique results with their (provider, rank) position as they complete.
+    
+    No provider waits on another: YouTube results are emitted as soon as its
+    API answers, and each Bing/Google result as soon as its own page has
+    been fetched. A document already claimed by another result (compared by
+    :func:`document_key`, so mirrors count) is never fetched, and a result
+    whose content nearly duplicates an emitted one is dropped. Everything
+    still running at ``deadline`` (or when the consumer stops early) is
+    cancelled. Provider failures, and providers cut off by the deadline, are
+    recorded in ``errors`` if it is given.
+    """
+    if errors is None:
+        errors = {}
+    running = {"bing", "google", "youtube"}
+    fetch_deadline = min(deadline, time.monotonic() + QUERY_FETCH_DEADLINE)
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+    claimed_urls = set()
+    seen_content = MinHashIndex()
+
+    async def _emit(item: Tuple[Tuple[int, int], SearchResult]) -> None:
+        if seen_content.seen(item[1].search_content or ""):
+            logger.debug(f"Dropping near-duplicate result {item[1].url}")
+            return
+        await queue.put(item)
+
+    async def _emit_page(rank: Tuple[int, int], hit: SearchResult) -> None:
+        try:
+            await _emit((rank, await async_fill_content(hit, fetch_deadline)))
+        except ContentFetchError as e:
+            logger.warning(f"Skipping result due to content fetch error: {str(e)}")
+
+    async def _run_provider(order: int, name: str, fetch, needs_content: bool) -> None:
+        try:
+            hits = await _call_provider(name, fetch, query, deadline)
+        except (SearchAPIError, YouTubeAPIError) as e:
+            logger.error(f"Search engine error: {str(e)}")
+            errors[name] = e
+            return
+        finally:
+            running.discard(name)
+
+        fresh_hits = []
+        for position, hit in enumerate(hits):
+            key = document_key(hit.url)
+            if key not in claimed_urls:
+                claimed_urls.add(key)
+                fresh_hits.append(((order, position), hit))
+        if needs_content:
+            await asyncio.gather(*(_emit_page(rank, hit) for rank, hit in fresh_hits))
+        else:
+            for item in fresh_hits:
+                await _emit(item)
+
+    producers = asyncio.gather(
+        _run_provider(0, "bing", async_bing_hits, needs_content=True),
+        _run_provider(1, "google", async_google_hits, needs_content=True),
+        _run_provider(2, "youtube", async_search_youtube, needs_content=False),
+        return_exceptions=True
+    )
+    producers.add_done_callback(lambda _: queue.put_nowait(finished))
+
+    try:
+        while True:
+            if queue.empty():
+                try:
+                    item = await asyncio.wait_for(
+                        queue.get(), timeout=max(0.0, deadline - time.monotonic())
+                    )
+                except asyncio.TimeoutError:
+                    logger.info(f"Search deadline reached for {query!r}, cancelling stragglers")
+                    for name in running:
+                        errors.setdefault(
+                            name, SearchTimeoutError(f"{name} search did not finish before the deadline")
+                        )
+                    return
+            else:
+                item = queue.get_nowait()
+            if item is finished:
+                return
+            yield item
+    finally:
+        producers.cancel()
+
+async def async_stream_search(query: str, use_cache: bool = True) -> AsyncIterator[SearchResult]:
+    """Yield unique search results as soon as each provider and page fetch completes.
+    
+    Unlike :func:`async_perform_search`, no provider waits on another: YouTube
+    results are emitted as soon as its API answers, and each Bing/Google
+    result is emitted as soon as its own page has been fetched. Mirrors of
+    an already claimed document are never fetched, and near-duplicate
+    content is not emitted again. The stream ends at SEARCH_DEADLINE at the latest.
+    
+    Fresh cached results are replayed at once; a completed stream in which
+    no provider timed out populates the cache shared with
+    :func:`async_perform_search`.
+    
+    Args:
+        query: The search query to run
+        use_cache: Set to False to neither replay nor populate the result cache
+    
+    Yields:
+        Unique SearchResult objects in completion order
+    """
+    annotate(query=query, cache="bypass" if not use_cache else "miss")
+    key = normalize_query(query)
+    cached = search_cache.get(key) if use_cache else None
+    if cached is not None and not cached[1]:
+        annotate(cache="hit")
+        for result in cached[0]:
+            yield result
+        return
+
+    emitted = []
+    errors: Dict[str, Exception] = {}
+    events = _async_search_events(query, time.monotonic() + SEARCH_DEADLINE, errors)
+    try:
+        async for _, item in events:
+            emitted.append(item)
+            yield item
+        if use_cache:
+            _store_search(key, emitted, errors)
+    finally:
+        # Stop outstanding fetches if the consumer goes away early
+        await events.aclose()
+
+async def async_fetch_content_from_custom_url(url: str) -> SearchResult:
+    """Asynchronously fetch and extract content from a custom URL.
+    
+    Args:
+        url: The URL to fetch content from
+    
+    Returns:
+        SearchResult object containing the extracted content
+        
+    Raises:
+        ContentFetchError: If content cannot be fetched or parsed
+    """
+    headers = {"User-Agent": random.choice(USER_AGENTS)}
+
+    try:
+        deadline = time.monotonic() + FETCH_DEADLINE
+
+        async def _download() -> ExtractedPage:
+            async with get_async_client(url).stream(
+                "GET", url, timeout=REQUEST_TIMEOUT, headers=headers
+            ) as response:
+                response.raise_for_status()
+                return await _read_page_async(url, response, _full_text_extractor, deadline)
+
+        page = await asyncio.wait_for(_download(), timeout=FETCH_DEADLINE)
+        return _build_custom_url_result(url, page)
     
     except Exception as e:
         logger.error(f"Error extracting content from {url}: {str(e)}")
-        raise ContentFetchError(f"Failed to fetch content from {url}: {str(e)}")
\ No newline at end of file
+        raise ContentFetchError(f"Failed to fetch content from {url}: {str(e)}")
@@ -0,0 +1,573 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import sys
+import threading
+import zlib
+from typing import Deque, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# "memory" keeps sessions in the worker; "sqlite" and "redis" share them
+# between workers so requests of one session may land on any of them
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_DB = os.getenv(
+    "SESSION_DB",
+    os.path.join(tempfile.gettempdir(), "mini_perplexity_sessions.sqlite3")
+)
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_PREFIX = "mp:session:"
+# Sorted set of session ids scored by last access, so counting sessions
+# does not have to scan the keyspace
+REDIS_INDEX = "mp:sessions"
+# Seconds between background sweeps for expired sessions; 0 disables the
+# reaper and request handlers clean up instead
+SESSION_REAPER_INTERVAL = float(os.getenv("SESSION_REAPER_INTERVAL", 30))
+
+# Memory budgets of the in-memory backend: the oldest items of a session are
+# dropped past SESSION_MAX_BYTES, and least recently used sessions are evicted
+# once all sessions together exceed SESSION_MEMORY_BUDGET
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", 64 * 1024))
+SESSION_MEMORY_BUDGET = int(os.getenv("SESSION_MEMORY_BUDGET", 64 * 1024 * 1024))
+# Messages kept as plain text; older ones are compressed
+SESSION_RECENT_MESSAGES = int(os.getenv("SESSION_RECENT_MESSAGES", 4))
+# Messages shorter than this do not shrink when compressed
+COMPRESS_MIN_BYTES = 256
+# Rough per-item cost of the Python objects around the text
+ITEM_OVERHEAD = 64
+
+
+class SessionStoreError(Exception):
+    """Raised when a session backend cannot be configured"""
+    pass
+
+
+@dataclass
+class SessionData:
+    messages: List[Dict[str, str]]
+    queries: List[str]
+    last_accessed: datetime
+
+    @classmethod
+    def create_new(cls) -> 'SessionData':
+        return cls(
+            messages=[],
+            queries=[],
+            last_accessed=datetime.utcnow()
+        )
+
+
+class SessionStore(ABC):
+    """Interface of the chat session backends.
+
+    Reads return a detached :class:`SessionData` snapshot. Changes are made
+    through the ``append_*`` methods, which only write the new items, so a
+    turn costs the same regardless of how long the history already is.
+    """
+
+    # Whether calls do disk or network I/O and should run off the event loop
+    blocking_io = False
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[SessionData]:
+        """Return a snapshot of the session, or None if it does not exist."""
+
+    @abstractmethod
+    def create(self, session_id: str) -> SessionData:
+        """Create an empty session, replacing any existing one."""
+
+    @abstractmethod
+    def touch(self, session_id: str) -> None:
+        """Set the session's last access time to now."""
+
+    @abstractmethod
+    def append_query(self, session_id: str, query: str) -> None:
+        """Append a query to the session's query list."""
+
+    @abstractmethod
+    def append_messages(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        """Append chat messages to the session history."""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Delete a session.
+
+        Returns:
+            bool: True if the session existed
+        """
+
+    @abstractmethod
+    def cleanup_expired(self, ttl: timedelta) -> int:
+        """Remove sessions not accessed within ``ttl``.
+
+        Returns:
+            int: Number of sessions removed
+        """
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of sessions held."""
+
+
+# Message text is a str while recent and zlib-compressed UTF-8 once older
+_Content = Union[str, bytes]
+
+
+def _item_size(content: _Content) -> int:
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return len(content) + ITEM_OVERHEAD
+
+
+class _StoredSession:
+    """Compact in-memory form of a session with its byte footprint"""
+
+    __slots__ = ("queries", "messages", "last_accessed", "size")
+
+    def __init__(self, last_accessed: datetime):
+        self.queries: Deque[str] = deque()
+        self.messages: Deque[Tuple[str, _Content]] = deque()
+        self.last_accessed = last_accessed
+        self.size = ITEM_OVERHEAD
+
+    def snapshot(self) -> SessionData:
+        return SessionData(
+            messages=[
+                {
+                    "role": role,
+                    "content": zlib.decompress(content).decode("utf-8")
+                    if isinstance(content, bytes) else content,
+                }
+                for role, content in self.messages
+            ],
+            queries=list(self.queries),
+            last_accessed=self.last_accessed
+        )
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions held in the worker process, ordered by last access.
+
+    Sessions share one TTL, so the least recently accessed session is always
+    the next to expire. Keeping them in access order makes :meth:`touch` O(1)
+    and lets :meth:`cleanup_expired` stop at the first live session instead
+    of scanning all of them.
+
+    Memory is bounded by byte accounting: messages older than the last
+    ``recent_messages`` are compressed, a session over ``max_session_bytes``
+    loses its oldest items, and when the store exceeds ``memory_budget`` the
+    least recently used sessions are evicted.
+    """
+
+    def __init__(
+        self,
+        max_session_bytes: int = SESSION_MAX_BYTES,
+        memory_budget: int = SESSION_MEMORY_BUDGET,
+        recent_messages: int = SESSION_RECENT_MESSAGES,
+    ):
+        """Initialize the store.
+
+        Args:
+            max_session_bytes: Approximate bytes one session may hold
+            memory_budget: Approximate bytes all sessions together may hold
+            recent_messages: Number of latest messages kept uncompressed
+        """
+        self.max_session_bytes = max_session_bytes
+        self.memory_budget = memory_budget
+        self.recent_messages = recent_messages
+        self._sessions: "OrderedDict[str, _StoredSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes_used = 0
+        self.evictions = 0
+
+    def get(self, session_id: str) -> Optional[SessionData]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session.snapshot() if session is not None else None
+
+    def create(self, session_id: str) -> SessionData:
+        session = SessionData.create_new()
+        with self._lock:
+            self._discard(session_id)
+            stored = self._sessions[session_id] = _StoredSession(session.last_accessed)
+            self.bytes_used += stored.size
+            self._enforce_budget()
+        return session
+
+    def touch(self, session_id: str) -> None:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_accessed = datetime.utcnow()
+                self._sessions.move_to_end(session_id)
+
+    def append_query(self, session_id: str, query: str) -> None:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            session.queries.append(query)
+            self._grow(session, _item_size(query))
+            self._trim(session)
+            self._enforce_budget()
+
+    def append_messages(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            for message in messages:
+                role, content = sys.intern(message["role"]), message["content"]
+                session.messages.append((role, content))
+                self._grow(session, _item_size(content))
+            self._compress_older(session, len(messages))
+            self._trim(session)
+            self._enforce_budget()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._discard(session_id)
+
+    def _discard(self, session_id: str) -> bool:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        self.bytes_used -= session.size
+        return True
+
+    def _grow(self, session: _StoredSession, size: int) -> None:
+        session.size += size
+        self.bytes_used += size
+
+    def _compress_older(self, session: _StoredSession, added: int) -> None:
+        # Compress the messages that the latest ``added`` pushed out of the recent window
+        boundary = len(session.messages) - self.recent_messages
+        for index in range(max(0, boundary - added), max(0, boundary)):
+            role, content = session.messages[index]
+            raw = content.encode("utf-8")
+            if len(raw) < COMPRESS_MIN_BYTES:
+                continue
+            packed = zlib.compress(raw)
+            if len(packed) < len(raw):
+                session.messages[index] = (role, packed)
+                self._grow(session, len(packed) - len(raw))
+
+    def _trim(self, session: _StoredSession) -> None:
+        # Drop the oldest items until the session fits, always keeping the latest turn
+        while session.size > self.max_session_bytes:
+            if len(session.messages) > 2:
+                self._grow(session, -_item_size(session.messages.popleft()[1]))
+            elif len(session.queries) > 1:
+                self._grow(session, -_item_size(session.queries.popleft()))
+            else:
+                break
+
+    def _enforce_budget(self) -> None:
+        # Evict least recently used sessions, but never the last one left
+        while self.bytes_used > self.memory_budget and len(self._sessions) > 1:
+            _, session = self._sessions.popitem(last=False)
+            self.bytes_used -= session.size
+            self.evictions += 1
+
+    def cleanup_expired(self, ttl: timedelta) -> int:
+        cutoff = datetime.utcnow() - ttl
+        removed = 0
+        with self._lock:
+            while self._sessions:
+                session_id, session_data = next(iter(self._sessions.items()))
+                if session_data.last_accessed >= cutoff:
+                    break
+                self._discard(session_id)
+                removed += 1
+        return removed
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a host-local SQLite database shared by all workers.
+
+    Queries and messages are rows in one ``session_items`` table, so appending
+    a turn inserts two small rows instead of rewriting the session. Expiry
+    uses the index on ``last_accessed``, so a sweep only visits expired rows.
+    """
+
+    blocking_io = True
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS sessions ("
+        " id TEXT PRIMARY KEY, last_accessed REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS session_items ("
+        " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,"
+        " role TEXT,"  # NULL for queries, the chat role for messages
+        " content TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS session_items_by_session ON session_items (session_id, seq)",
+        "CREATE INDEX IF NOT EXISTS sessions_by_access ON sessions (last_accessed)",
+    )
+
+    def __init__(self, path: str):
+        """Open (and create if needed) the database.
+
+        Args:
+            path: Location of the SQLite database file
+        """
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> Optional[SessionData]:
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT last_accessed FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        session = SessionData(
+            messages=[],
+            queries=[],
+            last_accessed=datetime.utcfromtimestamp(row[0])
+        )
+        for role, content in conn.execute(
+            "SELECT role, content FROM session_items WHERE session_id = ? ORDER BY seq",
+            (session_id,)
+        ):
+            if role is None:
+                session.queries.append(content)
+            else:
+                session.messages.append({"role": role, "content": content})
+        return session
+
+    def create(self, session_id: str) -> SessionData:
+        session = SessionData.create_new()
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            conn.execute(
+                "INSERT INTO sessions (id, last_accessed) VALUES (?, ?)",
+                (session_id, _timestamp(session.last_accessed))
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return session
+
+    def touch(self, session_id: str) -> None:
+        self._connection().execute(
+            "UPDATE sessions SET last_accessed = ? WHERE id = ?",
+            (_timestamp(datetime.utcnow()), session_id)
+        )
+
+    def _append(self, session_id: str, items: List[tuple]) -> None:
+        self._connection().executemany(
+            "INSERT INTO session_items (session_id, role, content) "
+            "SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM sessions WHERE id = ?)",
+            [(session_id, role, content, session_id) for role, content in items]
+        )
+
+    def append_query(self, session_id: str, query: str) -> None:
+        self._append(session_id, [(None, query)])
+
+    def append_messages(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        self._append(session_id, [(m["role"], m["content"]) for m in messages])
+
+    def delete(self, session_id: str) -> bool:
+        cursor = self._connection().execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def cleanup_expired(self, ttl: timedelta) -> int:
+        cutoff = _timestamp(datetime.utcnow() - ttl)
+        cursor = self._connection().execute(
+            "DELETE FROM sessions WHERE last_accessed < ?", (cutoff,)
+        )
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class RedisSessionStore(SessionStore):
+    """Sessions in Redis (or any server speaking the Redis protocol).
+
+    Each session is three keys: a hash holding the access time and two lists
+    of compact JSON items. Expiry is delegated to Redis key TTLs, refreshed on
+    every access, so no cleanup sweep is needed. Writes to an existing session
+    run in a WATCH transaction on the hash, so an append racing with expiry or
+    deletion cannot leave list keys behind without their session.
+    """
+
+    blocking_io = True
+
+    def __init__(self, url: str, ttl: timedelta):
+        """Connect to the server.
+
+        Args:
+            url: Redis connection URL
+            ttl: Idle time after which Redis drops a session
+
+        Raises:
+            SessionStoreError: If the ``redis`` package is not installed
+        """
+        try:
+            import redis
+        except ImportError as e:
+            raise SessionStoreError("SESSION_BACKEND=redis requires the 'redis' package") from e
+        self._redis = redis.Redis.from_url(url)
+        self._ttl = int(ttl.total_seconds())
+
+    @staticmethod
+    def _keys(session_id: str):
+        base = f"{REDIS_PREFIX}{session_id}"
+        return base, f"{base}:queries", f"{base}:messages"
+
+    def _expire(self, pipe, session_id: str) -> None:
+        for key in self._keys(session_id):
+            pipe.expire(key, self._ttl)
+
+    def _update(self, session_id: str, write=None) -> None:
+        """Apply ``write`` and refresh the TTLs, only if the session exists."""
+        meta_key = self._keys(session_id)[0]
+
+        def update(pipe) -> None:
+            if not pipe.exists(meta_key):
+                return
+            now = _timestamp(datetime.utcnow())
+            pipe.multi()
+            if write is not None:
+                write(pipe)
+            pipe.hset(meta_key, "last_accessed", now)
+            pipe.zadd(REDIS_INDEX, {session_id: now})
+            self._expire(pipe, session_id)
+
+        self._redis.transaction(update, meta_key)
+
+    def get(self, session_id: str) -> Optional[SessionData]:
+        meta_key, queries_key, messages_key = self._keys(session_id)
+        pipe = self._redis.pipeline()
+        pipe.hget(meta_key, "last_accessed")
+        pipe.lrange(queries_key, 0, -1)
+        pipe.lrange(messages_key, 0, -1)
+        last_accessed, queries, messages = pipe.execute()
+        if last_accessed is None:
+            return None
+        return SessionData(
+            messages=[
+                {"role": role, "content": content}
+                for role, content in map(json.loads, messages)
+            ],
+            queries=[query.decode("utf-8") for query in queries],
+            last_accessed=datetime.utcfromtimestamp(float(last_accessed))
+        )
+
+    def create(self, session_id: str) -> SessionData:
+        session = SessionData.create_new()
+        meta_key, queries_key, messages_key = self._keys(session_id)
+        pipe = self._redis.pipeline()
+        pipe.delete(meta_key, queries_key, messages_key)
+        last_accessed = _timestamp(session.last_accessed)
+        pipe.hset(meta_key, "last_accessed", last_accessed)
+        pipe.expire(meta_key, self._ttl)
+        pipe.zadd(REDIS_INDEX, {session_id: last_accessed})
+        pipe.execute()
+        return session
+
+    def touch(self, session_id: str) -> None:
+        self._update(session_id)
+
+    def append_query(self, session_id: str, query: str) -> None:
+        _, queries_key, _ = self._keys(session_id)
+        self._update(session_id, lambda pipe: pipe.rpush(queries_key, query))
+
+    def append_messages(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        _, _, messages_key = self._keys(session_id)
+        items = [
+            json.dumps([m["role"], m["content"]], separators=(",", ":"))
+            for m in messages
+        ]
+        self._update(session_id, lambda pipe: pipe.rpush(messages_key, *items))
+
+    def delete(self, session_id: str) -> bool:
+        pipe = self._redis.pipeline()
+        pipe.delete(*self._keys(session_id))
+        pipe.zrem(REDIS_INDEX, session_id)
+        deleted, _ = pipe.execute()
+        return deleted > 0
+
+    def cleanup_expired(self, ttl: timedelta) -> int:
+        # Redis expires the keys itself
+        return 0
+
+    def __len__(self) -> int:
+        # Sessions idle past the TTL have expired keys; drop them from the index
+        cutoff = _timestamp(datetime.utcnow()) - self._ttl
+        pipe = self._redis.pipeline()
+        pipe.zremrangebyscore(REDIS_INDEX, "-inf", f"({cutoff}")
+        pipe.zcard(REDIS_INDEX)
+        return pipe.execute()[1]
+
+
+def _timestamp(value: datetime) -> float:
+    """Seconds since the epoch for a naive UTC datetime."""
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+def create_session_store(ttl: timedelta) -> SessionStore:
+    """Create the session store selected by SESSION_BACKEND.
+
+    Args:
+        ttl: Idle time after which sessions expire
+
+    Returns:
+        SessionStore: The configured backend
+    """
+    if SESSION_BACKEND == "sqlite":
+        return SQLiteSessionStore(SESSION_DB)
+    if SESSION_BACKEND == "redis":
+        return RedisSessionStore(REDIS_URL, ttl)
+    if SESSION_BACKEND != "memory":
+        logger.warning(f"Unknown SESSION_BACKEND {SESSION_BACKEND!r}, using memory")
+    return MemorySessionStore()
+
+
+async def reap_expired_sessions(store: SessionStore, ttl: timedelta, interval: float) -> None:
+    """Remove expired sessions every ``interval`` seconds until cancelled.
+
+    Args:
+        store: The session store to sweep
+        ttl: Idle time after which sessions expire
+        interval: Seconds between sweeps
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if store.blocking_io:
+                removed = await asyncio.to_thread(store.cleanup_expired, ttl)
+            else:
+                removed = store.cleanup_expired(ttl)
+            if removed:
+                logger.debug(f"Reaped {removed} expired sessions")
+        except Exception as e:
+            logger.warning(f"Session cleanup failed: {str(e)}")
@@ -0,0 +1,123 @@
+from collections import OrderedDict
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry expiry and a stale window.
+
+    An entry is fresh for ``ttl`` seconds after it was stored. For a further
+    ``stale_ttl`` seconds it is still returned (flagged as stale) so callers
+    can serve it immediately while refreshing it in the background. After
+    that it is treated as missing. When more than ``max_size`` entries are
+    stored, the least recently used one is evicted.
+    """
+
+    def __init__(self, max_size: int, ttl: float, stale_ttl: float = 0.0):
+        """Initialize the cache.
+
+        Args:
+            max_size: Maximum number of entries kept
+            ttl: Seconds an entry stays fresh
+            stale_ttl: Extra seconds an expired entry may still be served
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Tuple[Any, bool]]:
+        """Look up a key.
+
+        Args:
+            key: The cache key
+
+        Returns:
+            ``(value, is_stale)`` if the key is usable, otherwise None
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, value = entry
+            age = now - stored_at
+            if age > self.ttl + self.stale_ttl:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            if age > self.ttl:
+                self.stale_hits += 1
+                return value, True
+            self.hits += 1
+            return value, False
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entries if needed.
+
+        Args:
+            key: The cache key
+            value: The value to store
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            self._refreshing.discard(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def begin_refresh(self, key: Hashable) -> bool:
+        """Claim the right to refresh a stale key.
+
+        Returns:
+            bool: True for the first caller; False while a refresh is in flight
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key: Hashable) -> None:
+        """Release a refresh claim without storing a new value."""
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._refreshing.clear()
+            self.hits = self.stale_hits = self.misses = self.evictions = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether ``key`` has a fresh or stale entry, without counting a hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.monotonic() - entry[0] <= self.ttl + self.stale_ttl
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the current size and hit/miss counters."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,380 @@
+from functools import wraps
+import inspect
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Type
+
+import httpx
+import requests
+
+from app.utils.latency import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+# Consecutive failures that open a circuit, and seconds it stays open before
+# a single trial call is let through
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", 30))
+# Adaptive timeouts are this multiple of the recent p99 latency, never below
+# the breaker's minimum nor above the caller's default
+TIMEOUT_MULTIPLIER = 2.0
+MIN_TIMEOUT = 1.0
+# Retries may add at most this fraction of extra calls on top of first tries
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", 0.1))
+RETRY_BUDGET_MAX = 10.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class RetryBudget:
+    """Caps retries to a fraction of calls so retries cannot multiply load.
+
+    Every first attempt deposits ``ratio`` of a token and every retry spends a
+    whole one, so sustained failures allow at most ``ratio`` retries per call.
+    """
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, max_tokens: float = RETRY_BUDGET_MAX):
+        """Initialize the budget.
+
+        Args:
+            ratio: Retries allowed per first attempt
+            max_tokens: Retries that can be saved up while the upstream is healthy
+        """
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        """Credit the budget for one first attempt."""
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget if it has one."""
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because its circuit is open"""
+    pass
+
+
+class CircuitBreaker:
+    """Closed/open/half-open circuit breaker for one upstream.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls are rejected at once. After ``reset_timeout`` seconds one trial
+    call is let through (half-open); its outcome closes or re-opens the
+    circuit. The breaker also tracks latency to derive adaptive timeouts.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+        min_timeout: float = MIN_TIMEOUT,
+    ):
+        """Initialize the breaker.
+
+        Args:
+            name: Upstream name, used in logs and the status report
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a trial call
+            min_timeout: Lower bound for adaptive timeouts
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.min_timeout = min_timeout
+        self.latency = LatencyTracker()
+        self.retry_budget = RetryBudget()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Current state; an open circuit past its reset timeout reports half-open."""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may be made now; admits one trial call when half-open."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = HALF_OPEN
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self, seconds: Optional[float] = None) -> None:
+        """Close the circuit after a successful call.
+
+        Args:
+            seconds: Duration of the call, used for adaptive timeouts
+        """
+        if seconds is not None:
+            self.latency.record(self.name, seconds)
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        """Count a failed call, opening the circuit once the threshold is reached."""
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning(f"Circuit for {self.name} opened after {self._failures} failures")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Give back a trial slot taken by a call that was cancelled or did not count."""
+        with self._lock:
+            self._probing = False
+
+    def timeout(self, default: float) -> float:
+        """Timeout for the next call, adapted to recent latency.
+
+        Args:
+            default: Timeout used until enough calls have been observed, and
+                the upper bound afterwards
+
+        Returns:
+            float: Seconds
+        """
+        p99 = self.latency.percentile(self.name, 0.99)
+        if p99 is None:
+            return default
+        return max(self.min_timeout, min(default, p99 * TIMEOUT_MULTIPLIER))
+
+    def status(self) -> Dict[str, Any]:
+        """State, failure count, latency and retry budget for reporting."""
+        report: Dict[str, Any] = {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "retry_tokens": round(self.retry_budget.tokens, 2),
+        }
+        report.update(self.latency.snapshot().get(self.name, {}))
+        return report
+
+
+# Breakers created by @circuit_breaker, by name
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, min_timeout: float = MIN_TIMEOUT) -> CircuitBreaker:
+    """Return the shared breaker for ``name``, creating it on first use.
+
+    Args:
+        name: Upstream name; the blocking and async variants of a call share it
+        min_timeout: Lower bound for adaptive timeouts of a new breaker
+
+    Returns:
+        CircuitBreaker: The breaker for the upstream
+    """
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name, min_timeout=min_timeout))
+    return breaker
+
+
+def breaker_status() -> Dict[str, Dict[str, Any]]:
+    """Report the state of every named circuit breaker."""
+    return {name: breaker.status() for name, breaker in _breakers.items()}
+
+
+def is_transient_failure(error: BaseException) -> bool:
+    """Whether an error shows that the upstream itself is failing.
+
+    Timeouts, connection errors and 5xx responses count. 4xx responses (bad
+    input, credentials, 429 throttling) and errors raised before any request
+    was made (e.g. missing credentials) do not, so clients cannot open a
+    circuit for everyone. The exception chain is searched, so errors wrapped
+    in the caller's own error type are recognised.
+
+    Args:
+        error: The exception a guarded call raised
+
+    Returns:
+        bool: True if the call should count as a failure and may be retried
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        status = getattr(getattr(error, "response", None), "status_code", None)
+        if isinstance(status, int):
+            return status >= 500
+        if isinstance(error, (
+            TimeoutError,
+            ConnectionError,
+            requests.exceptions.Timeout,
+            requests.exceptions.ConnectionError,
+            httpx.TransportError,
+        )):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def breaker_latency(name: str, min_timeout: float = MIN_TIMEOUT) -> Callable:
+    """Decorator feeding the duration of successful calls to a breaker's latency window.
+
+    Place it beneath ``@rate_limit`` so adaptive timeouts are derived from the
+    upstream call alone, not from time spent waiting for quota. A
+    ``@circuit_breaker`` above a function measured this way does not time
+    the call itself.
+
+    Args:
+        name: Upstream name of the breaker
+        min_timeout: Lower bound for adaptive timeouts if the breaker is new
+
+    Returns:
+        Decorator function
+    """
+    breaker = get_breaker(name, min_timeout)
+
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                started = time.monotonic()
+                result = await func(*args, **kwargs)
+                breaker.latency.record(name, time.monotonic() - started)
+                return result
+            async_wrapper.measures_latency = True
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            started = time.monotonic()
+            result = func(*args, **kwargs)
+            breaker.latency.record(name, time.monotonic() - started)
+            return result
+        wrapper.measures_latency = True
+        return wrapper
+    return decorator
+
+
+def circuit_breaker(
+    name: str,
+    error: Type[Exception] = CircuitOpenError,
+    retries: int = 0,
+    min_timeout: float = MIN_TIMEOUT,
+    is_failure: Callable[[BaseException], bool] = is_transient_failure,
+) -> Callable:
+    """Decorator guarding calls to an upstream with a circuit breaker.
+
+    Works for both plain and ``async`` functions. While the circuit is open,
+    calls fail immediately with ``error``. Failed calls are retried up to
+    ``retries`` times while the breaker's retry budget allows. Errors that
+    ``is_failure`` rejects are raised at once without touching the breaker's
+    state. The breaker is exposed as ``wrapper.breaker``, so the function can
+    ask it for an adaptive timeout.
+
+    Args:
+        name: Upstream name shared by every function guarding the same upstream
+        error: Exception raised when the circuit is open, so callers can keep
+            handling the upstream's usual error type
+        retries: Extra attempts after a failure
+        min_timeout: Lower bound for the breaker's adaptive timeouts
+        is_failure: Decides which errors count as upstream failures and are
+            retried; by default timeouts, connection errors and 5xx responses
+
+    Returns:
+        Decorator function
+    """
+    breaker = get_breaker(name, min_timeout)
+
+    def _rejected() -> Exception:
+        return error(f"Circuit for {name} is open; skipping call")
+
+    def _may_retry(attempt: int) -> bool:
+        return attempt < retries and breaker.state == CLOSED and breaker.retry_budget.try_spend()
+
+    def decorator(func: Callable) -> Callable:
+        # Timed further down (see breaker_latency); decorators copy the flag up
+        measured = getattr(func, "measures_latency", False)
+
+        def _elapsed(started: float) -> Optional[float]:
+            return None if measured else time.monotonic() - started
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                breaker.retry_budget.deposit()
+                attempt = 0
+                while True:
+                    if not breaker.allow():
+                        raise _rejected()
+                    started = time.monotonic()
+                    try:
+                        result = await func(*args, **kwargs)
+                    except Exception as e:
+                        if not is_failure(e):
+                            breaker.release()
+                            raise
+                        breaker.record_failure()
+                        if not _may_retry(attempt):
+                            raise
+                        attempt += 1
+                        continue
+                    except BaseException:
+                        # Cancelled by a deadline: neither a success nor a failure
+                        breaker.release()
+                        raise
+                    breaker.record_success(_elapsed(started))
+                    return result
+            async_wrapper.breaker = breaker
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            breaker.retry_budget.deposit()
+            attempt = 0
+            while True:
+                if not breaker.allow():
+                    raise _rejected()
+                started = time.monotonic()
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    if not is_failure(e):
+                        breaker.release()
+                        raise
+                    breaker.record_failure()
+                    if not _may_retry(attempt):
+                        raise
+                    attempt += 1
+                    continue
+                breaker.record_success(_elapsed(started))
+                return result
+        wrapper.breaker = breaker
+        return wrapper
+    return decorator
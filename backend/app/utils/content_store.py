@@ -0,0 +1,255 @@
+from dataclasses import dataclass
+import asyncio
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, Mapping, Optional
+
+from app.utils.urls import canonicalize_url
+
+logger = logging.getLogger(__name__)
+
+CONTENT_STORE_ENABLED = os.getenv("CONTENT_STORE", "true").lower() == "true"
+CONTENT_STORE_PATH = os.getenv(
+    "CONTENT_STORE_PATH",
+    os.path.join(tempfile.gettempdir(), "mini_perplexity_content.sqlite3")
+)
+# Pages younger than this are served without contacting the origin
+CONTENT_FRESH_TTL = float(os.getenv("CONTENT_FRESH_TTL", 3600))
+# Pages not fetched or revalidated for this long are pruned
+CONTENT_MAX_AGE = float(os.getenv("CONTENT_MAX_AGE", 7 * 24 * 3600))
+# Seconds between background sweeps for expired result handles; 0 disables them
+RESULT_PRUNE_INTERVAL = float(os.getenv("RESULT_PRUNE_INTERVAL", 300))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    content BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL
+)
+"""
+
+# Search results handed out to clients, keyed by handle, so a follow-up
+# request can be resolved by any worker
+RESULTS_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS results (
+        handle TEXT PRIMARY KEY,
+        payload BLOB NOT NULL,
+        stored_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS results_stored_at ON results (stored_at)",
+)
+
+
+@dataclass
+class StoredPage:
+    """Extracted page text together with its HTTP validators"""
+    content: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+    def is_fresh(self, ttl: float = CONTENT_FRESH_TTL) -> bool:
+        """Whether the page can be served without revalidation."""
+        return time.time() - self.fetched_at < ttl
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Request headers that let the origin answer 304 Not Modified."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ContentStore:
+    """Disk-backed, zlib-compressed store of extracted page text.
+
+    The store is a single SQLite database in WAL mode, so every gunicorn
+    worker on the host can read and write it concurrently. Each thread gets
+    its own connection.
+    """
+
+    def __init__(self, path: str):
+        """Open (and create if needed) the store.
+
+        Args:
+            path: Location of the SQLite database file
+        """
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(SCHEMA)
+        for statement in RESULTS_SCHEMA:
+            conn.execute(statement)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, url: str) -> Optional[StoredPage]:
+        """Look up the stored text for a URL.
+
+        Args:
+            url: The page URL, canonicalized before lookup
+
+        Returns:
+            The stored page, or None if it has never been fetched
+        """
+        row = self._connection().execute(
+            "SELECT content, etag, last_modified, fetched_at FROM pages WHERE url = ?",
+            (canonicalize_url(url),)
+        ).fetchone()
+        if row is None:
+            return None
+        content, etag, last_modified, fetched_at = row
+        return StoredPage(
+            content=zlib.decompress(content).decode("utf-8"),
+            etag=etag,
+            last_modified=last_modified,
+            fetched_at=fetched_at
+        )
+
+    def put(
+        self,
+        url: str,
+        content: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None
+    ) -> None:
+        """Store (or replace) the extracted text of a page.
+
+        Args:
+            url: The page URL
+            content: The extracted text
+            etag: The response ETag header, if any
+            last_modified: The response Last-Modified header, if any
+        """
+        self._connection().execute(
+            "INSERT OR REPLACE INTO pages (url, content, etag, last_modified, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                canonicalize_url(url),
+                zlib.compress(content.encode("utf-8")),
+                etag,
+                last_modified,
+                time.time(),
+            )
+        )
+
+    def touch(self, url: str) -> None:
+        """Mark a page as freshly revalidated after a 304 response."""
+        self._connection().execute(
+            "UPDATE pages SET fetched_at = ? WHERE url = ?",
+            (time.time(), canonicalize_url(url))
+        )
+
+    def put_results(self, payloads: Mapping[str, str]) -> None:
+        """Store serialized results by handle in a single transaction.
+
+        Expired results are left to :meth:`prune_results`, so writes stay cheap.
+
+        Args:
+            payloads: Serialized result for each handle
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO results (handle, payload, stored_at) VALUES (?, ?, ?)",
+                [(handle, zlib.compress(payload.encode("utf-8")), now) for handle, payload in payloads.items()]
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get_results(self, handles: Iterable[str], max_age: float) -> Dict[str, str]:
+        """Look up serialized results stored by :meth:`put_results`.
+
+        Args:
+            handles: The handles to look up
+            max_age: Results stored longer ago than this are ignored
+
+        Returns:
+            The serialized result of each handle found
+        """
+        handles = list(handles)
+        if not handles:
+            return {}
+        rows = self._connection().execute(
+            f"SELECT handle, payload FROM results WHERE stored_at >= ? "
+            f"AND handle IN ({', '.join('?' * len(handles))})",
+            (time.time() - max_age, *handles)
+        ).fetchall()
+        return {handle: zlib.decompress(payload).decode("utf-8") for handle, payload in rows}
+
+    def prune(self, max_age: float = CONTENT_MAX_AGE) -> int:
+        """Delete pages that have not been fetched or revalidated recently.
+
+        Returns:
+            int: Number of pages removed
+        """
+        cursor = self._connection().execute(
+            "DELETE FROM pages WHERE fetched_at < ?",
+            (time.time() - max_age,)
+        )
+        return cursor.rowcount
+
+    def prune_results(self, max_age: float) -> int:
+        """Delete results stored longer ago than ``max_age``.
+
+        Returns:
+            int: Number of results removed
+        """
+        cursor = self._connection().execute(
+            "DELETE FROM results WHERE stored_at < ?",
+            (time.time() - max_age,)
+        )
+        return cursor.rowcount
+
+
+def open_content_store() -> Optional[ContentStore]:
+    """Open the configured content store, or return None if it is disabled or unusable."""
+    if not CONTENT_STORE_ENABLED:
+        return None
+    try:
+        store = ContentStore(CONTENT_STORE_PATH)
+        store.prune()
+        return store
+    except sqlite3.Error as e:
+        logger.warning(f"Content store unavailable at {CONTENT_STORE_PATH}: {str(e)}")
+        return None
+
+
+async def prune_results_periodically(store: ContentStore, max_age: float, interval: float) -> None:
+    """Delete expired result handles every ``interval`` seconds until cancelled.
+
+    Args:
+        store: The content store to sweep
+        max_age: Seconds a result stays resolvable
+        interval: Seconds between sweeps
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await asyncio.to_thread(store.prune_results, max_age)
+            if removed:
+                logger.debug(f"Pruned {removed} expired result handles")
+        except sqlite3.Error as e:
+            logger.warning(f"Result handle cleanup failed: {str(e)}")
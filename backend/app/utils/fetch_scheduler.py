@@ -0,0 +1,71 @@
+import asyncio
+from contextlib import asynccontextmanager
+import os
+import weakref
+from typing import AsyncIterator, Dict, List
+from urllib.parse import urlsplit
+
+# Page downloads allowed in flight at once per worker, and per origin host
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", 16))
+FETCH_PER_HOST = int(os.getenv("FETCH_PER_HOST", 2))
+
+
+class FetchScheduler:
+    """Admission control for page downloads on one event loop.
+
+    Every download holds one of ``max_concurrency`` global slots and one of
+    ``per_host`` slots for its host, so a burst of queries cannot open
+    unbounded sockets or hammer a single site.
+    """
+
+    def __init__(self, max_concurrency: int = FETCH_CONCURRENCY, per_host: int = FETCH_PER_HOST):
+        """Initialize the scheduler.
+
+        Args:
+            max_concurrency: Downloads allowed in flight at once
+            per_host: Downloads allowed in flight at once for a single host
+        """
+        self.per_host = per_host
+        self._global = asyncio.Semaphore(max_concurrency)
+        # host -> [semaphore, number of holders and waiters]
+        self._hosts: Dict[str, List] = {}
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        """Wait for a global and a per-host slot for ``url``.
+
+        Args:
+            url: The URL about to be downloaded
+        """
+        host = urlsplit(url).hostname or ""
+        entry = self._hosts.setdefault(host, [asyncio.Semaphore(self.per_host), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._global:
+                    yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                # Drop idle hosts so the table only holds hosts in use
+                del self._hosts[host]
+
+    @property
+    def active_hosts(self) -> int:
+        """Number of hosts with downloads in flight or waiting."""
+        return len(self._hosts)
+
+
+# asyncio primitives belong to a single loop, so schedulers are kept per loop
+_schedulers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, FetchScheduler]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_fetch_scheduler() -> FetchScheduler:
+    """Return the fetch scheduler for the running event loop."""
+    loop = asyncio.get_running_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        scheduler = _schedulers[loop] = FetchScheduler()
+    return scheduler
@@ -0,0 +1,246 @@
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+import codecs
+import re
+from typing import Callable, List, Optional
+
+# Bytes handed to the parser at a time; the limits are checked between chunks
+CHUNK_SIZE = 16 * 1024
+
+# Tags whose start or end implicitly closes an open <p> (HTML "p" end-tag rules)
+P_CLOSERS = frozenset({
+    "address", "article", "aside", "blockquote", "body", "div", "dl", "fieldset",
+    "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6",
+    "header", "hr", "html", "li", "main", "nav", "ol", "pre", "section", "table",
+    "td", "th", "tr", "ul",
+})
+# Elements whose text is never part of the readable content
+SKIPPED = frozenset({"script", "style", "noscript", "template"})
+
+META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+HEADER_CHARSET = re.compile(r"""charset=["']?([\w-]+)""", re.IGNORECASE)
+
+HTML_CONTENT_TYPES = frozenset({"text/html", "application/xhtml+xml"})
+# Leading bytes of common non-HTML formats that search APIs link to
+BINARY_SIGNATURES = (
+    b"%PDF", b"PK\x03\x04", b"\x89PNG", b"GIF8", b"\xff\xd8\xff", b"\x1f\x8b",
+    b"RIFF", b"OggS", b"ID3", b"\xd0\xcf\x11\xe0", b"\x7fELF", b"MZ",
+)
+UTF16_BOMS = (b"\xff\xfe", b"\xfe\xff")
+
+
+def is_html_content_type(content_type: Optional[str]) -> bool:
+    """Whether a Content-Type header allows the body to be HTML.
+
+    A missing header is accepted; the body is then checked with
+    :func:`looks_binary` instead.
+    """
+    if not content_type:
+        return True
+    return content_type.split(";", 1)[0].strip().lower() in HTML_CONTENT_TYPES
+
+
+def looks_binary(head: bytes) -> bool:
+    """Whether the first bytes of a body identify a non-text format."""
+    if head.startswith(BINARY_SIGNATURES):
+        return True
+    return b"\x00" in head[:512] and not head.startswith(UTF16_BOMS)
+
+
+def charset_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    """Return the charset declared in a Content-Type header, if any.
+
+    Unlike ``requests``' ``Response.encoding`` this does not fall back to
+    ISO-8859-1 for ``text/*`` responses, so a ``<meta charset>`` in the
+    document still gets a chance to apply.
+    """
+    if not content_type:
+        return None
+    match = HEADER_CHARSET.search(content_type)
+    return match.group(1) if match else None
+
+
+@dataclass
+class ExtractedPage:
+    """Title and leading paragraphs of an HTML document"""
+    title: Optional[str] = None
+    paragraphs: List[str] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        """The paragraphs joined into a single string."""
+        return " ".join(self.paragraphs)
+
+
+class ParagraphExtractor(HTMLParser):
+    """Incremental extractor for the ``<title>`` and the first ``<p>`` elements.
+
+    Bytes are pushed with :meth:`feed_bytes` as they arrive. Once ``max_paragraphs``
+    paragraphs have been seen or the collected text reaches ``max_chars``,
+    :attr:`done` becomes True and further input is ignored, so callers can
+    stop reading the document.
+    """
+
+    def __init__(
+        self,
+        max_paragraphs: int,
+        max_chars: int,
+        transform: Optional[Callable[[str], str]] = None,
+        encoding: Optional[str] = None,
+    ):
+        """Initialize the extractor.
+
+        Args:
+            max_paragraphs: Number of ``<p>`` elements to consider (empty ones count)
+            max_chars: Stop once the joined paragraph text reaches this length
+            transform: Optional function applied to each paragraph's text
+            encoding: Document encoding; sniffed from a ``<meta>`` tag if omitted
+        """
+        super().__init__(convert_charrefs=True)
+        self.max_paragraphs = max_paragraphs
+        self.max_chars = max_chars
+        self.transform = transform
+        self.encoding = encoding
+        self.done = False
+        self._decoder = None
+        self._pending = b""
+        self._page = ExtractedPage()
+        self._paragraphs_seen = 0
+        self._text_length = 0
+        self._paragraph: Optional[List[str]] = None
+        self._paragraph_length = 0
+        self._title: Optional[List[str]] = None
+        self._skip_depth = 0
+
+    # Input handling
+
+    def feed_bytes(self, data: bytes) -> None:
+        """Push the next chunk of the raw document.
+
+        Args:
+            data: Raw bytes in document order
+        """
+        if self.done:
+            return
+        if self._decoder is None:
+            # Wait for enough bytes to find a <meta charset> declaration
+            self._pending += data
+            if len(self._pending) < 1024 and data:
+                return
+            data, self._pending = self._pending, b""
+            self._decoder = codecs.getincrementaldecoder(self._sniff_encoding(data))(errors="replace")
+
+        text = self._decoder.decode(data)
+        for start in range(0, len(text), CHUNK_SIZE):
+            self.feed(text[start:start + CHUNK_SIZE])
+            if self.done:
+                return
+
+    def _sniff_encoding(self, head: bytes) -> str:
+        for candidate in (self.encoding, self._meta_charset(head), "utf-8"):
+            if candidate:
+                try:
+                    codecs.lookup(candidate)
+                    return candidate
+                except LookupError:
+                    continue
+        return "utf-8"
+
+    @staticmethod
+    def _meta_charset(head: bytes) -> Optional[str]:
+        match = META_CHARSET.search(head)
+        return match.group(1).decode("ascii") if match else None
+
+    def finish(self) -> ExtractedPage:
+        """Flush buffered input and return what was extracted."""
+        if not self.done:
+            if self._decoder is None:
+                self.feed_bytes(b"")
+            if not self.done:
+                self.feed(self._decoder.decode(b"", final=True))
+                self.close()
+        self._end_paragraph()
+        return self._page
+
+    # HTMLParser callbacks
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag in SKIPPED:
+            self._skip_depth += 1
+        elif tag == "title" and self._page.title is None:
+            self._title = []
+        elif tag == "p":
+            self._end_paragraph()
+            if not self.done:
+                self._paragraph = []
+                self._paragraph_length = 0
+        elif tag in P_CLOSERS:
+            self._end_paragraph()
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+        if tag in SKIPPED:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == "title" and self._title is not None:
+            self._page.title = "".join(self._title).strip()
+            self._title = None
+        elif tag == "p" or tag in P_CLOSERS:
+            self._end_paragraph()
+
+    def handle_data(self, data):
+        if self.done or self._skip_depth:
+            return
+        if self._title is not None:
+            self._title.append(data)
+        if self._paragraph is not None and self._paragraph_length < self.max_chars:
+            # Text beyond max_chars can never reach the output
+            data = data[:self.max_chars - self._paragraph_length]
+            self._paragraph.append(data)
+            self._paragraph_length += len(data)
+
+    def _end_paragraph(self) -> None:
+        if self._paragraph is None:
+            return
+        text = "".join(self._paragraph)
+        self._paragraph = None
+        self._paragraphs_seen += 1
+        if text:
+            if self.transform is not None:
+                text = self.transform(text)
+            self._page.paragraphs.append(text)
+            self._text_length += len(text) + (1 if len(self._page.paragraphs) > 1 else 0)
+        if self._paragraphs_seen >= self.max_paragraphs or self._text_length >= self.max_chars:
+            self.done = True
+
+
+def extract_page(
+    html: bytes,
+    max_paragraphs: int,
+    max_chars: int,
+    transform: Optional[Callable[[str], str]] = None,
+    encoding: Optional[str] = None,
+) -> ExtractedPage:
+    """Extract the title and leading paragraphs from a complete document.
+
+    Parsing stops as soon as the limits are reached; the rest of the
+    document is never decoded or tokenized.
+
+    Args:
+        html: The raw document
+        max_paragraphs: Number of ``<p>`` elements to consider
+        max_chars: Stop once the joined paragraph text reaches this length
+        transform: Optional function applied to each paragraph's text
+        encoding: Document encoding, if known from the response headers
+
+    Returns:
+        ExtractedPage: The extracted title and paragraphs
+    """
+    extractor = ParagraphExtractor(max_paragraphs, max_chars, transform, encoding)
+    for start in range(0, len(html), CHUNK_SIZE):
+        extractor.feed_bytes(html[start:start + CHUNK_SIZE])
+        if extractor.done:
+            break
+    return extractor.finish()
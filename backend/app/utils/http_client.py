@@ -0,0 +1,212 @@
+from collections import OrderedDict
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration. Every host gets DEFAULT_POOL_SIZE keep-alive connections
+# unless it is listed in HOST_POOL_SIZES, in which case it gets its own pool.
+DEFAULT_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+HOST_POOL_SIZES: Dict[str, int] = {
+    "api.bing.microsoft.com": int(os.getenv("HTTP_POOL_SIZE_BING", 20)),
+    "www.googleapis.com": int(os.getenv("HTTP_POOL_SIZE_GOOGLE", 20)),
+    "api.cloudflare.com": int(os.getenv("HTTP_POOL_SIZE_CLOUDFLARE", 20)),
+}
+
+# Hosts contacted at startup when HTTP_WARMUP is enabled
+WARMUP_URLS = [
+    "https://api.bing.microsoft.com/",
+    "https://www.googleapis.com/",
+    "https://api.cloudflare.com/",
+]
+WARMUP_ENABLED = os.getenv("HTTP_WARMUP", "false").lower() == "true"
+WARMUP_TIMEOUT = 3
+
+DNS_CACHE_TTL = float(os.getenv("DNS_CACHE_TTL", 300))
+# Resolutions kept; page fetches reach arbitrary hosts, so the cache is bounded
+DNS_CACHE_SIZE = int(os.getenv("DNS_CACHE_SIZE", 1024))
+DNS_CACHE_ENABLED = os.getenv("DNS_CACHE", "true").lower() == "true"
+
+
+class DNSCache:
+    """Process-wide TTL cache in front of ``socket.getaddrinfo``.
+
+    Both ``requests`` (urllib3) and ``httpx`` (via the event loop's resolver
+    thread) go through ``socket.getaddrinfo``, so patching it covers every
+    outgoing connection. At most ``max_size`` resolutions are kept; the
+    least recently used one is evicted first, and expired entries are
+    dropped when they are looked up or reach the cold end.
+    """
+
+    def __init__(self, ttl: float, max_size: int = DNS_CACHE_SIZE):
+        """Initialize the cache.
+
+        Args:
+            ttl: Seconds a resolved address list stays valid
+            max_size: Maximum number of resolutions kept
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple, Tuple[float, List]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._original = None
+
+    def _getaddrinfo(self, *args: Any, **kwargs: Any) -> List:
+        key = args + tuple(sorted(kwargs.items()))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+
+        result = self._original(*args, **kwargs)
+        with self._lock:
+            self._entries[key] = (now + self.ttl, result)
+            self._entries.move_to_end(key)
+            while self._entries:
+                oldest_expires, _ = next(iter(self._entries.values()))
+                if len(self._entries) <= self.max_size and oldest_expires > now:
+                    break
+                self._entries.popitem(last=False)
+        return result
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def install(self) -> None:
+        """Route ``socket.getaddrinfo`` through the cache."""
+        if self._original is None:
+            self._original = socket.getaddrinfo
+            socket.getaddrinfo = self._getaddrinfo
+
+    def uninstall(self) -> None:
+        """Restore the original resolver and drop cached entries."""
+        if self._original is not None:
+            socket.getaddrinfo = self._original
+            self._original = None
+        with self._lock:
+            self._entries.clear()
+
+
+dns_cache = DNSCache(DNS_CACHE_TTL)
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+# Async clients are bound to the event loop that created them, so they are
+# kept per loop: {loop: {pool_key: client}}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _pool_key(url: Optional[str]) -> str:
+    """Return the pool a URL belongs to: its host if it has a dedicated pool."""
+    if url:
+        host = urlsplit(url).hostname or ""
+        if host in HOST_POOL_SIZES:
+            return host
+    return "default"
+
+
+def get_session() -> requests.Session:
+    """Return the shared keep-alive ``requests.Session``.
+
+    Returns:
+        A session with per-host connection pools mounted
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                default_adapter = HTTPAdapter(
+                    pool_connections=MAX_CONNECTIONS // DEFAULT_POOL_SIZE,
+                    pool_maxsize=DEFAULT_POOL_SIZE,
+                )
+                session.mount("http://", default_adapter)
+                session.mount("https://", default_adapter)
+                for host, size in HOST_POOL_SIZES.items():
+                    session.mount(
+                        f"https://{host}/",
+                        HTTPAdapter(pool_connections=1, pool_maxsize=size),
+                    )
+                _session = session
+    return _session
+
+
+def get_async_client(url: Optional[str] = None) -> httpx.AsyncClient:
+    """Return the pooled ``httpx.AsyncClient`` serving ``url``.
+
+    Hosts listed in HOST_POOL_SIZES get a dedicated client sized for them;
+    every other URL shares the default client.
+
+    Args:
+        url: The URL about to be requested
+
+    Returns:
+        An AsyncClient bound to the running event loop
+    """
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    key = _pool_key(url)
+    client = clients.get(key)
+    if client is None or client.is_closed:
+        pool_size = HOST_POOL_SIZES.get(key, DEFAULT_POOL_SIZE)
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS if key == "default" else pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            follow_redirects=True,
+        )
+        clients[key] = client
+    return client
+
+
+async def warm_up_connections(urls: Optional[List[str]] = None) -> None:
+    """Open keep-alive connections to the provider hosts ahead of traffic.
+
+    Failures are logged and ignored; warm-up is purely an optimization.
+
+    Args:
+        urls: URLs to contact, defaults to WARMUP_URLS
+    """
+    urls = urls or WARMUP_URLS
+
+    async def _touch(url: str) -> None:
+        try:
+            await get_async_client(url).head(url, timeout=WARMUP_TIMEOUT)
+        except httpx.HTTPError as e:
+            logger.warning(f"Connection warm-up failed for {url}: {str(e)}")
+
+    await asyncio.gather(*(_touch(url) for url in urls))
+
+
+async def close_clients() -> None:
+    """Close every pooled client owned by the running loop and the shared session."""
+    global _session
+    loop = asyncio.get_running_loop()
+    for client in _async_clients.pop(loop, {}).values():
+        await client.aclose()
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
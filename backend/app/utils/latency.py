@@ -0,0 +1,65 @@
+from collections import deque
+import threading
+from typing import Deque, Dict, Optional
+
+# Samples kept per upstream; old ones roll off so percentiles follow its
+# current behaviour
+LATENCY_WINDOW = 200
+# Percentiles are not trusted before this many samples
+MIN_SAMPLES = 20
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies for each named upstream"""
+
+    def __init__(self, window: int = LATENCY_WINDOW, min_samples: int = MIN_SAMPLES):
+        """Initialize the tracker.
+
+        Args:
+            window: Samples kept per name
+            min_samples: Samples needed before percentiles are reported
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        """Add one observed latency for ``name``."""
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, name: str, fraction: float) -> Optional[float]:
+        """Latency below which ``fraction`` of recent calls to ``name`` completed.
+
+        Args:
+            name: The upstream
+            fraction: Between 0 and 1, e.g. 0.95 for the p95
+
+        Returns:
+            Seconds, or None until ``min_samples`` calls have been seen
+        """
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Sample count, p50 and p95 of every upstream with enough samples."""
+        with self._lock:
+            names = list(self._samples)
+        report = {}
+        for name in names:
+            p50 = self.percentile(name, 0.5)
+            if p50 is not None:
+                report[name] = {
+                    "samples": len(self._samples[name]),
+                    "p50": round(p50, 3),
+                    "p95": round(self.percentile(name, 0.95), 3),
+                }
+        return report
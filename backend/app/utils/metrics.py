@@ -0,0 +1,367 @@
+from bisect import bisect_left
+from functools import wraps
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds for durations in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Bucket upper bounds for downloaded page sizes in bytes
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# Bucket upper bounds for estimated prompt sizes in tokens
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 3000, 4000, 6000, 8000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Every sample carries a worker="<pid>" label, since each gunicorn worker
+# keeps its own registry. A scrape is answered by whichever worker accepts
+# the connection, so with METRICS_DIR set to a directory shared by the
+# workers each one writes its samples there every METRICS_SYNC_INTERVAL
+# seconds and /metrics returns those of every live worker. Aggregate across
+# workers in queries, e.g. ``sum without (worker) (rate(...))``.
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_SYNC_INTERVAL = float(os.getenv("METRICS_SYNC_INTERVAL", 5))
+
+# Every metric created in the process, in creation order
+_registry: List["_Metric"] = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], *extra: str) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    pairs.extend(pair for pair in extra if pair)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    """Name, help text and label names shared by every metric type"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        with _registry_lock:
+            if any(metric.name == name for metric in _registry):
+                raise ValueError(f"Metric {name} is already registered")
+            _registry.append(self)
+
+    def _key(self, labels: Sequence[str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(labels)
+
+    def _samples(self, worker: str = "") -> List[str]:
+        raise NotImplementedError
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self, worker: Optional[str] = None) -> str:
+        """This metric in the Prometheus text exposition format.
+
+        Args:
+            worker: Value of a ``worker`` label added to every sample, if any
+        """
+        return "\n".join(self._header() + self._samples(_worker_label(worker)))
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, one per combination of label values"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """Add ``amount`` to the count for the given label values."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        """Current count for the given label values."""
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self, worker: str = "") -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.label_names, key, worker)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(_Metric):
+    """Value read from a callback each time the metrics are rendered.
+
+    Suits sizes that are already tracked elsewhere (e.g. a store's length),
+    so nothing has to be updated on the hot path.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.function = function
+
+    def _samples(self, worker: str = "") -> List[str]:
+        return [f"{self.name}{_format_labels((), (), worker)} {_format_value(self.function())}"]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket (last is +Inf)..., sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Record one observation for the given label values."""
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def count(self, *labels: str) -> int:
+        """Number of observations for the given label values."""
+        counts = self._values.get(self._key(labels))
+        return int(sum(counts[:-1])) if counts else 0
+
+    def _samples(self, worker: str = "") -> List[str]:
+        with self._lock:
+            values = [(key, list(counts)) for key, counts in self._values.items()]
+        lines = []
+        for key, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                bucket_labels = _format_labels(self.label_names, key, worker, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = _format_labels(self.label_names, key, worker)
+            lines.append(f"{self.name}_sum{labels} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def timed(histogram: Histogram, *labels: str) -> Callable:
+    """Decorator observing each call's duration in ``histogram``.
+
+    Works for both plain and ``async`` functions. The histogram's last label
+    is the outcome (``ok``, ``error`` or ``cancelled``), after the given
+    label values.
+
+    Args:
+        histogram: Histogram whose last label is the outcome
+        *labels: Values for the histogram's other labels
+
+    Returns:
+        Decorator function
+    """
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                started = time.perf_counter()
+                outcome = "ok"
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    outcome = "error"
+                    raise
+                except BaseException:
+                    outcome = "cancelled"
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - started, *labels, outcome)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            outcome = "ok"
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                outcome = "error"
+                raise
+            except BaseException:
+                outcome = "cancelled"
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started, *labels, outcome)
+        return wrapper
+    return decorator
+
+
+def get_metric(name: str) -> Optional[_Metric]:
+    """Return the registered metric called ``name``, if any."""
+    return next((metric for metric in _registry if metric.name == name), None)
+
+
+def _worker_label(worker: Optional[str]) -> str:
+    return f'worker="{_escape(worker)}"' if worker is not None else ""
+
+
+def _local_samples() -> Dict[str, List[str]]:
+    """Samples of every metric registered in this process, labelled with its PID."""
+    with _registry_lock:
+        metrics = list(_registry)
+    worker = _worker_label(str(os.getpid()))
+    return {metric.name: metric._samples(worker) for metric in metrics}
+
+
+def write_worker_samples() -> None:
+    """Write this process's samples to METRICS_DIR for the other workers to serve."""
+    if not METRICS_DIR:
+        return
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(_local_samples(), file)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        logger.warning(f"Could not write worker metrics to {path}: {str(e)}")
+
+
+def _worker_files() -> List[Tuple[str, bool]]:
+    """Paths of the other workers' sample files, each with whether it is stale.
+
+    Files not refreshed for three sync intervals belong to workers that have
+    exited.
+    """
+    try:
+        names = os.listdir(METRICS_DIR)
+    except OSError:
+        return []
+    own = f"{os.getpid()}.json"
+    cutoff = time.time() - 3 * METRICS_SYNC_INTERVAL
+    files = []
+    for name in names:
+        if not name.endswith(".json") or name == own:
+            continue
+        path = os.path.join(METRICS_DIR, name)
+        try:
+            files.append((path, os.path.getmtime(path) < cutoff))
+        except OSError:
+            continue
+    return files
+
+
+def remove_stale_worker_samples() -> None:
+    """Delete sample files left in METRICS_DIR by workers that have exited."""
+    if not METRICS_DIR:
+        return
+    for path, stale in _worker_files():
+        if stale:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _other_worker_samples() -> List[Dict[str, List[str]]]:
+    """Samples written to METRICS_DIR by the other live workers."""
+    if not METRICS_DIR:
+        return []
+    snapshots = []
+    for path, stale in _worker_files():
+        if stale:
+            continue
+        try:
+            with open(path, encoding="utf-8") as file:
+                snapshots.append(json.load(file))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+class WorkerSampleWriter:
+    """Background thread writing this worker's samples and removing stale files"""
+
+    def __init__(self, interval: float = METRICS_SYNC_INTERVAL):
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start writing, if METRICS_DIR is set."""
+        if METRICS_DIR and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop writing and remove this process's samples file."""
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        try:
+            os.remove(os.path.join(METRICS_DIR, f"{os.getpid()}.json"))
+        except OSError:
+            pass
+
+    def _run(self) -> None:
+        while True:
+            write_worker_samples()
+            remove_stale_worker_samples()
+            if self._stopped.wait(self.interval):
+                return
+
+
+worker_sample_writer = WorkerSampleWriter()
+
+
+def render_metrics() -> str:
+    """Every registered metric in the Prometheus text exposition format.
+
+    Samples are labelled with the worker's PID. With METRICS_DIR set, the
+    latest samples of the other workers are included. Gauge callbacks and
+    the sample files may do I/O, so call this off the event loop.
+    """
+    with _registry_lock:
+        metrics = list(_registry)
+    local = _local_samples()
+    others = _other_worker_samples()
+    blocks = []
+    for metric in metrics:
+        lines = metric._header() + local.get(metric.name, [])
+        for snapshot in others:
+            lines.extend(snapshot.get(metric.name, []))
+        blocks.append("\n".join(lines))
+    return "\n".join(blocks) + "\n"
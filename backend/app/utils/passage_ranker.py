@@ -0,0 +1,144 @@
+from collections import Counter
+from dataclasses import dataclass
+import re
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+# Passages are built from whole sentences up to about this many characters
+PASSAGE_CHARS = 500
+# BM25 parameters (the usual Okapi defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+WORD = re.compile(r"\w+")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "how", "i", "in", "is", "it", "of", "on", "or", "that", "the", "this",
+    "to", "was", "what", "when", "where", "which", "who", "why", "will", "with",
+})
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens of ``text`` without stopwords."""
+    return [word for word in WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+def split_passages(text: str, max_chars: int = PASSAGE_CHARS) -> List[str]:
+    """Split text into passages of whole sentences.
+
+    Sentences longer than ``max_chars`` are cut into pieces of that size.
+
+    Args:
+        text: The text to split
+        max_chars: Approximate maximum passage length
+
+    Returns:
+        List[str]: Passages in document order
+    """
+    passages: List[str] = []
+    current = ""
+    for sentence in SENTENCE_END.split(text.strip()):
+        while len(sentence) > max_chars:
+            if current:
+                passages.append(current)
+                current = ""
+            passages.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            passages.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        passages.append(current)
+    return passages
+
+
+def bm25_scores(query: str, passages: Sequence[str]) -> np.ndarray:
+    """Score passages against a query with Okapi BM25.
+
+    Only query terms can contribute to a score, so the term-frequency
+    matrix is built for those terms alone and scored in one vectorized pass.
+
+    Args:
+        query: The user's question
+        passages: Candidate passages
+
+    Returns:
+        np.ndarray: One score per passage; all zeros if the query has no terms
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms or not passages:
+        return np.zeros(len(passages))
+
+    index = {term: column for column, term in enumerate(terms)}
+    tf = np.zeros((len(passages), len(terms)))
+    lengths = np.empty(len(passages))
+    for row, passage in enumerate(passages):
+        tokens = tokenize(passage)
+        lengths[row] = len(tokens)
+        for term, count in Counter(tokens).items():
+            column = index.get(term)
+            if column is not None:
+                tf[row, column] = count
+
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((len(passages) - df + 0.5) / (df + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(lengths.mean(), 1.0))
+    return (tf * (BM25_K1 + 1) / (tf + norm[:, None])) @ idf
+
+
+@dataclass
+class Passage:
+    """A ranked piece of one search result"""
+    source: int  # index of the result it came from
+    position: int  # order within that result
+    text: str
+    score: float
+
+
+def select_passages(
+    query: str,
+    contents: Sequence[str],
+    max_chars: int,
+    passage_chars: int = PASSAGE_CHARS,
+) -> Dict[int, List[Passage]]:
+    """Pick the passages most relevant to ``query`` that fit ``max_chars``.
+
+    Passages are taken in order of score (ties keep document order) until the
+    budget is used up.
+
+    Args:
+        query: The user's question
+        contents: Text of each search result
+        max_chars: Total characters the selected passages may use
+        passage_chars: Approximate maximum passage length
+
+    Returns:
+        Dict[int, List[Passage]]: Selected passages by result index, in
+        document order within each result
+    """
+    passages = [
+        Passage(source, position, text, 0.0)
+        for source, content in enumerate(contents)
+        for position, text in enumerate(split_passages(content, passage_chars))
+    ]
+    scores = bm25_scores(query, [passage.text for passage in passages])
+    for passage, score in zip(passages, scores):
+        passage.score = float(score)
+
+    selected: Dict[int, List[Passage]] = {}
+    used = 0
+    # A stable sort keeps result and document order among equal scores
+    for i in np.argsort(-scores, kind="stable"):
+        passage = passages[i]
+        if used + len(passage.text) > max_chars:
+            continue
+        used += len(passage.text)
+        selected.setdefault(passage.source, []).append(passage)
+
+    for chosen in selected.values():
+        chosen.sort(key=lambda passage: passage.position)
+    return selected
@@ -1,93 +1,394 @@
+from contextlib import contextmanager
 from functools import wraps
+import asyncio
+import contextvars
+import inspect
+import math
+import os
+import sqlite3
+import tempfile
+import threading
 import time
-from typing import Callable, Any, Dict
+from typing import Callable, Any, Dict, Iterable, Iterator, Optional, Set
 import logging
 
+from app.utils.metrics import Histogram
+
 logger = logging.getLogger(__name__)
 
+rate_limit_wait_seconds = Histogram(
+    "rate_limit_wait_seconds", "Time calls spent waiting for a rate limit slot", labels=("quota",)
+)
+
+# "memory" keeps limits per process; "sqlite" shares them between all worker
+# processes on the host through RATE_LIMIT_DB
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_DB = os.getenv(
+    "RATE_LIMIT_DB",
+    os.path.join(tempfile.gettempdir(), "mini_perplexity_rate_limits.sqlite3")
+)
+
+# Quotas the caller has already taken a slot from, see prepaid_quotas
+_prepaid: contextvars.ContextVar[Optional[Set[str]]] = contextvars.ContextVar("prepaid_quotas", default=None)
+
+class RateLimitExceeded(Exception):
+    """Raised when a non-blocking rate-limited call finds no capacity"""
+    pass
+
+class MemoryRateStore:
+    """Keeps GCRA state in process memory"""
+
+    blocking_io = False
+
+    def __init__(self):
+        self._tat: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, key: str, interval: float, burst: float) -> float:
+        """Atomically take a slot for ``key`` if one is free.
+
+        Returns:
+            float: 0.0 if a slot was taken, otherwise seconds until one frees up
+        """
+        now = time.time()
+        with self._lock:
+            tat = max(self._tat.get(key, now), now)
+            wait = tat - burst - now
+            if wait > 0:
+                return wait
+            self._tat[key] = tat + interval
+            return 0.0
+
+    def peek(self, key: str) -> Optional[float]:
+        """Return the theoretical arrival time stored for ``key``, if any."""
+        with self._lock:
+            return self._tat.get(key)
+
+class SQLiteRateStore:
+    """Keeps GCRA state in a SQLite database shared by every worker on the host.
+
+    Each reservation is a single ``BEGIN IMMEDIATE`` transaction, so
+    concurrent processes serialize on the row and never overshoot.
+    """
+
+    blocking_io = True
+
+    def __init__(self, path: str):
+        """Open (and create if needed) the database.
+
+        Args:
+            path: Location of the SQLite database file
+        """
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def reserve(self, key: str, interval: float, burst: float) -> float:
+        """Atomically take a slot for ``key`` if one is free.
+
+        Returns:
+            float: 0.0 if a slot was taken, otherwise seconds until one frees up
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            tat = max(row[0] if row else now, now)
+            wait = tat - burst - now
+            if wait <= 0:
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limits (key, tat) VALUES (?, ?)",
+                    (key, tat + interval)
+                )
+                wait = 0.0
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def peek(self, key: str) -> Optional[float]:
+        """Return the theoretical arrival time stored for ``key``, if any."""
+        row = self._connection().execute(
+            "SELECT tat FROM rate_limits WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+def _create_store():
+    if RATE_LIMIT_BACKEND == "sqlite":
+        try:
+            return SQLiteRateStore(RATE_LIMIT_DB)
+        except sqlite3.Error as e:
+            logger.warning(f"Shared rate limit store unavailable, limits are per process: {str(e)}")
+    return MemoryRateStore()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_rate_store():
+    """Return the process-wide rate limit state store for RATE_LIMIT_BACKEND."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = _create_store()
+    return _store
+
 class RateLimiter:
-    """Rate limiter implementation using token bucket algorithm"""
-    
-    def __init__(self, calls: int, period: float):
+    """Rate limiter implementation using the generic cell rate algorithm (GCRA).
+
+    GCRA is equivalent to a token bucket holding ``calls`` tokens that refill
+    over ``period`` seconds, but it only stores one timestamp per key (the
+    theoretical arrival time of the next call), so every check is O(1). The
+    timestamps live in a pluggable store, which lets several worker
+    processes enforce one shared quota.
+    """
+
+    def __init__(self, calls: int, period: float, store=None):
         """Initialize rate limiter.
-        
+
         Args:
             calls: Number of calls allowed per period
             period: Time period in seconds
+            store: GCRA state store; defaults to a private in-memory store
         """
         self.calls = calls
         self.period = period
-        self.tokens: Dict[str, list] = {}  # Store timestamps per function
-    
-    def _cleanup_old_calls(self, func_name: str) -> None:
-        """Remove timestamps older than the time period."""
-        if func_name not in self.tokens:
-            self.tokens[func_name] = []
-            
-        current_time = time.time()
-        self.tokens[func_name] = [
-            timestamp for timestamp in self.tokens[func_name]
-            if current_time - timestamp <= self.period
-        ]
-    
-    def can_call(self, func_name: str) -> bool:
-        """Check if function can be called based on rate limit.
-        
+        self.interval = period / calls  # time one call "costs"
+        self.burst = period - self.interval  # how far ahead TAT may run
+        self.store = store if store is not None else MemoryRateStore()
+
+    def _reserve(self, key: str) -> float:
+        """Take a slot if one is free.
+
+        Returns:
+            float: 0.0 if a slot was taken, otherwise seconds until one frees up
+        """
+        return self.store.reserve(key, self.interval, self.burst)
+
+    def try_acquire(self, key: str = "default") -> bool:
+        """Take a slot without waiting.
+
+        Args:
+            key: Name of the rate-limited resource
+
+        Returns:
+            bool: True if the call may proceed, False if the limit is reached
+        """
+        return self._reserve(key) == 0.0
+
+    def acquire(self, key: str = "default") -> float:
+        """Block the current thread until a slot is available and take it.
+
         Args:
-            func_name: Name of the function being rate limited
-            
+            key: Name of the rate-limited resource
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            wait_time = self._reserve(key)
+            if wait_time == 0.0:
+                return waited
+            logger.debug(
+                f"Rate limit reached for {key}. "
+                f"Waiting {wait_time:.2f} seconds"
+            )
+            time.sleep(wait_time)
+            waited += wait_time
+
+    async def acquire_async(self, key: str = "default") -> float:
+        """Wait on the event loop until a slot is available and take it.
+
+        Args:
+            key: Name of the rate-limited resource
+
         Returns:
-            bool: True if call is allowed, False otherwise
+            float: Seconds spent waiting
         """
-        self._cleanup_old_calls(func_name)
-        return len(self.tokens[func_name]) < self.calls
-    
-    def add_call(self, func_name: str) -> None:
-        """Record a function call."""
-        self.tokens[func_name].append(time.time())
-    
-    def time_until_available(self, func_name: str) -> float:
-        """Calculate time until next call is available.
-        
+        waited = 0.0
+        while True:
+            if self.store.blocking_io:
+                wait_time = await asyncio.to_thread(self._reserve, key)
+            else:
+                wait_time = self._reserve(key)
+            if wait_time == 0.0:
+                return waited
+            logger.debug(
+                f"Rate limit reached for {key}. "
+                f"Waiting {wait_time:.2f} seconds"
+            )
+            await asyncio.sleep(wait_time)
+            waited += wait_time
+
+    def time_until_available(self, key: str = "default") -> float:
+        """Calculate time until next call is available, without taking a slot.
+
         Args:
-            func_name: Name of the function being rate limited
-            
+            key: Name of the rate-limited resource
+
         Returns:
             float: Seconds until next call is available
         """
-        if self.can_call(func_name):
-            return 0.0
-            
-        oldest_call = min(self.tokens[func_name])
-        return oldest_call + self.period - time.time()
+        now = time.time()
+        tat = max(self.store.peek(key) or now, now)
+        return max(0.0, tat - self.burst - now)
+
+    def tokens_available(self, key: str = "default") -> int:
+        """Number of calls that could be made right now without waiting.
+
+        Args:
+            key: Name of the rate-limited resource
+
+        Returns:
+            int: Between 0 and ``calls``
+        """
+        now = time.time()
+        tat = max(self.store.peek(key) or now, now)
+        return max(0, min(self.calls, math.floor((now + self.burst - tat) / self.interval) + 1))
+
+# Limiters created by @rate_limit, by name
+_limiters: Dict[str, RateLimiter] = {}
 
-def rate_limit(calls: int, period: float) -> Callable:
+def _configured_limit(name: str, calls: int, period: float):
+    """Apply a RATE_LIMIT_<NAME>="<calls>/<seconds>" override, if set."""
+    override = os.getenv(f"RATE_LIMIT_{name.upper()}")
+    if not override:
+        return calls, period
+    try:
+        override_calls, override_period = override.split("/")
+        return int(override_calls), float(override_period)
+    except ValueError:
+        logger.warning(f"Ignoring malformed RATE_LIMIT_{name.upper()}={override!r}")
+        return calls, period
+
+def get_limiter(name: str, calls: int, period: float) -> RateLimiter:
+    """Return the shared limiter for ``name``, creating it on first use.
+
+    Every decorator using the same name draws from one quota, e.g. the
+    blocking and async variants of a provider call.
+
+    Args:
+        name: Quota name, also used as the key in the state store
+        calls: Default number of calls allowed per period
+        period: Default time period in seconds
+
+    Returns:
+        RateLimiter: The limiter for the quota
+    """
+    limiter = _limiters.get(name)
+    if limiter is None:
+        calls, period = _configured_limit(name, calls, period)
+        limiter = _limiters.setdefault(name, RateLimiter(calls, period, get_rate_store()))
+    return limiter
+
+def rate_limit_status() -> Dict[str, Dict[str, float]]:
+    """Report the configured quota and current token level of every named limiter."""
+    return {
+        name: {
+            "calls": limiter.calls,
+            "period": limiter.period,
+            "tokens_available": limiter.tokens_available(name),
+            "seconds_until_available": round(limiter.time_until_available(name), 3),
+        }
+        for name, limiter in _limiters.items()
+    }
+
+@contextmanager
+def prepaid_quotas(names: Iterable[str]) -> Iterator[None]:
+    """Let the first rate-limited call of each named quota skip the limiter.
+
+    For callers that take the slots up front (e.g. with
+    :meth:`RateLimiter.acquire_async`) so the wait is not charged to a
+    later deadline. Applies to tasks and threads that copy the context;
+    further calls of the same quota (retries, hedges) are limited as usual.
+
+    Args:
+        names: Quotas a slot has already been taken from
+    """
+    token = _prepaid.set(set(names))
+    try:
+        yield
+    finally:
+        _prepaid.reset(token)
+
+def _use_prepaid(name: str) -> bool:
+    """Consume the caller's prepaid slot for ``name``, if it has one."""
+    prepaid = _prepaid.get()
+    if prepaid is None:
+        return False
+    try:
+        prepaid.remove(name)
+        return True
+    except KeyError:
+        return False
+
+def rate_limit(
+    calls: int,
+    period: float,
+    block: bool = True,
+    name: Optional[str] = None
+) -> Callable:
     """Decorator for rate limiting function calls.
-    
+
+    Works for both plain and ``async`` functions; coroutine functions wait
+    with ``asyncio.sleep`` so the event loop is never blocked. The limiter is
+    exposed as ``wrapper.limiter`` for callers that want to probe it. A call
+    covered by :func:`prepaid_quotas` does not touch the limiter.
+
     Args:
-        calls: Number of calls allowed per period
+        calls: Number of calls allowed per period (overridable per quota
+            with RATE_LIMIT_<NAME>="<calls>/<seconds>")
         period: Time period in seconds
-        
+        block: Wait for capacity (default) or raise RateLimitExceeded at once
+        name: Quota shared by every function decorated with the same name;
+            defaults to the function name
+
     Returns:
         Decorator function
     """
-    limiter = RateLimiter(calls, period)
-    
     def decorator(func: Callable) -> Callable:
+        func_name = name or func.__name__
+        limiter = get_limiter(func_name, calls, period)
+
+        def _check_capacity() -> None:
+            if not limiter.try_acquire(func_name):
+                raise RateLimitExceeded(f"Rate limit reached for {func_name}")
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                if _use_prepaid(func_name):
+                    pass
+                elif block:
+                    rate_limit_wait_seconds.observe(await limiter.acquire_async(func_name), func_name)
+                else:
+                    _check_capacity()
+                return await func(*args, **kwargs)
+            async_wrapper.limiter = limiter
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
-            func_name = func.__name__
-            
-            while not limiter.can_call(func_name):
-                wait_time = limiter.time_until_available(func_name)
-                if wait_time > 0:
-                    logger.debug(
-                        f"Rate limit reached for {func_name}. "
-                        f"Waiting {wait_time:.2f} seconds"
-                    )
-                    time.sleep(wait_time)
-            
-            limiter.add_call(func_name)
+            if _use_prepaid(func_name):
+                pass
+            elif block:
+                rate_limit_wait_seconds.observe(limiter.acquire(func_name), func_name)
+            else:
+                _check_capacity()
             return func(*args, **kwargs)
+        wrapper.limiter = limiter
         return wrapper
     return decorator
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+
+class _Call:
+    """One in-flight call and its outcome, shared by all threads waiting on it"""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls made from threads.
+
+    While a call for a key is running, other callers with the same key wait
+    for it and receive its result (or exception) instead of starting their
+    own. The key is forgotten as soon as the call completes, so nothing is
+    cached beyond the call's lifetime.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key: Hashable, func: Callable[..., Any], *args: Any) -> Any:
+        """Run ``func(*args)`` unless a call for ``key`` is already running.
+
+        Args:
+            key: Identifies equivalent calls
+            func: The function to run
+            *args: Arguments for ``func``
+
+        Returns:
+            The result of the (possibly shared) call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """Coalesces concurrent identical coroutine calls on an event loop.
+
+    The shared work runs in its own task. A caller that is cancelled stops
+    waiting without affecting the others; the task itself is only cancelled
+    once every caller has gone.
+    """
+
+    def __init__(self):
+        # asyncio tasks belong to a single loop, so calls are kept per loop
+        self._calls: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Hashable, List]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Await ``factory()`` unless a call for ``key`` is already running.
+
+        Args:
+            key: Identifies equivalent calls
+            factory: Returns the awaitable doing the work; only called by the
+                first caller
+
+        Returns:
+            The result of the (possibly shared) call
+        """
+        calls = self._calls.setdefault(asyncio.get_running_loop(), {})
+        # key -> [task, number of callers waiting]
+        entry = calls.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(factory())
+            entry = calls[key] = [task, 0]
+
+            def _forget(_) -> None:
+                if calls.get(key) is entry:
+                    del calls[key]
+            task.add_done_callback(_forget)
+        else:
+            self.coalesced += 1
+
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            if entry[1] == 1 and not entry[0].done():
+                entry[0].cancel()
+                calls.pop(key, None)
+            raise
+        finally:
+            entry[1] -= 1
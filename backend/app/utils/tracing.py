@@ -0,0 +1,298 @@
+from contextlib import contextmanager
+import contextvars
+from functools import wraps
+import inspect
+import json
+import logging
+import logging.handlers
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Spans are written as JSON lines to TRACE_FILE, rotated at TRACE_MAX_BYTES
+# with TRACE_BACKUPS old files kept. Each worker process writes its own file,
+# named after TRACE_FILE with the PID before the extension
+# (e.g. mini_perplexity_traces.1234.jsonl), since rotation is not safe with
+# several processes writing one file.
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_FILE = os.getenv(
+    "TRACE_FILE",
+    os.path.join(tempfile.gettempdir(), "mini_perplexity_traces.jsonl")
+)
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", 10 * 1024 * 1024))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", 3))
+# Response header carrying the trace ID; a valid incoming value is reused
+TRACE_HEADER = "X-Trace-ID"
+
+# Accepted incoming trace IDs: short, URL- and log-safe
+_VALID_TRACE_ID = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+class _Trace:
+    """Spans of one request, buffered until its root span ends"""
+
+    __slots__ = ("trace_id", "spans", "closed", "lock")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List["Span"] = []
+        self.closed = False
+        self.lock = threading.Lock()
+
+
+class Span:
+    """One timed step of a request"""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_time", "started", "duration", "attributes", "status")
+
+    def __init__(self, trace: _Trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_time = time.time()
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.attributes = attributes
+        self.status = "ok"
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set(self, **attributes: Any) -> None:
+        """Add attributes to the span."""
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        """Stop the clock and hand the span to its trace.
+
+        Args:
+            error: Exception the step ended with, if any
+        """
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.started
+        if error is not None:
+            self.status = "error" if isinstance(error, Exception) else "cancelled"
+            self.attributes["error"] = f"{type(error).__name__}: {error}"
+
+        trace = self.trace
+        with trace.lock:
+            if self.parent_id is None:
+                trace.closed = True
+                spans, trace.spans = trace.spans + [self], []
+            elif trace.closed:
+                # Straggler that outlived its request
+                spans = [self]
+            else:
+                trace.spans.append(self)
+                return
+        _export(spans)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": round(self.start_time, 6),
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+_exporter: Optional[logging.Logger] = None
+# Process the exporter was created in; a forked worker opens its own file
+_exporter_pid: Optional[int] = None
+_exporter_lock = threading.Lock()
+
+
+def trace_file_path(pid: Optional[int] = None) -> str:
+    """Trace file of a process: TRACE_FILE with the PID before the extension."""
+    root, extension = os.path.splitext(TRACE_FILE)
+    return f"{root}.{pid or os.getpid()}{extension}"
+
+
+def _get_exporter() -> logging.Logger:
+    """Logger writing to this process's rotating trace file, created on first use."""
+    global _exporter, _exporter_pid
+    pid = os.getpid()
+    if _exporter is None or _exporter_pid != pid:
+        with _exporter_lock:
+            if _exporter is None or _exporter_pid != pid:
+                exporter = logging.getLogger(f"{__name__}.export")
+                exporter.propagate = False
+                exporter.setLevel(logging.INFO)
+                for inherited in list(exporter.handlers):
+                    exporter.removeHandler(inherited)
+                    inherited.close()
+                handler = logging.handlers.RotatingFileHandler(
+                    trace_file_path(pid), maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUPS, encoding="utf-8"
+                )
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                exporter.addHandler(handler)
+                _exporter, _exporter_pid = exporter, pid
+    return _exporter
+
+
+def _export(spans: List[Span]) -> None:
+    """Write finished spans to the trace file, one JSON object per line."""
+    try:
+        _get_exporter().info("\n".join(json.dumps(span.to_dict(), default=str) for span in spans))
+    except OSError as e:
+        logger.warning(f"Could not export trace spans: {str(e)}")
+
+
+def current_trace_id() -> Optional[str]:
+    """ID of the trace the caller runs in, if any."""
+    current = _current_span.get()
+    return current.trace_id if current is not None else None
+
+
+def annotate(**attributes: Any) -> None:
+    """Add attributes to the current span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+def start_trace(name: str, trace_id: Optional[str] = None, **attributes: Any) -> Optional[Span]:
+    """Start the root span of a new trace.
+
+    The caller makes it current for the work it covers (see
+    :class:`TraceMiddleware`).
+
+    Args:
+        name: Name of the root span, e.g. the request line
+        trace_id: ID to use, e.g. one sent by the client; a new one is made
+            if it is missing or not a short alphanumeric string
+        **attributes: Attributes of the root span
+
+    Returns:
+        The root span, or None if tracing is disabled. End it with
+        :meth:`Span.end`.
+    """
+    if not TRACING_ENABLED:
+        return None
+    if not trace_id or not _VALID_TRACE_ID.match(trace_id):
+        trace_id = secrets.token_hex(16)
+    return Span(_Trace(trace_id), name, None, attributes)
+
+
+def start_span(name: str, **attributes: Any) -> Optional[Span]:
+    """Start a child of the current span without making it current.
+
+    Meant for generators, which cannot safely change the caller's context
+    across ``yield``. Nothing is recorded outside a trace.
+
+    Returns:
+        The span, or None outside a trace. End it with :meth:`Span.end`.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Time a step as a child of the current span.
+
+    Spans started inside the block (also in tasks and threads that copy the
+    context) nest under this one. Outside a trace this does nothing.
+
+    Args:
+        name: Name of the step
+        **attributes: Attributes recorded with the span
+
+    Yields:
+        The span, or None outside a trace
+    """
+    child = start_span(name, **attributes)
+    if child is None:
+        yield None
+        return
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.end(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+
+def traced(name: str) -> Callable:
+    """Decorator recording each call as a span called ``name``.
+
+    Works for both plain and ``async`` functions.
+    """
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TraceMiddleware:
+    """ASGI middleware tracing every HTTP request.
+
+    The root span covers the whole response, streamed bodies included, and
+    its trace ID is returned in the TRACE_HEADER response header. A 5xx
+    response marks the root span as an error.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers") or []).get(TRACE_HEADER.lower().encode("latin-1"))
+        root = start_trace(
+            f"{scope['method']} {scope['path']}",
+            incoming.decode("latin-1") if incoming else None,
+            method=scope["method"],
+            path=scope["path"]
+        )
+        header = (TRACE_HEADER.lower().encode("latin-1"), root.trace_id.encode("latin-1"))
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers") or []) + [header]
+                root.set(status_code=message["status"])
+                if message["status"] >= 500:
+                    root.status = "error"
+            await send(message)
+
+        token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except BaseException as e:
+            root.end(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            root.end()
@@ -0,0 +1,92 @@
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Query parameters that only track the visit and never change the document.
+# Generic names such as ``ref`` (a branch on GitHub) are kept: a missed
+# duplicate is still caught by the content fingerprint, a wrong merge loses
+# a result.
+TRACKING_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid",
+    "ref_src", "cmpid", "_ga",
+})
+# Host prefixes of mobile and AMP mirrors of the same site
+MIRROR_HOST_PREFIXES = ("www.", "m.", "mobile.", "amp.")
+
+
+def canonicalize_url(url: str) -> str:
+    """Return a canonical form of a URL for use as a storage key.
+
+    The scheme and host are lowercased, default ports and fragments are
+    dropped and an empty path becomes ``/``.
+
+    Args:
+        url: The URL to canonicalize
+
+    Returns:
+        str: The canonical URL, or the input unchanged if it cannot be parsed
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+
+def document_key(url: str) -> str:
+    """Return a key shared by the URLs that serve the same document.
+
+    Goes further than :func:`canonicalize_url` and is only meant for
+    deduplication, never for fetching: the scheme is ignored, ``www.``,
+    mobile and AMP host prefixes are removed, as are a leading or trailing
+    ``amp`` path segment and ``.amp``/``.amp.html`` suffixes, tracking
+    parameters (``utm_*``, click IDs, ...) are dropped, the remaining
+    parameters are sorted and trailing slashes are ignored.
+
+    Args:
+        url: The URL to reduce
+
+    Returns:
+        str: The deduplication key
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url
+
+    host = (parts.hostname or "").lower()
+    stripped = True
+    while stripped:
+        stripped = False
+        for prefix in MIRROR_HOST_PREFIXES:
+            if host.startswith(prefix) and host.count(".") > 1:
+                host = host[len(prefix):]
+                stripped = True
+    if port and port not in DEFAULT_PORTS.values():
+        host = f"{host}:{port}"
+
+    segments = [segment for segment in parts.path.split("/") if segment]
+    if segments and segments[0].lower() == "amp":
+        segments = segments[1:]
+    if segments and segments[-1].lower() == "amp":
+        segments = segments[:-1]
+    path = "/" + "/".join(segments)
+    if path.endswith(".amp.html"):
+        path = path[:-len(".amp.html")] + ".html"
+    elif path.endswith(".amp"):
+        path = path[:-len(".amp")]
+
+    params = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.lower().startswith("utm_") and name.lower() not in TRACKING_PARAMS
+    )
+    query = f"?{urlencode(params)}" if params else ""
+    return f"{host}{path}{query}"
@@ -0,0 +1,77 @@
+"""Compare the bounded extractor against a full BeautifulSoup parse.
+
+Usage (from backend/):
+    python -m benchmarks.bench_html_extraction [path/to/page.html ...]
+
+Without arguments a large synthetic article page (navigation, inline
+scripts, tables and a few thousand paragraphs) is generated.
+"""
+import sys
+import time
+import tracemalloc
+from typing import Callable, List
+
+from bs4 import BeautifulSoup
+
+from app.services.search_service import MAX_CONTENT_LENGTH, MAX_PARAGRAPHS, _extract_summary
+
+ROUNDS = 5
+
+
+def beautifulsoup_summary(html: bytes) -> str:
+    """The extraction path used before the bounded extractor."""
+    soup = BeautifulSoup(html, 'html.parser')
+    paragraphs = [
+        p.get_text() for p in soup.find_all('p')[:MAX_PARAGRAPHS]
+        if p.get_text()
+    ]
+    content = ' '.join(
+        '. '.join(p.split('. ')[:2]) + '.'
+        for p in paragraphs
+    )
+    return content[:MAX_CONTENT_LENGTH]
+
+
+def synthetic_page(paragraphs: int = 4000) -> bytes:
+    """Build an article-like page of roughly 800 KB."""
+    nav = "".join(f'<li><a href="/wiki/Link_{i}">Link {i}</a></li>' for i in range(2000))
+    script = "<script>var config = {" + ",".join(f'"k{i}": {i}' for i in range(5000)) + "};</script>"
+    table = "<table>" + "".join(f"<tr><td>{i}</td><td>cell {i}</td></tr>" for i in range(3000)) + "</table>"
+    body = "".join(
+        f"<p>Sentence one of paragraph {i} with <a href='#'>a link</a>. "
+        f"Sentence two explains more &amp; more. Sentence three is dropped.</p>"
+        for i in range(paragraphs)
+    )
+    return (
+        "<html><head><title>Synthetic article</title>" + script + "</head>"
+        "<body><nav><ul>" + nav + "</ul></nav><main>" + body + table + "</main></body></html>"
+    ).encode("utf-8")
+
+
+def measure(label: str, func: Callable[[bytes], str], html: bytes) -> str:
+    timings: List[float] = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = func(html)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"  {label:<15} best {min(timings) * 1000:9.2f} ms   peak {peak / 1024:10.1f} KiB")
+    return result
+
+
+def main(paths: List[str]) -> None:
+    pages = [(path, open(path, "rb").read()) for path in paths] or [("synthetic", synthetic_page())]
+    for name, html in pages:
+        print(f"{name} ({len(html) / 1024:.0f} KiB)")
+        old = measure("beautifulsoup", beautifulsoup_summary, html)
+        new = measure("bounded", _extract_summary, html)
+        print(f"  identical output: {old == new}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,3 +1,12 @@
+import os
+import tempfile
+
 workers = 4  # Number of worker processes
 worker_class = "uvicorn.workers.UvicornWorker"
-bind = "0.0.0.0:8000"  # Bind to the appropriate host and port 
\ No newline at end of file
+bind = "0.0.0.0:8000"  # Bind to the appropriate host and port
+# Share upstream API rate limits between the worker processes, and let any
+# worker answer /metrics with the samples of all of them
+raw_env = [
+    "RATE_LIMIT_BACKEND=sqlite",
+    f"METRICS_DIR={os.path.join(tempfile.gettempdir(), 'mini_perplexity_metrics')}",
+]
@@ -0,0 +1,81 @@
+from app.models.search_model import SearchResult
+from app.services import batch_service
+from app.services.batch_service import async_run_batch, run_batch
+
+
+def _result(query):
+    return SearchResult(
+        question=query, title=query, url=f"https://example.com/{len(query)}",
+        snippet="", search_content=f"About {query}", source="bing"
+    )
+
+
+class FakeChat:
+    def __init__(self):
+        self.queries = []
+
+    async def async_generate_answer(self, search_results, query=None, use_cache=True):
+        self.queries.append(query)
+        return f"Answer to {query}"
+
+
+async def test_batch_dedupes_queries_and_answers_each(monkeypatch):
+    searched = []
+
+    async def search(query, use_cache=True, failures=None):
+        searched.append(query)
+        return [_result(query)]
+
+    monkeypatch.setattr(batch_service, "async_perform_search", search)
+    chat = FakeChat()
+
+    items = [item async for item in async_run_batch(
+        ["What is Python?", "what is  python", "What is Rust?"], chat, concurrency=2
+    )]
+
+    assert sorted(item.index for item in items) == [0, 1, 2]
+    assert sorted(searched) == ["What is Python?", "What is Rust?"]
+    assert len(chat.queries) == 2
+    by_index = {item.index: item for item in items}
+    assert by_index[1].query == "what is  python"
+    assert by_index[1].answer == by_index[0].answer == "Answer to What is Python?"
+    assert by_index[2].results[0].question == "What is Rust?"
+
+
+def test_run_batch_reports_failures_per_query(monkeypatch):
+    async def search(query, use_cache=True, failures=None):
+        if query == "bad":
+            raise RuntimeError("provider down")
+        return [_result(query)]
+
+    monkeypatch.setattr(batch_service, "async_perform_search", search)
+
+    items = run_batch(["good", "bad", "also good"])
+
+    assert [item.query for item in items] == ["good", "bad", "also good"]
+    assert items[1].error == "provider down" and items[1].results == []
+    assert items[0].error is None and items[0].answer is None
+    assert items[2].results[0].question == "also good"
+
+
+def test_batch_takes_quota_before_searching_and_reports_failed_providers(monkeypatch):
+    from app.utils.cache import TTLCache
+
+    reserved = []
+
+    async def reserve():
+        reserved.append("all")
+
+    async def search(query, use_cache=True, failures=None):
+        failures["google"] = "google search exceeded its 2.0s budget"
+        return [_result(query)]
+
+    monkeypatch.setattr(batch_service, "search_cache", TTLCache(max_size=8, ttl=60))
+    monkeypatch.setattr(batch_service, "_reserve_search_quotas", reserve)
+    monkeypatch.setattr(batch_service, "async_perform_search", search)
+
+    items = run_batch(["a", "b"])
+
+    assert reserved == ["all", "all"]
+    assert items[0].failed_providers == {"google": "google search exceeded its 2.0s budget"}
+    assert items[0].error is None and items[0].results
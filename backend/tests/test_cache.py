@@ -0,0 +1,26 @@
+from app.utils.cache import TTLCache
+
+def test_lru_eviction():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == (1, False)
+    assert cache.stats()["evictions"] == 1
+
+def test_stale_entries_are_served_once_refresh_is_claimed(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.utils.cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(max_size=10, ttl=10, stale_ttl=20)
+    cache.set("q", "results")
+
+    now[0] += 15
+    assert cache.get("q") == ("results", True)
+    assert cache.begin_refresh("q") is True
+    assert cache.begin_refresh("q") is False
+
+    now[0] += 20
+    assert cache.get("q") is None
@@ -0,0 +1,129 @@
+import pytest
+from app.utils.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    RetryBudget,
+    circuit_breaker,
+    get_breaker,
+    is_transient_failure,
+)
+
+class UpstreamError(Exception):
+    pass
+
+def test_breaker_opens_then_half_opens_for_one_trial(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("app.utils.circuit_breaker.time.monotonic", lambda: clock[0])
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=10)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock[0] += 10
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial call at a time
+
+    breaker.record_success(0.2)
+    assert breaker.state == CLOSED
+
+def test_open_circuit_fails_fast_with_callers_error():
+    calls = []
+
+    @circuit_breaker("test-fail-fast", error=UpstreamError)
+    def call():
+        calls.append(1)
+        raise UpstreamError("down") from TimeoutError("read timed out")
+
+    breaker = call.breaker
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(UpstreamError):
+            call()
+    with pytest.raises(UpstreamError, match="open"):
+        call()
+    assert len(calls) == breaker.failure_threshold
+
+def test_retries_are_bounded_by_budget():
+    budget = RetryBudget(ratio=0.5, max_tokens=1)
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    budget.deposit()
+    budget.deposit()
+    assert budget.try_spend()
+
+async def test_async_retry_recovers_from_transient_failure():
+    outcomes = [ConnectionResetError("blip"), "ok"]
+
+    @circuit_breaker("test-retry", error=UpstreamError, retries=1)
+    async def call():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert await call() == "ok"
+    assert get_breaker("test-retry").state == CLOSED
+
+def test_timeout_adapts_to_latency():
+    breaker = CircuitBreaker("test-timeout", min_timeout=0.5)
+    assert breaker.timeout(5) == 5
+    for _ in range(50):
+        breaker.record_success(0.4)
+    assert breaker.timeout(5) == 0.8
+
+def test_breaker_latency_excludes_rate_limit_wait():
+    """Latency measured beneath the rate limiter leaves out the wait for quota."""
+    import time
+    from app.utils.circuit_breaker import breaker_latency
+
+    def waiting(func):
+        def wrapper(*args):
+            time.sleep(0.05)
+            return func(*args)
+        wrapper.__dict__.update(func.__dict__)
+        return wrapper
+
+    @circuit_breaker("test-measured")
+    @waiting
+    @breaker_latency("test-measured")
+    def call():
+        return "ok"
+
+    for _ in range(20):
+        call()
+
+    assert call.breaker.latency.percentile("test-measured", 0.99) < 0.01
+
+def test_client_errors_neither_count_nor_retry():
+    import requests
+
+    calls = []
+
+    def response(status):
+        result = requests.Response()
+        result.status_code = status
+        return result
+
+    @circuit_breaker("test-client-errors", error=UpstreamError, retries=1)
+    def call(status):
+        calls.append(status)
+        try:
+            raise requests.HTTPError(f"{status}", response=response(status))
+        except requests.HTTPError as e:
+            raise UpstreamError(str(e))
+
+    for _ in range(call.breaker.failure_threshold + 1):
+        with pytest.raises(UpstreamError, match="429"):
+            call(429)
+    assert call.breaker.state == CLOSED
+    assert len(calls) == call.breaker.failure_threshold + 1
+
+    assert not is_transient_failure(UpstreamError("missing credentials"))
+    with pytest.raises(UpstreamError, match="503"):
+        call(503)
+    assert calls[-2:] == [503, 503]  # retried once
@@ -0,0 +1,61 @@
+import pytest
+from unittest.mock import MagicMock
+from app.utils.content_store import ContentStore
+
+def test_store_roundtrip_uses_canonical_url(tmp_path):
+    store = ContentStore(str(tmp_path / "pages.sqlite3"))
+    store.put("HTTPS://Example.com:443/page#intro", "page text", etag='"abc"')
+
+    page = store.get("https://example.com/page")
+    assert page.content == "page text"
+    assert page.is_fresh()
+    assert page.conditional_headers() == {"If-None-Match": '"abc"'}
+
+def test_stale_page_revalidates_with_conditional_get(tmp_path, monkeypatch):
+    from app.services import search_service
+
+    store = ContentStore(str(tmp_path / "pages.sqlite3"))
+    store.put("https://example.com/page", "cached text", etag='"v1"')
+    monkeypatch.setattr(search_service, "content_store", store)
+    monkeypatch.setattr(search_service.StoredPage, "is_fresh", lambda self: False)
+
+    session = MagicMock()
+    session.get.return_value.__enter__.return_value = MagicMock(status_code=304)
+    monkeypatch.setattr(search_service, "get_session", lambda: session)
+
+    assert search_service.fetch_content_from_url("https://example.com/page") == "cached text"
+    sent_headers = session.get.call_args.kwargs["headers"]
+    assert sent_headers["If-None-Match"] == '"v1"'
+
+def test_result_handles_resolve_in_another_worker(tmp_path, monkeypatch):
+    from app.models.search_model import SearchResult
+    from app.services import search_service
+    from app.utils.cache import TTLCache
+
+    store = ContentStore(str(tmp_path / "pages.sqlite3"))
+    monkeypatch.setattr(search_service, "content_store", store)
+    monkeypatch.setattr(search_service, "result_cache", TTLCache(max_size=16, ttl=60))
+    result = SearchResult(
+        question="q", title="Python", url="https://python.org",
+        snippet="", search_content="text", source="web"
+    )
+    handle = search_service.register_results([result])[0].handle
+
+    # A worker that never saw the result starts with an empty cache
+    monkeypatch.setattr(search_service, "result_cache", TTLCache(max_size=16, ttl=60))
+    assert search_service.resolve_result_handles([handle])[0].url == "https://python.org"
+
+    monkeypatch.setattr(search_service, "result_cache", TTLCache(max_size=16, ttl=60))
+    monkeypatch.setattr(search_service, "RESULT_HANDLE_TTL", 0)
+    with pytest.raises(search_service.UnknownResultHandle):
+        search_service.resolve_result_handles([handle])
+
+def test_expired_results_are_pruned_on_schedule_not_on_write(tmp_path):
+    store = ContentStore(str(tmp_path / "pages.sqlite3"))
+    store.put_results({"old": "{}"})
+    store._connection().execute("UPDATE results SET stored_at = stored_at - 120")
+    store.put_results({"new": "{}"})
+
+    assert sorted(store.get_results(["old", "new"], 3600)) == ["new", "old"]
+    assert store.prune_results(60) == 1
+    assert list(store.get_results(["old", "new"], 3600)) == ["new"]
@@ -0,0 +1,47 @@
+import asyncio
+import time
+import pytest
+from app.models.search_model import SearchResult
+from app.utils.fetch_scheduler import FetchScheduler
+
+@pytest.mark.asyncio
+async def test_per_host_and_global_limits():
+    scheduler = FetchScheduler(max_concurrency=3, per_host=1)
+    active = {"a.example": 0, "b.example": 0, "total": 0}
+    peaks = dict(active)
+
+    async def download(url, host):
+        async with scheduler.slot(url):
+            for key in (host, "total"):
+                active[key] += 1
+                peaks[key] = max(peaks[key], active[key])
+            await asyncio.sleep(0.01)
+            for key in (host, "total"):
+                active[key] -= 1
+
+    await asyncio.gather(*(
+        download(f"https://{host}/{i}", host)
+        for i in range(4) for host in ("a.example", "b.example")
+    ))
+
+    assert peaks == {"a.example": 1, "b.example": 1, "total": 2}
+    assert scheduler.active_hosts == 0
+
+@pytest.mark.asyncio
+async def test_pending_pages_fall_back_to_snippet(monkeypatch):
+    from app.services import search_service
+
+    async def fetch(url):
+        if "slow" in url:
+            await asyncio.sleep(1)
+        return "page text"
+
+    monkeypatch.setattr(search_service, "async_fetch_content_from_url", fetch)
+    hits = [
+        SearchResult(question="q", title="t", url=url, snippet="api snippet", search_content="", source="bing")
+        for url in ("https://fast.example", "https://slow.example")
+    ]
+
+    results = await search_service._async_fill_all(hits, deadline=time.monotonic() + 0.05)
+
+    assert [r.search_content for r in results] == ["page text", "api snippet"]
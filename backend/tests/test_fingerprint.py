@@ -0,0 +1,55 @@
+import random
+
+from app.utils.fingerprint import MinHashIndex, minhash, similarity
+from app.utils.urls import document_key
+
+WORDS = [f"word{i}" for i in range(500)]
+
+
+def _article(seed, length=300):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def test_document_key_merges_mirrors():
+    """Scheme, www/mobile/AMP mirrors, tracking parameters and trailing slashes are ignored."""
+    key = document_key("https://example.com/news/story?id=7")
+    assert document_key("http://www.example.com/news/story/?id=7&utm_source=x") == key
+    assert document_key("https://m.example.com/news/story?id=7&fbclid=abc") == key
+    assert document_key("https://example.com/amp/news/story?id=7") == key
+    assert document_key("https://example.com/news/story/?id=8") != key
+
+
+def test_document_key_keeps_parameters_and_segments_that_change_the_document():
+    assert document_key("https://github.com/o/r/blob/x.py?ref=main") != document_key(
+        "https://github.com/o/r/blob/x.py?ref=dev"
+    )
+    assert document_key("https://example.com/feed?outputtype=xml") != document_key("https://example.com/feed")
+    assert document_key("https://example.com/docs/amp/guide") != document_key("https://example.com/docs/guide")
+    assert document_key("https://example.com/news/story/amp") == document_key("https://example.com/news/story")
+    assert document_key("https://example.com/news/story.amp.html") == document_key("https://example.com/news/story.html")
+
+def test_document_key_sorts_parameters_and_keeps_short_hosts():
+    assert document_key("https://example.com/p?b=2&a=1") == document_key("https://example.com/p?a=1&b=2")
+    assert document_key("https://m.co/x") == "m.co/x"
+
+
+def test_minhash_estimates_similarity():
+    text = _article(1)
+    edited = text.replace(WORDS[0], "changed", 1) + " appended footer"
+
+    assert similarity(minhash(text), minhash(text)) == 1.0
+    assert similarity(minhash(text), minhash(edited)) >= 0.8
+    assert similarity(minhash(text), minhash(_article(2))) < 0.2
+    assert minhash("too short to fingerprint") is None
+
+
+def test_index_reports_near_duplicates_only():
+    index = MinHashIndex()
+    text = _article(3)
+
+    assert not index.seen(text)
+    assert index.seen(text + " Copyright 2024")
+    assert not index.seen(_article(4))
+    assert not index.seen("short")
+    assert not index.seen("short")
@@ -0,0 +1,23 @@
+from app.utils.html_extractor import ParagraphExtractor, extract_page
+
+def test_extracts_title_and_leading_paragraphs():
+    html = (
+        b"<html><head><title> Page </title><script>var p = '<p>no</p>';</script></head>"
+        b"<body><p>First &amp; <b>bold</b></p><p></p><div>Second<p>Third</div><p>Fourth</p></body></html>"
+    )
+    page = extract_page(html, max_paragraphs=4, max_chars=1000)
+
+    assert page.title == "Page"
+    assert page.paragraphs == ["First & bold", "Third", "Fourth"]
+
+def test_stops_feeding_once_limits_are_reached():
+    extractor = ParagraphExtractor(max_paragraphs=2, max_chars=1000)
+    extractor.feed_bytes(b"<p>one</p><p>two</p>" + b" " * 2048)
+    assert extractor.done
+
+    extractor.feed_bytes(b"<p>ignored</p>")
+    assert extractor.finish().paragraphs == ["one", "two"]
+
+def test_meta_charset_is_honoured():
+    html = '<meta charset="iso-8859-1"><p>Café</p>'.encode("iso-8859-1")
+    assert extract_page(html, max_paragraphs=1, max_chars=100).text == "Café"
@@ -0,0 +1,62 @@
+import asyncio
+import socket
+import time
+from app.utils.http_client import DNSCache, get_async_client, get_session
+
+def test_dns_cache_reuses_resolution(monkeypatch):
+    calls = []
+
+    def fake_getaddrinfo(*args, **kwargs):
+        calls.append(args)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", args[1]))]
+
+    monkeypatch.setattr(socket, "getaddrinfo", fake_getaddrinfo)
+    cache = DNSCache(ttl=60)
+    cache.install()
+    try:
+        socket.getaddrinfo("example.com", 443)
+        socket.getaddrinfo("example.com", 443)
+    finally:
+        cache.uninstall()
+    assert len(calls) == 1
+    assert socket.getaddrinfo is fake_getaddrinfo
+
+def test_dns_cache_is_bounded_and_drops_expired_entries(monkeypatch):
+    monkeypatch.setattr(socket, "getaddrinfo", lambda host, port: [(host, port)])
+    cache = DNSCache(ttl=60, max_size=2)
+    cache.install()
+    try:
+        socket.getaddrinfo("a.example", 443)
+        socket.getaddrinfo("b.example", 443)
+        socket.getaddrinfo("a.example", 443)
+        socket.getaddrinfo("c.example", 443)
+        assert len(cache) == 2
+        assert set(key[0] for key in cache._entries) == {"a.example", "c.example"}
+
+    finally:
+        cache.uninstall()
+
+    cache = DNSCache(ttl=0.01, max_size=10)
+    cache.install()
+    try:
+        socket.getaddrinfo("a.example", 443)
+        socket.getaddrinfo("b.example", 443)
+        time.sleep(0.02)
+        socket.getaddrinfo("c.example", 443)
+        assert [key[0] for key in cache._entries] == ["c.example"]
+    finally:
+        cache.uninstall()
+
+def test_clients_are_shared():
+    assert get_session() is get_session()
+
+    async def _clients():
+        return (
+            get_async_client("https://api.bing.microsoft.com/v7.0/search"),
+            get_async_client("https://api.bing.microsoft.com/other"),
+            get_async_client("https://example.com/page"),
+        )
+
+    bing, bing_again, default = asyncio.run(_clients())
+    assert bing is bing_again
+    assert bing is not default
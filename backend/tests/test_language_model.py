@@ -0,0 +1,93 @@
+import httpx
+import pytest
+from app.services import language_model
+from app.services.language_model import CloudflareChat, answer_cache
+from app.utils.circuit_breaker import CircuitBreaker
+
+
+def _chat(monkeypatch, calls):
+    async def call(self, messages):
+        calls.append(messages)
+        return {"result": {"response": f"answer {len(calls)}"}}
+
+    async def stream(self, messages):
+        calls.append(messages)
+        for token in ["streamed ", "answer"]:
+            yield token
+
+    monkeypatch.setattr(CloudflareChat, "_async_call_for_prompt", call)
+    monkeypatch.setattr(CloudflareChat, "_async_stream_for_prompt", stream)
+    answer_cache.clear()
+    return CloudflareChat(api_key="key", account_id="account")
+
+
+async def test_identical_prompts_are_answered_once(monkeypatch):
+    calls = []
+    chat = _chat(monkeypatch, calls)
+
+    first = await chat.async_generate_answer([], query="What is Python?")
+    second = await chat.async_generate_answer([], query="What is Python?")
+    other = await chat.async_generate_answer([], query="What is Rust?")
+
+    assert first == second == "answer 1"
+    assert other == "answer 2"
+    assert answer_cache.stats()["hits"] == 1
+
+
+async def test_bypass_regenerates_and_refreshes_the_cache(monkeypatch):
+    calls = []
+    chat = _chat(monkeypatch, calls)
+
+    await chat.async_generate_answer([], query="What is Python?")
+    fresh = await chat.async_generate_answer([], query="What is Python?", use_cache=False)
+    cached = await chat.async_generate_answer([], query="What is Python?")
+
+    assert len(calls) == 2
+    assert fresh == cached == "answer 2"
+
+
+async def test_streaming_shares_the_cache(monkeypatch):
+    calls = []
+    chat = _chat(monkeypatch, calls)
+
+    streamed = [token async for token in chat.async_stream_answer([], query="What is Python?")]
+    replayed = [token async for token in chat.async_stream_answer([], query="What is Python?")]
+    answer = await chat.async_generate_answer([], query="What is Python?")
+
+    assert streamed == ["streamed ", "answer"]
+    assert replayed == ["streamed answer"]
+    assert answer == "streamed answer"
+    assert len(calls) == 1
+
+
+def test_cache_key_depends_on_messages_and_model():
+    messages = [{"role": "user", "content": "hi"}]
+    model = language_model.CloudflareModel.LLAMA_3_70B_INSTRUCT
+
+    assert language_model.answer_cache_key(model, messages) == language_model.answer_cache_key(
+        model, [{"content": "hi", "role": "user"}]
+    )
+    assert language_model.answer_cache_key(model, messages) != language_model.answer_cache_key(
+        model, [{"role": "user", "content": "hello"}]
+    )
+
+
+async def test_malformed_stream_events_count_as_upstream_failures(monkeypatch):
+    def handler(request):
+        status = 400 if b"bad request" in request.content else 200
+        return httpx.Response(status, text="data: []\n\ndata: [DONE]\n\n")
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    breaker = CircuitBreaker("cloudflare-test", failure_threshold=10)
+    monkeypatch.setattr(language_model, "get_async_client", lambda url: client)
+    monkeypatch.setattr(language_model, "get_breaker", lambda name, min_timeout: breaker)
+    chat = CloudflareChat(api_key="key", account_id="account")
+
+    with pytest.raises(language_model.CloudflareAPIError, match="Malformed"):
+        [token async for token in chat._async_stream_for_prompt([{"role": "user", "content": "q"}])]
+    assert breaker._failures == 1
+
+    with pytest.raises(language_model.CloudflareAPIError, match="400"):
+        [token async for token in chat._async_stream_for_prompt([{"role": "user", "content": "bad request"}])]
+    assert breaker._failures == 1
+    await client.aclose()
@@ -0,0 +1,20 @@
+from app.utils.latency import LatencyTracker
+
+def test_percentiles_need_enough_samples():
+    tracker = LatencyTracker(window=100, min_samples=10)
+    for i in range(9):
+        tracker.record("bing", i / 10)
+    assert tracker.percentile("bing", 0.95) is None
+
+    tracker.record("bing", 0.9)
+    assert tracker.percentile("bing", 0.5) == 0.5
+    assert tracker.percentile("bing", 0.95) == 0.9
+    assert tracker.snapshot()["bing"]["samples"] == 10
+
+def test_window_rolls_off_old_samples():
+    tracker = LatencyTracker(window=10, min_samples=1)
+    for _ in range(10):
+        tracker.record("google", 5.0)
+    for _ in range(10):
+        tracker.record("google", 0.1)
+    assert tracker.percentile("google", 0.95) == 0.1
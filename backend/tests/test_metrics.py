@@ -0,0 +1,94 @@
+import asyncio
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils import metrics
+from app.utils.metrics import Counter, Gauge, Histogram, timed
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_histogram_seconds", "A test histogram", labels=("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "fetch")
+    histogram.observe(0.1, "fetch")
+    histogram.observe(5.0, "fetch")
+
+    text = histogram.render()
+
+    assert "# TYPE test_histogram_seconds histogram" in text
+    assert 'test_histogram_seconds_bucket{stage="fetch",le="0.1"} 2' in text
+    assert 'test_histogram_seconds_bucket{stage="fetch",le="1"} 2' in text
+    assert 'test_histogram_seconds_bucket{stage="fetch",le="+Inf"} 3' in text
+    assert 'test_histogram_seconds_count{stage="fetch"} 3' in text
+    assert histogram.count("fetch") == 3
+
+
+def test_counter_and_gauge_render_and_check_labels():
+    counter = Counter("test_responses_total", "A test counter", labels=("status",))
+    counter.inc("200")
+    counter.inc("200", amount=2)
+    gauge = Gauge("test_queue_size", "A test gauge", lambda: 7)
+
+    assert 'test_responses_total{status="200"} 3' in counter.render()
+    assert "test_queue_size 7" in gauge.render()
+    with pytest.raises(ValueError):
+        counter.inc()
+    with pytest.raises(ValueError):
+        Counter("test_responses_total", "Registered twice")
+
+
+def test_timed_labels_outcomes():
+    histogram = Histogram("test_timed_seconds", "A timed histogram", labels=("name", "outcome"))
+
+    @timed(histogram, "sync")
+    def fails():
+        raise RuntimeError("boom")
+
+    @timed(histogram, "async")
+    async def succeeds():
+        return 1
+
+    with pytest.raises(RuntimeError):
+        fails()
+    assert asyncio.run(succeeds()) == 1
+
+    assert histogram.count("sync", "error") == 1
+    assert histogram.count("async", "ok") == 1
+
+
+def test_metrics_endpoint_exposes_stage_metrics():
+    response = TestClient(app).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    for name in ("search_provider_seconds", "page_fetch_seconds", "page_extract_seconds",
+                 "rate_limit_wait_seconds", "sessions_active", "llm_request_seconds", "llm_prompt_tokens"):
+        assert f"# TYPE {name} " in response.text
+
+
+def test_samples_are_labelled_per_worker_and_merged_from_metrics_dir(tmp_path, monkeypatch):
+    counter = Counter("test_worker_requests_total", "A per-worker counter", labels=("status",))
+    counter.inc("200")
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    (tmp_path / "1.json").write_text(json.dumps(
+        {"test_worker_requests_total": ['test_worker_requests_total{status="200",worker="1"} 5']}
+    ))
+
+    metrics.write_worker_samples()
+    text = metrics.render_metrics()
+
+    assert (tmp_path / f"{os.getpid()}.json").exists()
+    assert f'test_worker_requests_total{{status="200",worker="{os.getpid()}"}} 1' in text
+    assert 'test_worker_requests_total{status="200",worker="1"} 5' in text
+    assert text.count("# TYPE test_worker_requests_total counter") == 1
+
+    stale = tmp_path / "2.json"
+    stale.write_text(json.dumps({"test_worker_requests_total": ["stale sample"]}))
+    os.utime(stale, (0, 0))
+    assert "stale sample" not in metrics.render_metrics()
+    assert stale.exists()
+    metrics.remove_stale_worker_samples()
+    assert not stale.exists() and (tmp_path / "1.json").exists()
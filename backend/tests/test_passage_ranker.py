@@ -0,0 +1,42 @@
+from app.services.language_model import CloudflareChat
+from app.utils.passage_ranker import bm25_scores, select_passages, split_passages
+
+def test_split_passages_keeps_sentences_together():
+    text = "First sentence here. Second one follows! " + "word " * 200
+    passages = split_passages(text, max_chars=60)
+
+    assert passages[0] == "First sentence here. Second one follows!"
+    assert all(len(passage) <= 60 for passage in passages)
+
+def test_bm25_prefers_passages_matching_rare_query_terms():
+    passages = [
+        "The weather in Paris is mild in spring.",
+        "Photosynthesis converts light into chemical energy in plants.",
+        "Plants need water and light.",
+    ]
+    scores = bm25_scores("How does photosynthesis work in plants?", passages)
+
+    assert scores.argmax() == 1
+    assert scores[0] == 0
+
+def test_select_passages_fills_budget_with_best_passages():
+    contents = [
+        "Cats sleep a lot. " * 10,
+        "Rust has a borrow checker. Ownership prevents data races.",
+    ]
+    selected = select_passages("rust ownership", contents, max_chars=80, passage_chars=40)
+
+    assert list(selected) == [1]
+    assert [p.text for p in selected[1]] == [
+        "Rust has a borrow checker.", "Ownership prevents data races."
+    ]
+
+def test_context_keeps_source_attribution():
+    chat = CloudflareChat(api_key="key", account_id="account")
+    context = chat._format_context([
+        {"title": "Pets", "url": "https://a.example", "search_content": "Cats sleep a lot."},
+        {"title": "Rust", "url": "https://b.example", "search_content": "Ownership prevents data races."},
+    ], "rust ownership")
+
+    assert context.startswith("[1] Pets (https://a.example):\nCats sleep a lot.")
+    assert "[2] Rust (https://b.example):\nOwnership prevents data races." in context
@@ -0,0 +1,42 @@
+from app.services.prompt_builder import PromptBuilder, estimate_tokens
+
+SYSTEM = "Use this context:\n\n{context}"
+
+def turns(count, answer_length=2000):
+    history = []
+    for i in range(count):
+        history.append({"role": "user", "content": f"question {i}"})
+        history.append({"role": "assistant", "content": f"answer {i} " + "x" * answer_length})
+    return history
+
+def test_prompt_fits_budget_and_keeps_recent_turns_verbatim():
+    history = turns(10)
+    prompt = PromptBuilder(token_budget=1000, recent_turns=1).build(
+        SYSTEM, "some context", history, "question 10"
+    )
+
+    assert prompt.estimated_tokens <= 1000
+    assert prompt.messages[0]["content"] == "Use this context:\n\nsome context"
+    assert prompt.messages[-2] == history[-1]
+    assert prompt.messages[-4]["content"].endswith("[...]")
+    assert prompt.messages[-1]["content"] == "question 10"
+    assert prompt.dropped_messages > 0
+
+def test_previous_queries_are_deduplicated_and_capped():
+    prompt = PromptBuilder(max_previous_queries=2).build(
+        SYSTEM, "", [], "What is X?",
+        ["a", "b", "B ", "c", "what is x?"]
+    )
+
+    assert prompt.messages[-1]["content"] == (
+        "Previous questions in this conversation: B | c\n\n"
+        "Current question: What is X?"
+    )
+    assert prompt.dropped_queries == ["a"]
+
+def test_oversized_context_is_truncated():
+    prompt = PromptBuilder(token_budget=500).build(SYSTEM, "y" * 10000, None, "q")
+
+    assert prompt.estimated_tokens <= 500
+    assert prompt.truncated_messages == 1
+    assert estimate_tokens(prompt.messages[0]["content"]) < 500
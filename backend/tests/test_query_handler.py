@@ -1,6 +1,7 @@
 from fastapi.testclient import TestClient
 from app.main import app
 import pytest
+import json
 from unittest.mock import patch
 
 client = TestClient(app)
@@ -48,3 +49,123 @@ async def test_search_endpoint():
 def test_invalid_session():
     response = client.get("/api/v1/session/nonexistent-session/history")
     assert response.status_code == 404
+
+def test_stream_answer_endpoint():
+    async def fake_stream(self, **kwargs):
+        for token in ["Python ", "is ", "great."]:
+            yield token
+
+    test_query = {
+        "query": "What is Python?",
+        "search_results": [],
+        "previous_queries": []
+    }
+
+    with patch("app.api.v1.query_handler.CLOUDFLARE_API_KEY", "key"), \
+            patch("app.api.v1.query_handler.CLOUDFLARE_ACCOUNT_ID", "account"), \
+            patch("app.services.language_model.CloudflareChat.async_stream_answer", fake_stream):
+        response = client.post("/api/v1/answer/stream-session/stream", json=test_query)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert 'data: {"token": "Python "}' in response.text
+    assert 'event: done\ndata: {"answer": "Python is great."' in response.text
+
+    history = client.get("/api/v1/session/stream-session/history").json()["history"]
+    assert history["messages"][-1] == {"role": "assistant", "content": "Python is great."}
+
+def test_ask_endpoint_and_answer_by_handle():
+    from app.models.search_model import SearchResult
+
+    result = SearchResult(
+        question="What is Python?", title="Python", url="https://example.com/python",
+        snippet="Python is a language", search_content="Python is a high-level language",
+        source="bing"
+    )
+    prompts = []
+
+    async def fake_search(query, use_cache=True):
+        return [result]
+
+    async def fake_answer(self, search_results, **kwargs):
+        prompts.append(search_results)
+        return "Python is a language."
+
+    with patch("app.api.v1.query_handler.CLOUDFLARE_API_KEY", "key"), \
+            patch("app.api.v1.query_handler.CLOUDFLARE_ACCOUNT_ID", "account"), \
+            patch("app.api.v1.query_handler.async_perform_search", fake_search), \
+            patch("app.services.language_model.CloudflareChat.async_generate_answer", fake_answer):
+        response = client.post("/api/v1/ask/ask-session", json={"query": "What is Python?"})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["answer"] == "Python is a language."
+        assert body["citations"] == ["https://example.com/python"]
+        assert "search_content" not in body["search_results"][0]
+        assert prompts[0][0]["search_content"] == "Python is a high-level language"
+
+        follow_up = client.post("/api/v1/answer/ask-session", json={
+            "query": "Who created it?",
+            "result_handles": [body["search_results"][0]["handle"]]
+        })
+        assert follow_up.status_code == 200
+        assert prompts[1][0]["search_content"] == "Python is a high-level language"
+
+    history = client.get("/api/v1/session/ask-session/history").json()["history"]
+    assert history["queries"] == ["What is Python?", "Who created it?"]
+
+def test_answer_with_unknown_handle():
+    response = client.post("/api/v1/answer/test-session", json={
+        "query": "What is Python?", "result_handles": ["missing"]
+    })
+    assert response.status_code == 404
+
+def test_batch_search_streams_each_query():
+    from app.models.search_model import SearchResult
+
+    async def fake_search(query, use_cache=True, failures=None):
+        return [SearchResult(
+            question=query, title=query, url=f"https://example.com/{len(query)}",
+            snippet="", search_content="content", source="bing"
+        )]
+
+    with patch("app.services.batch_service.async_perform_search", fake_search):
+        response = client.post("/api/v1/batch/search", json={"queries": ["a", "bb", "a"]})
+
+    assert response.status_code == 200
+    events = [line[len("data: "):] for line in response.text.splitlines() if line.startswith("data: ")]
+    items = [json.loads(event) for event in events[:-1]]
+    assert sorted(item["index"] for item in items) == [0, 1, 2]
+    assert all("search_content" not in item["search_results"][0] for item in items)
+    assert all(item["search_results"][0]["handle"] for item in items)
+    assert 'event: done\ndata: {"queries": 3}' in response.text
+
+def test_search_stream_stores_all_handles_in_one_write(tmp_path, monkeypatch):
+    from app.models.search_model import SearchResult
+    from app.services import search_service
+    from app.utils.content_store import ContentStore
+
+    cache_settings = []
+
+    async def fake_stream(query, use_cache=True):
+        cache_settings.append(use_cache)
+        for i in range(3):
+            yield SearchResult(
+                question=query, title=f"r{i}", url=f"https://example.com/{i}",
+                snippet="", search_content=f"content {i}", source="bing"
+            )
+
+    store = ContentStore(str(tmp_path / "pages.sqlite3"))
+    writes = []
+    put_results = store.put_results
+    monkeypatch.setattr(store, "put_results", lambda payloads: writes.append(payloads) or put_results(payloads))
+    monkeypatch.setattr(search_service, "content_store", store)
+
+    with patch("app.api.v1.query_handler.async_stream_search", fake_stream):
+        response = client.post("/api/v1/search/stream-search/stream", json={"query": "q", "use_cache": False})
+
+    assert response.status_code == 200
+    assert cache_settings == [False]
+    done = response.text.split("event: done\ndata: ")[1]
+    handles = [result["handle"] for result in json.loads(done)["results"]]
+    assert len(writes) == 1 and sorted(writes[0]) == sorted(handles)
+    assert sorted(store.get_results(handles, 60)) == sorted(handles)
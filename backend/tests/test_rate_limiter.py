@@ -0,0 +1,66 @@
+import threading
+import pytest
+from app.utils.rate_limter import RateLimiter, RateLimitExceeded, prepaid_quotas, rate_limit
+
+def test_allows_burst_then_rejects():
+    limiter = RateLimiter(calls=3, period=60)
+    assert [limiter.try_acquire("f") for _ in range(4)] == [True, True, True, False]
+    assert 19 < limiter.time_until_available("f") <= 20
+    assert limiter.try_acquire("other")
+
+def test_no_overshoot_under_threads():
+    limiter = RateLimiter(calls=50, period=60)
+    granted = []
+
+    def worker():
+        for _ in range(20):
+            if limiter.try_acquire("f"):
+                granted.append(1)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(granted) == 50
+
+@pytest.mark.asyncio
+async def test_async_acquire_waits_for_capacity():
+    limiter = RateLimiter(calls=2, period=0.1)
+    assert await limiter.acquire_async("f") == 0.0
+    assert await limiter.acquire_async("f") == 0.0
+    assert await limiter.acquire_async("f") > 0.0
+
+def test_non_blocking_decorator_raises():
+    @rate_limit(calls=1, period=60, block=False)
+    def call():
+        return "ok"
+
+    assert call() == "ok"
+    with pytest.raises(RateLimitExceeded):
+        call()
+    assert call.limiter.time_until_available("call") > 0
+
+def test_sqlite_store_shares_quota_between_limiters(tmp_path):
+    from app.utils.rate_limter import SQLiteRateStore
+
+    path = str(tmp_path / "limits.sqlite3")
+    worker_a = RateLimiter(calls=2, period=60, store=SQLiteRateStore(path))
+    worker_b = RateLimiter(calls=2, period=60, store=SQLiteRateStore(path))
+
+    assert worker_a.try_acquire("bing")
+    assert worker_b.try_acquire("bing")
+    assert not worker_a.try_acquire("bing")
+    assert worker_b.tokens_available("bing") == 0
+
+def test_prepaid_call_skips_the_limiter_once():
+    @rate_limit(calls=1, period=60, block=False, name="test-prepaid")
+    def call():
+        return "ok"
+
+    call.limiter.acquire("test-prepaid")
+    with prepaid_quotas(["test-prepaid"]):
+        assert call() == "ok"
+        with pytest.raises(RateLimitExceeded):
+            call()
@@ -1,5 +1,5 @@
 import pytest
-from app.services.search_service import perform_search, fetch_content_from_custom_url
+from app.services.search_service import perform_search, fetch_content_from_custom_url, async_perform_search
 from app.models.search_model import SearchResult
 
 @pytest.mark.asyncio
@@ -14,3 +14,368 @@ async def test_custom_url_fetch():
     url = "https://example.com"
     with pytest.raises(Exception):
         await fetch_content_from_custom_url(url)
+
+@pytest.mark.asyncio
+async def test_async_perform_search_without_credentials(monkeypatch):
+    """Provider failures are logged and an empty list is returned."""
+    for key in ("BING_API_KEY", "GOOGLE_API_KEY", "GOOGLE_SEARCH_CX", "YOUTUBE_API_KEY"):
+        monkeypatch.delenv(key, raising=False)
+
+    results = await async_perform_search("Python programming")
+    assert results == []
+
+@pytest.mark.asyncio
+async def test_async_stream_search_emits_unique_results(monkeypatch):
+    """Results stream as providers finish and duplicate URLs are fetched once."""
+    from app.services import search_service
+
+    def hit(url, source):
+        return SearchResult(question="q", title=url, url=url, snippet="", search_content="", source=source)
+
+    async def bing_hits(query):
+        return [hit("https://a.example", "bing"), hit("https://b.example", "bing")]
+
+    async def google_hits(query):
+        return [hit("https://a.example", "google")]
+
+    async def youtube(query):
+        raise search_service.YouTubeAPIError("unavailable")
+
+    fetched = []
+
+    async def fill(result, deadline=None):
+        fetched.append(result.url)
+        return result.model_copy(update={"search_content": "page text"})
+
+    monkeypatch.setattr(search_service, "async_bing_hits", bing_hits)
+    monkeypatch.setattr(search_service, "async_google_hits", google_hits)
+    monkeypatch.setattr(search_service, "async_search_youtube", youtube)
+    monkeypatch.setattr(search_service, "async_fill_content", fill)
+    search_service.search_cache.clear()
+
+    results = [r async for r in search_service.async_stream_search("q")]
+
+    assert sorted(r.url for r in results) == ["https://a.example", "https://b.example"]
+    assert sorted(fetched) == ["https://a.example", "https://b.example"]
+    assert all(r.search_content == "page text" for r in results)
+
+@pytest.mark.asyncio
+async def test_async_stream_search_can_bypass_the_cache(monkeypatch):
+    """With use_cache=False the stream neither replays nor populates the cache."""
+    from app.services import search_service
+
+    searches = []
+
+    async def bing_hits(query):
+        searches.append(query)
+        return [SearchResult(question=query, title="t", url="https://fresh.example", snippet="", search_content="", source="bing")]
+
+    async def no_hits(query):
+        return []
+
+    async def fill(result, deadline=None):
+        return result.model_copy(update={"search_content": "page text"})
+
+    monkeypatch.setattr(search_service, "async_bing_hits", bing_hits)
+    monkeypatch.setattr(search_service, "async_google_hits", no_hits)
+    monkeypatch.setattr(search_service, "async_search_youtube", no_hits)
+    monkeypatch.setattr(search_service, "async_fill_content", fill)
+    search_service.search_cache.clear()
+    stale = SearchResult(question="q", title="t", url="https://cached.example", snippet="", search_content="", source="bing")
+    search_service.search_cache.set(search_service.normalize_query("q"), [stale])
+
+    results = [r async for r in search_service.async_stream_search("q", use_cache=False)]
+
+    assert [r.url for r in results] == ["https://fresh.example"]
+    assert searches == ["q"]
+    assert search_service.search_cache.get(search_service.normalize_query("q"))[0] == [stale]
+    search_service.search_cache.clear()
+
+def test_perform_search_caches_normalized_query(monkeypatch):
+    """Trivially different queries share one cache entry."""
+    from app.services import search_service
+
+    calls = []
+
+    def uncached(query):
+        calls.append(query)
+        return [SearchResult(question=query, title="t", url="https://a.example", snippet="", search_content="", source="bing")], {}
+
+    monkeypatch.setattr(search_service, "_perform_search_uncached", uncached)
+    search_service.search_cache.clear()
+
+    first = search_service.perform_search("What is Python?")
+    second = search_service.perform_search("  what is   python ")
+
+    assert calls == ["What is Python?"]
+    assert first == second
+    assert search_service.search_cache.stats()["hits"] == 1
+
+def test_perform_search_applies_budgets_and_does_not_cache_partial_results(monkeypatch):
+    """The blocking search gives up on a provider past its budget, like the async one."""
+    import threading
+    import time
+    from app.services import search_service
+    from app.utils.cache import TTLCache
+
+    release = threading.Event()
+
+    def hits(query):
+        return [_fake_hit("https://a.example", "bing")]
+
+    def hang(query):
+        release.wait(5)
+        return []
+
+    monkeypatch.setattr(search_service, "search_cache", TTLCache(max_size=8, ttl=60))
+    monkeypatch.setattr(search_service, "bing_hits", hits)
+    monkeypatch.setattr(search_service, "google_hits", hang)
+    monkeypatch.setattr(search_service, "search_youtube", hits)
+    monkeypatch.setattr(search_service, "_fill_all", lambda hits: hits)
+    monkeypatch.setitem(search_service.PROVIDER_BUDGETS, "google", 0.05)
+
+    try:
+        started = time.monotonic()
+        assert search_service.perform_search("sync partial query")
+        assert time.monotonic() - started < 1
+        assert "sync partial query" not in search_service.search_cache
+    finally:
+        release.set()
+
+    monkeypatch.setattr(search_service, "google_hits", hits)
+    search_service.perform_search("sync partial query")
+    assert "sync partial query" in search_service.search_cache
+
+def test_page_fetch_rejects_binary_bodies(monkeypatch):
+    """Non-HTML bodies are rejected without reading the rest of the download."""
+    from unittest.mock import MagicMock
+    from app.services import search_service
+
+    response = MagicMock(status_code=200, headers={"Content-Type": "application/octet-stream"})
+    session = MagicMock()
+    session.get.return_value.__enter__.return_value = response
+    monkeypatch.setattr(search_service, "get_session", lambda: session)
+    monkeypatch.setattr(search_service, "content_store", None)
+
+    with pytest.raises(search_service.ContentFetchError):
+        search_service.fetch_content_from_url("https://example.com/file.bin")
+
+    response.headers = {"Content-Type": "text/html"}
+    response.iter_content.return_value = iter([b"%PDF-1.7 ...", b"<p>never read</p>"])
+    with pytest.raises(search_service.ContentFetchError):
+        search_service.fetch_content_from_url("https://example.com/report")
+
+def test_page_fetch_stops_at_byte_limit(monkeypatch):
+    from unittest.mock import MagicMock
+    from app.services import search_service
+
+    chunks = [b"<p>" + b"a" * 10, b"b" * 10 + b"</p>", b"<p>too late</p>"]
+    response = MagicMock(status_code=200, headers={"Content-Type": "text/html; charset=utf-8"})
+    response.iter_content.return_value = iter(chunks)
+    session = MagicMock()
+    session.get.return_value.__enter__.return_value = response
+    monkeypatch.setattr(search_service, "get_session", lambda: session)
+    monkeypatch.setattr(search_service, "content_store", None)
+    monkeypatch.setattr(search_service, "MAX_DOWNLOAD_BYTES", 20)
+
+    assert search_service.fetch_content_from_url("https://example.com/big") == "a" * 10 + "b" * 7 + "."
+
+def _fake_hit(url, source):
+    return SearchResult(question="q", title=url, url=url, snippet="", search_content="", source=source)
+
+@pytest.mark.asyncio
+async def test_async_search_returns_partial_results_at_deadline(monkeypatch):
+    """A provider that overruns its budget is cancelled without delaying the others."""
+    import asyncio
+    import time
+    from app.services import search_service
+
+    cancelled = []
+
+    async def bing_hits(query):
+        return [_fake_hit("https://a.example", "bing")]
+
+    async def google_hits(query):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append("google")
+            raise
+
+    async def youtube(query):
+        return [_fake_hit("https://video.example", "youtube")]
+
+    async def fill(result, deadline=None):
+        return result.model_copy(update={"search_content": "page text"})
+
+    monkeypatch.setattr(search_service, "async_bing_hits", bing_hits)
+    monkeypatch.setattr(search_service, "async_google_hits", google_hits)
+    monkeypatch.setattr(search_service, "async_search_youtube", youtube)
+    monkeypatch.setattr(search_service, "async_fill_content", fill)
+    monkeypatch.setitem(search_service.PROVIDER_BUDGETS, "google", 0.1)
+
+    started = time.monotonic()
+    failures = {}
+    results = await search_service.async_perform_search("q", use_cache=False, failures=failures)
+
+    assert time.monotonic() - started < 1
+    assert [r.url for r in results] == ["https://a.example", "https://video.example"]
+    assert cancelled == ["google"]
+    assert list(failures) == ["google"]
+
+@pytest.mark.asyncio
+async def test_async_search_does_not_cache_results_missing_a_timed_out_provider(monkeypatch):
+    import asyncio
+    from app.services import search_service
+    from app.utils.cache import TTLCache
+
+    async def hits(query):
+        return [_fake_hit("https://a.example", "bing")]
+
+    async def hang(query):
+        await asyncio.sleep(10)
+
+    async def fill(result, deadline=None):
+        return result
+
+    monkeypatch.setattr(search_service, "search_cache", TTLCache(max_size=8, ttl=60))
+    monkeypatch.setattr(search_service, "async_bing_hits", hits)
+    monkeypatch.setattr(search_service, "async_google_hits", hang)
+    monkeypatch.setattr(search_service, "async_search_youtube", hits)
+    monkeypatch.setattr(search_service, "async_fill_content", fill)
+    monkeypatch.setitem(search_service.PROVIDER_BUDGETS, "google", 0.05)
+
+    assert await search_service.async_perform_search("partial query")
+    assert "partial query" not in search_service.search_cache
+
+    monkeypatch.setattr(search_service, "async_google_hits", hits)
+    await search_service.async_perform_search("partial query")
+    assert "partial query" in search_service.search_cache
+
+@pytest.mark.asyncio
+async def test_hedged_call_races_slow_provider(monkeypatch):
+    import asyncio
+    from app.services import search_service
+
+    monkeypatch.setattr(search_service, "SEARCH_HEDGING", True)
+    monkeypatch.setattr(search_service.provider_latency, "percentile", lambda name, fraction: 0.01)
+    delays = [10, 0]
+
+    async def fetch(query):
+        await asyncio.sleep(delays.pop(0))
+        return [_fake_hit("https://a.example", "bing")]
+
+    results = await asyncio.wait_for(search_service._hedged_call("bing", fetch, "q"), 1)
+    assert [r.url for r in results] == ["https://a.example"]
+    assert delays == []
+
+def test_dedupe_results_merges_mirrors_and_syndicated_copies():
+    """Mirror URLs and near-identical content are collapsed to the first result."""
+    from app.services.search_service import _dedupe_results
+
+    article = " ".join(f"sentence {i} of the syndicated article body" for i in range(40))
+
+    def result(url, content):
+        return SearchResult(question="q", title=url, url=url, snippet="", search_content=content, source="bing")
+
+    results = _dedupe_results([
+        result("https://news.example/story", article),
+        result("http://www.news.example/story/?utm_source=feed", "different text entirely"),
+        result("https://other.example/copy", article + " Reprinted with permission."),
+        result("https://third.example/page", "an unrelated page"),
+    ])
+
+    assert [r.url for r in results] == ["https://news.example/story", "https://third.example/page"]
+
+async def test_provider_budget_timeouts_open_the_breaker(monkeypatch):
+    """A provider that hangs past its budget counts as failing, so its circuit opens."""
+    import asyncio
+    import time
+    from app.services import search_service
+    from app.utils.circuit_breaker import OPEN, circuit_breaker
+
+    @circuit_breaker("test-hanging-provider", error=search_service.SearchAPIError)
+    async def hang(query):
+        await asyncio.sleep(10)
+
+    monkeypatch.setitem(search_service.PROVIDER_BUDGETS, "hanging", 0.01)
+    breaker = hang.breaker
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(search_service.SearchAPIError):
+            await search_service._call_provider("hanging", hang, "q", time.monotonic() + 1)
+
+    assert breaker.state == OPEN
+    with pytest.raises(search_service.SearchAPIError, match="open"):
+        await search_service._call_provider("hanging", hang, "q", time.monotonic() + 1)
+
+def test_normalize_query_keeps_symbols_that_change_the_question():
+    from app.services.search_service import normalize_query
+
+    assert normalize_query("  What is   Python?? ") == normalize_query("what is python") == "what is python"
+    keys = {normalize_query(q) for q in ("What is C++?", "what is c#", "What is C?", "F#", "f")}
+    assert keys == {"what is c++", "what is c#", "what is c", "f#", "f"}
+
+def test_page_fetch_deadline_cuts_off_slow_drip_server(monkeypatch):
+    """A server trickling bytes within the read timeout is cut off at the deadline."""
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from app.services import search_service
+
+    class DripHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.end_headers()
+            self.wfile.write(b"<p>")
+            try:
+                for _ in range(100):
+                    self.wfile.write(b"a")
+                    self.wfile.flush()
+                    time.sleep(0.05)
+            except OSError:
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DripHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(search_service, "FETCH_DEADLINE", 0.3)
+    try:
+        started = time.monotonic()
+        with pytest.raises(search_service.ContentFetchError, match="exceeded"):
+            search_service.fetch_content_from_custom_url(f"http://127.0.0.1:{server.server_port}/")
+        assert time.monotonic() - started < 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+@pytest.mark.asyncio
+async def test_provider_latency_only_records_successful_calls(monkeypatch):
+    import asyncio
+    import time
+    from app.services import search_service
+    from app.utils.latency import LatencyTracker
+
+    tracker = LatencyTracker(min_samples=1)
+    monkeypatch.setattr(search_service, "provider_latency", tracker)
+    monkeypatch.setitem(search_service.PROVIDER_BUDGETS, "flaky", 0.05)
+
+    async def fails(query):
+        raise search_service.SearchAPIError("circuit open")
+
+    async def hangs(query):
+        await asyncio.sleep(10)
+
+    async def answers(query):
+        return [_fake_hit("https://a.example", "bing")]
+
+    deadline = time.monotonic() + 5
+    for fetch in (fails, hangs):
+        with pytest.raises(search_service.SearchAPIError):
+            await search_service._call_provider("flaky", fetch, "q", deadline)
+    assert tracker.percentile("flaky", 0.5) is None
+
+    await search_service._call_provider("flaky", answers, "q", deadline)
+    assert tracker.percentile("flaky", 0.5) is not None
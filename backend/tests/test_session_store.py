@@ -0,0 +1,187 @@
+from datetime import timedelta
+import asyncio
+import os
+import sqlite3
+import pytest
+from app.services.session_store import (
+    MemorySessionStore,
+    RedisSessionStore,
+    SQLiteSessionStore,
+    reap_expired_sessions,
+)
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    return MemorySessionStore()
+
+def test_appends_are_visible_in_later_snapshots(store):
+    assert store.get("s1") is None
+    store.create("s1")
+    store.append_query("s1", "first question")
+    store.append_messages("s1", [
+        {"role": "user", "content": "first question"},
+        {"role": "assistant", "content": "an answer"},
+    ])
+    store.append_query("s1", "follow-up")
+
+    session = store.get("s1")
+    assert session.queries == ["first question", "follow-up"]
+    assert session.messages[1] == {"role": "assistant", "content": "an answer"}
+
+    # Snapshots are detached from the store
+    session.queries.append("local only")
+    assert store.get("s1").queries == ["first question", "follow-up"]
+
+def test_appends_to_missing_session_are_ignored(store):
+    store.append_query("missing", "query")
+    assert store.get("missing") is None
+    assert len(store) == 0
+
+def test_delete_and_cleanup_expired(store):
+    store.create("old")
+    store.create("new")
+    assert store.delete("new") is True
+    assert store.delete("new") is False
+
+    assert store.cleanup_expired(timedelta(seconds=-1)) == 1
+    assert store.get("old") is None
+
+@pytest.fixture
+def redis_store(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    import redis
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        redis.Redis, "from_url",
+        lambda url: fakeredis.FakeRedis(server=server)
+    )
+    return RedisSessionStore("redis://fake", timedelta(minutes=30))
+
+def test_redis_appends_and_counts_sessions(redis_store):
+    redis_store.create("s1")
+    redis_store.create("s2")
+    redis_store.append_query("s1", "question")
+    redis_store.append_messages("s1", [{"role": "user", "content": "question"}])
+
+    session = redis_store.get("s1")
+    assert session.queries == ["question"]
+    assert session.messages == [{"role": "user", "content": "question"}]
+    assert len(redis_store) == 2
+
+    assert redis_store.delete("s2") is True
+    assert len(redis_store) == 1
+
+def test_redis_appends_to_missing_session_leave_no_keys(redis_store):
+    redis_store.append_query("missing", "query")
+    redis_store.append_messages("missing", [{"role": "user", "content": "query"}])
+    redis_store.touch("missing")
+
+    assert redis_store.get("missing") is None
+    assert redis_store._redis.keys("mp:session:*") == []
+    assert len(redis_store) == 0
+
+def test_sqlite_create_rolls_back_on_error(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    store.create("kept")
+    store._connection().execute(
+        "CREATE TRIGGER reject BEFORE INSERT ON sessions "
+        "BEGIN SELECT RAISE(ABORT, 'rejected'); END"
+    )
+
+    with pytest.raises(sqlite3.IntegrityError):
+        store.create("kept")
+
+    assert not store._connection().in_transaction
+    assert store.get("kept") is not None
+
+def test_sqlite_sessions_are_shared_between_instances(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    SQLiteSessionStore(path).create("shared")
+    SQLiteSessionStore(path).append_query("shared", "from another worker")
+
+    assert SQLiteSessionStore(path).get("shared").queries == ["from another worker"]
+
+def test_memory_cleanup_follows_access_order():
+    store = MemorySessionStore()
+    store.create("a")
+    store.create("b")
+    store._sessions["a"].last_accessed -= timedelta(minutes=20)
+    store._sessions["b"].last_accessed -= timedelta(minutes=20)
+    store.touch("a")
+
+    assert store.cleanup_expired(timedelta(minutes=10)) == 1
+    assert store.get("a") is not None
+    assert store.get("b") is None
+
+async def test_reaper_removes_expired_sessions_in_background():
+    store = MemorySessionStore()
+    store.create("idle")
+    reaper = asyncio.create_task(reap_expired_sessions(store, timedelta(seconds=-1), 0.01))
+    await asyncio.sleep(0.05)
+    reaper.cancel()
+
+    assert len(store) == 0
+
+def test_memory_store_compresses_old_messages_and_trims_to_budget():
+    store = MemorySessionStore(max_session_bytes=8 * 1024, recent_messages=2)
+    store.create("s1")
+    answers = [f"answer {i} " + os.urandom(500).hex() for i in range(20)]
+    for i, answer in enumerate(answers):
+        store.append_query("s1", f"question {i}")
+        store.append_messages("s1", [
+            {"role": "user", "content": f"question {i}"},
+            {"role": "assistant", "content": answer},
+        ])
+
+    stored = store._sessions["s1"]
+    assert stored.size <= 8 * 1024
+    assert store.bytes_used == stored.size
+    assert isinstance(stored.messages[1][1], bytes)
+    assert isinstance(stored.messages[-1][1], str)
+
+    session = store.get("s1")
+    assert len(session.messages) < 40
+    assert session.messages[-1] == {"role": "assistant", "content": answers[-1]}
+    assert session.messages[-3]["content"] == answers[-2]
+    assert session.queries[-1] == "question 19"
+
+def test_memory_store_evicts_least_recently_used_sessions():
+    store = MemorySessionStore(memory_budget=4 * 1024)
+    for session_id in ("a", "b", "c"):
+        store.create(session_id)
+        store.append_messages(session_id, [{"role": "assistant", "content": "x" * 1000}])
+    store.touch("a")
+    store.create("d")
+    store.append_messages("d", [{"role": "assistant", "content": "y" * 1000}])
+
+    assert store.get("b") is None
+    assert store.get("a") is not None
+    assert store.bytes_used <= 4 * 1024
+    assert store.evictions >= 1
+
+    store.delete("a")
+    assert store.bytes_used == sum(s.size for s in store._sessions.values())
+
+
+async def test_handlers_call_blocking_stores_off_the_event_loop(tmp_path, monkeypatch):
+    import threading
+    from app.api.v1 import query_handler
+
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    threads = []
+    original_get = store.get
+
+    def get(session_id):
+        threads.append(threading.get_ident())
+        return original_get(session_id)
+
+    monkeypatch.setattr(store, "get", get)
+    monkeypatch.setattr(query_handler, "session_store", store)
+
+    session = await query_handler.get_or_create_session("s1")
+    await query_handler.record_query("s1", session, "q")
+
+    assert threads and threading.get_ident() not in threads
+    assert store.get("s1").queries == ["q"]
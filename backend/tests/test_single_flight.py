@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.utils.single_flight import AsyncSingleFlight, SingleFlight
+
+def test_threads_share_one_call():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def work(value):
+        calls.append(value)
+        release.wait(1)
+        return value * 2
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do("k", work, 21)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    while flight.coalesced < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [21]
+    assert results == [42] * 5
+
+def test_errors_reach_every_caller_and_key_is_released():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do("k", fail)
+    assert flight.do("k", lambda: "fresh") == "fresh"
+
+async def test_coroutines_share_one_call():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "page"
+
+    results = await asyncio.gather(*(flight.do("url", work) for _ in range(10)))
+
+    assert results == ["page"] * 10
+    assert calls == [1]
+    assert flight.coalesced == 9
+
+async def test_cancelled_caller_does_not_cancel_shared_work():
+    flight = AsyncSingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    first = asyncio.ensure_future(flight.do("k", work))
+    second = asyncio.ensure_future(flight.do("k", work))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "done"
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import logging
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils import tracing
+from app.utils.tracing import TRACE_HEADER, span, start_trace, traced
+
+
+@pytest.fixture
+def exported(monkeypatch):
+    """Collect exported spans instead of writing the trace file."""
+    spans = []
+    monkeypatch.setattr(tracing, "_export", lambda batch: spans.extend(s.to_dict() for s in batch))
+    return spans
+
+
+def test_spans_nest_and_are_exported_with_the_root(exported):
+    root = start_trace("request")
+    token = tracing._current_span.set(root)
+
+    @traced("provider")
+    def provider():
+        with span("fetch", url="https://example.com"):
+            pass
+
+    with span("search"):
+        provider()
+        with pytest.raises(ValueError):
+            with span("failing"):
+                raise ValueError("boom")
+    assert exported == []
+
+    tracing._current_span.reset(token)
+    root.end()
+
+    by_name = {s["name"]: s for s in exported}
+    assert set(by_name) == {"request", "search", "provider", "fetch", "failing"}
+    assert {s["trace_id"] for s in exported} == {root.trace_id}
+    assert by_name["search"]["parent_id"] == by_name["request"]["span_id"]
+    assert by_name["provider"]["parent_id"] == by_name["search"]["span_id"]
+    assert by_name["fetch"]["parent_id"] == by_name["provider"]["span_id"]
+    assert by_name["fetch"]["attributes"] == {"url": "https://example.com"}
+    assert by_name["failing"]["status"] == "error"
+
+
+def test_spans_outside_a_trace_are_not_recorded(exported):
+    with span("background") as current:
+        assert current is None
+    assert exported == []
+
+
+def test_tasks_and_threads_join_the_trace(exported):
+    root = start_trace("request")
+    token = tracing._current_span.set(root)
+
+    def in_thread():
+        with span("thread"):
+            pass
+
+    async def work():
+        with span("task"):
+            await asyncio.to_thread(in_thread)
+
+    asyncio.run(work())
+    tracing._current_span.reset(token)
+    root.end()
+
+    by_name = {s["name"]: s for s in exported}
+    assert by_name["thread"]["parent_id"] == by_name["task"]["span_id"]
+    assert by_name["task"]["parent_id"] == by_name["request"]["span_id"]
+
+
+def test_response_carries_trace_id_and_spans_are_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(tracing, "_exporter", None)
+    logging.getLogger("app.utils.tracing.export").handlers.clear()
+
+    client = TestClient(app)
+    response = client.get("/health")
+    reused = client.get("/health", headers={TRACE_HEADER: "client-chosen-id"})
+
+    assert len(response.headers[TRACE_HEADER]) == 32
+    assert reused.headers[TRACE_HEADER] == "client-chosen-id"
+    path = tmp_path / f"traces.{os.getpid()}.jsonl"
+    assert tracing.trace_file_path() == str(path)
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["trace_id"] for line in lines] == [response.headers[TRACE_HEADER], "client-chosen-id"]
+    assert lines[0]["name"] == "GET /health" and lines[0]["attributes"]["status_code"] == 200
+
+
+def test_server_errors_mark_the_root_span_as_failed(exported):
+    failing = FastAPI()
+    failing.add_middleware(tracing.TraceMiddleware)
+
+    @failing.get("/broken")
+    async def broken():
+        return JSONResponse({"detail": "upstream down"}, status_code=503)
+
+    TestClient(failing).get("/broken")
+
+    assert exported[0]["status"] == "error"
+    assert exported[0]["attributes"]["status_code"] == 503